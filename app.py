@@ -1,14 +1,12 @@
 import streamlit as st
+import asyncio
 import os
-import uuid
+import time
 from src.config import Config
-from src.ingestion import IngestionManager
-from src.extractor import PrescriptionExtractor
-from src.vector_store import VectorStoreManager
-from src.graph import RAGGraph
-from src.memory import MemoryManager
-from src.auth import AuthManager
-from src.otc_manager import OTCManager
+from src.extraction_cache import content_hash as content_hash_of
+from src.otc_data import OTC_LIST_DATA
+from src.registry import get_registry
+from src.tracing import get_tracer
 from src.utils import setup_logger
 
 logger = setup_logger(__name__)
@@ -16,9 +14,12 @@ logger = setup_logger(__name__)
 # Page Config
 st.set_page_config(page_title="Medical Prescription RAG", layout="wide")
 
+# Process-wide clients and managers, shared by every session
+registry = get_registry()
+
 # Initialize Auth
 if 'auth' not in st.session_state:
-    st.session_state.auth = AuthManager()
+    st.session_state.auth = registry.auth
 if 'user' not in st.session_state:
     st.session_state.user = None
 
@@ -198,30 +199,9 @@ if not st.session_state.user:
 # --- Main App (Only accessible after login) ---
 
 # Initialize Managers
-if 'extractor' not in st.session_state:
-    st.session_state.extractor = PrescriptionExtractor()
-if 'vector_store' not in st.session_state:
-    st.session_state.vector_store = VectorStoreManager()
-if 'rag_graph' not in st.session_state:
-    st.session_state.rag_graph = RAGGraph().build_graph()
-if 'memory' not in st.session_state:
-    st.session_state.memory = MemoryManager()
-elif not hasattr(st.session_state.memory, 'get_otc_result'):
-    # Reload memory manager if it's an old instance without the new methods
-    st.session_state.memory = MemoryManager()
-if 'otc_manager' not in st.session_state:
-    st.session_state.otc_manager = OTCManager()
-
-# Self-healing: Check if OTCManager has the new data format (dict)
-# If the first item is a string, it means we have the old instance. Reload it.
-try:
-    if st.session_state.otc_manager.get_otc_list() and isinstance(st.session_state.otc_manager.get_otc_list()[0], str):
-        logger.info("Detecting legacy OTCManager instance. Re-initializing...")
-        from src.otc_manager import OTCManager # Re-import to ensure fresh class
-        st.session_state.otc_manager = OTCManager()
-except Exception as e:
-    logger.error(f"Error checking OTCManager state: {e}")
-    st.session_state.otc_manager = OTCManager() # Safety fallback
+# Shared instances from the registry. The heavy ones (Gemini/LangGraph/Pinecone clients,
+# index check, OTC sync) are built in the background and only waited on by pages that use them.
+registry.warm_up()
 
 # Session State for Chat
 if 'uploaded_files_map' not in st.session_state:
@@ -241,7 +221,10 @@ with st.sidebar:
     def switch_to_otc():
         st.session_state.navigation = "OTC List"
         
-    page = st.radio("Menu", ["Home", "OTC List"], key="navigation")
+    pages = ["Home", "OTC List"]
+    if st.session_state.user in Config.ADMIN_USERS:
+        pages.append("Performance")
+    page = st.radio("Menu", pages, key="navigation")
 
     if page == "Home":
         st.title("Prescription RAG")
@@ -250,8 +233,14 @@ with st.sidebar:
         uploaded_file = st.file_uploader("Upload Prescription (PDF/Image)", type=['pdf', 'png', 'jpg', 'jpeg'])
         
         if uploaded_file:
+            # Same bytes under any name count as the same prescription; hashed once per upload, not per rerun
+            upload_hashes = st.session_state.setdefault("upload_hashes", {})
+            if uploaded_file.file_id not in upload_hashes:
+                upload_hashes[uploaded_file.file_id] = content_hash_of(uploaded_file)
+            content_hash = upload_hashes[uploaded_file.file_id]
             # Check if this file has already been uploaded by this user
-            existing_p_id = st.session_state.memory.get_prescription_by_filename(st.session_state.user, uploaded_file.name)
+            existing_p_id = (registry.memory.get_prescription_by_hash(st.session_state.user, content_hash)
+                             or registry.memory.get_prescription_by_filename(st.session_state.user, uploaded_file.name))
             
             if existing_p_id:
                 if st.session_state.get('current_view') != existing_p_id:
@@ -260,62 +249,49 @@ with st.sidebar:
                     st.rerun()
                 # If already viewing this file, do nothing (prevent infinite loop)
             else:
-                file_id = str(uuid.uuid4())
-                # Save file temporarily
-                from src.utils import ensure_directory
-                ensure_directory(Config.INPUT_DIR)
-                
-                file_path = os.path.join(Config.INPUT_DIR, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                # Process only if not already in session map (double check)
-                if file_path not in st.session_state.uploaded_files_map.values():
-                    with st.spinner("Processing Prescription..."):
-                        # 1. Extract Data
-                        data = st.session_state.extractor.extract_data(file_path)
-                        
-                        if data:
-                            st.success("Extraction Complete!")
-                            
-                            # 2. Vectorize
-                            # Create chunks from the extracted JSON/Text
-                            # Format the medicine details nicely for the LLM context
-                            med_details = []
-                            for med in data.get('medicines', []):
-                                timing = med.get('timing', {})
-                                timing_str = f"Morning: {timing.get('morning')}, Afternoon: {timing.get('afternoon')}, Night: {timing.get('night')}, Instruction: {timing.get('instruction')}"
-                                med_details.append(f"- {med.get('name')} (Qty: {med.get('quantity')}): {timing_str}, Freq: {med.get('frequency')}, Duration: {med.get('duration')}")
-                            
-                            meds_str = "\n".join(med_details)
-                            text_content = f"Date: {data.get('date')}\n\nMedicines:\n{meds_str}\n\nNotes: {data.get('notes')}"
-                            
-                            # Store in Pinecone
-                            metadata = {"filename": uploaded_file.name}
-                            st.session_state.vector_store.add_prescription(file_id, [text_content], metadata)
-                            
-                            st.session_state.uploaded_files_map[file_id] = uploaded_file.name
-                            
-                            # Initialize session for this upload immediately with a descriptive title
-                            # Generate Title from Medicines
-                            med_names = [m.get('name', 'Unknown') for m in data.get('medicines', [])]
-                            if med_names:
-                                title = f"Prescription: {', '.join(med_names[:2])}" # First 2 meds
-                                if len(med_names) > 2:
-                                    title += "..."
-                            else:
-                                title = f"Prescription {uploaded_file.name}"
-                            
-                            # Pass filename to store it for future checks
-                            # Also pass meds_str as details
-                            st.session_state.memory.get_or_create_session(st.session_state.user, file_id, title=title, filename=uploaded_file.name, details=meds_str)
-                            
-                            st.success("Indexed in Vector DB!")
-                            # Auto-switch to this new chat
-                            st.session_state.current_view = file_id
-                            st.rerun()
-                        else:
-                            st.error("Failed to extract data.")
+                # Extraction and indexing run on the background job queue; the script doesn't wait for them.
+                # Resubmitting the same bytes (e.g. on a rerun) coalesces into the existing job.
+                job = registry.upload_jobs.find(st.session_state.user, content_hash)
+                retry = job is not None and job["state"] == "failed" and st.button("Retry upload")
+                if job is None or retry:
+                    # Streamed into the content-addressed blob store (written once per distinct content)
+                    _, file_path, _ = registry.blob_store.put(uploaded_file, ext=os.path.splitext(uploaded_file.name)[1],
+                                                              known_digest=content_hash)
+                    job, started = registry.upload_jobs.submit(st.session_state.user, uploaded_file.name, file_path,
+                                                               content_hash, size_bytes=uploaded_file.size)
+                    if started:
+                        st.toast(f"Processing '{uploaded_file.name}' in the background")
+                # Open the chat once this job is done
+                st.session_state.pending_job = job["job_id"]
+
+        # --- Upload jobs (polled while any is still running) ---
+        jobs = registry.upload_jobs.jobs_for(st.session_state.user, limit=5)
+        active = any(job["state"] not in ("done", "failed") for job in jobs)
+
+        @st.fragment(run_every=Config.UPLOAD_POLL_SECONDS if active else None)
+        def upload_status():
+            jobs = registry.upload_jobs.jobs_for(st.session_state.user, limit=5)
+            if not jobs:
+                return
+            st.caption("Uploads")
+            icons = {"queued": "⏳", "extracting": "🔍", "indexing": "📥", "done": "✅", "failed": "❌"}
+            for job in jobs:
+                line = f"{icons[job['state']]} {job['filename']} — {job['state']}"
+                if job["state"] == "failed" and job.get("error"):
+                    line += f": {job['error']}"
+                st.write(line)
+
+            pending = next((job for job in jobs if job["job_id"] == st.session_state.get("pending_job")), None)
+            if pending and pending["state"] == "done":
+                st.session_state.pending_job = None
+                st.session_state.uploaded_files_map[pending["prescription_id"]] = pending["filename"]
+                st.session_state.current_view = pending["prescription_id"]
+                st.rerun()
+            if active and not any(job["state"] not in ("done", "failed") for job in jobs):
+                # Everything finished: rerun the page so the chat list picks up the new sessions
+                st.rerun()
+
+        upload_status()
 
         st.divider()
         
@@ -323,7 +299,7 @@ with st.sidebar:
         st.subheader("Your Chats")
         
         # 2. Fetch User's Prescriptions from DB
-        user_prescriptions = st.session_state.memory.get_user_prescriptions(st.session_state.user)
+        user_prescriptions = registry.memory.get_user_prescriptions(st.session_state.user)
         
         if not user_prescriptions:
             st.info("No prescription chats yet.")
@@ -336,6 +312,25 @@ with st.sidebar:
                 st.session_state.current_view = p_id
                 st.rerun()
 
+    # Shared by every session in this process, so only admins see it
+    if st.session_state.user in Config.ADMIN_USERS:
+        with st.expander("Process resources"):
+            st.json(registry.report())
+            if registry.is_ready("rag") and registry.rag.router:
+                st.caption("Intent router")
+                st.json(registry.rag.router_stats())
+            # These walk the blob directory and query MongoDB, so they run on request rather than on every rerun
+            if st.button("Load storage and queue stats", key="load_resource_stats"):
+                if registry.is_ready("extraction_cache"):
+                    st.caption("Extraction cache")
+                    st.json(registry.extraction_cache.get_stats())
+                if registry.is_ready("blob_store"):
+                    st.caption("Blob store")
+                    st.json(registry.blob_store.get_stats())
+                if registry.is_ready("upload_jobs"):
+                    st.caption("Upload jobs")
+                    st.json(registry.upload_jobs.get_stats())
+
 # Main Area Logic based on Page
 if page == "OTC List":
     st.markdown("<h1 class='animate-header'><span class='gradient-text'>Allowed OTC Medicines</span></h1>", unsafe_allow_html=True)
@@ -348,14 +343,14 @@ if page == "OTC List":
         if search_query:
             # Search using Pinecone Vector DB
             with st.spinner("Searching Vector Database..."):
-                results = st.session_state.otc_manager.search_otc_db(search_query)
+                results = registry.otc_manager.search_otc_db(search_query)
                 if results:
                     st.dataframe(results, use_container_width=True)
                 else:
                     st.warning("No matches found in database.")
         else:
-            # Display Full List (from Manager Source)
-            raw_list = st.session_state.otc_manager.get_otc_list()
+            # Display Full List (straight from the catalog, so the page doesn't wait for the OTC manager to warm up)
+            raw_list = OTC_LIST_DATA
             # Convert dict list to DataFrame friendly format
             display_list = []
             for item in raw_list:
@@ -381,16 +376,16 @@ elif page == "Home":
         st.info("Please upload a prescription or select a chat from the sidebar to begin.")
     else:
         # Fetch user prescriptions again to get title (optimization: could pass from sidebar but this is safer)
-        user_prescriptions = st.session_state.memory.get_user_prescriptions(st.session_state.user)
+        user_prescriptions = registry.memory.get_user_prescriptions(st.session_state.user)
         selected_prescription_id = st.session_state.current_view
         # Fetch title for header
         current_title = next((p['title'] for p in user_prescriptions if p['id'] == selected_prescription_id), "Unknown Prescription")
         
-        st.session_state.session_id = st.session_state.memory.get_or_create_session(st.session_state.user, selected_prescription_id)
+        st.session_state.session_id = registry.memory.get_or_create_session(st.session_state.user, selected_prescription_id)
         header_text = f"Chat: {current_title}"
         
         # Fetch details (medicine summary)
-        details_text = st.session_state.memory.get_session_details(st.session_state.session_id)
+        details_text = registry.memory.get_session_details(st.session_state.session_id)
 
         # Chat Interface
         st.header(header_text)
@@ -414,19 +409,20 @@ elif page == "Home":
                         
                         if cache_key not in st.session_state:
                             # 1. Try to fetch from DB first
-                            db_result = st.session_state.memory.get_otc_result(st.session_state.session_id)
+                            db_result = registry.memory.get_otc_result(st.session_state.session_id)
                             
                             if db_result:
                                 st.session_state[cache_key] = db_result
                             else:
                                 # 2. If not in DB, run LLM check
                                 with st.spinner("Checking OTC status..."):
-                                    result = st.session_state.otc_manager.check_medicines_with_llm([details_text])
+                                    medicines = registry.otc_manager.split_medicines(details_text)
+                                    result = registry.otc_manager.check_medicines_with_llm(medicines)
                                     st.session_state[cache_key] = result
                                     
                                     # 3. Save to DB if successful
                                     if "error" not in result:
-                                        st.session_state.memory.save_otc_result(st.session_state.session_id, result)
+                                        registry.memory.save_otc_result(st.session_state.session_id, result)
                         
                         otc_result = st.session_state[cache_key]
                         
@@ -465,7 +461,7 @@ elif page == "Home":
 
         # Display History
         # Always fetch fresh history for the CURRENT session_id
-        history = st.session_state.memory.get_history(st.session_state.session_id)
+        history = registry.memory.get_history(st.session_state.session_id)
         st.session_state.messages = [{"role": msg['role'], "content": msg['content']} for msg in history]
         for msg in st.session_state.messages:
             with st.chat_message(msg["role"]):
@@ -481,22 +477,69 @@ elif page == "Home":
                 st.markdown(prompt)
             
             # Run Graph
-            with st.spinner("Thinking..."):
-                inputs = {
-                    "question": prompt,
-                    "prescription_id": selected_prescription_id, # None for Global
-                    "session_id": st.session_state.session_id,
-                    "context": [],
-                    "answer": ""
-                }
-                
-                result = st.session_state.rag_graph.invoke(inputs)
-                answer = result["answer"]
-                
-                # Add AI message to state
-                st.session_state.messages.append({"role": "ai", "content": answer})
-                with st.chat_message("ai"):
-                    st.markdown(answer)
-                
-                # Rerun to update history and keep OTC check at the bottom
-                st.rerun()
+            inputs = {
+                "question": prompt,
+                "prescription_id": selected_prescription_id, # None for Global
+                "session_id": st.session_state.session_id,
+                "context": [],
+                "answer": ""
+            }
+
+            # One trace per turn; graph nodes and the Gemini/vector/MongoDB calls under them join it
+            with get_tracer().trace("chat_turn", session_id=st.session_state.session_id,
+                                    prescription_id=selected_prescription_id or "GLOBAL"):
+                if Config.STREAM_ANSWERS:
+                    # Stream tokens into the chat bubble as the model produces them
+                    with st.chat_message("ai"):
+                        answer = st.write_stream(registry.rag.stream_answer(registry.rag_graph, inputs))
+                else:
+                    with st.spinner("Thinking..."):
+                        # Async graph: retrieval and history load run in parallel, persistence runs after the answer
+                        result = asyncio.run(registry.rag_graph.ainvoke(dict(inputs, started_at=time.perf_counter())))
+                        answer = result["answer"]
+                    with st.chat_message("ai"):
+                        st.markdown(answer)
+
+            # Add AI message to state
+            st.session_state.messages.append({"role": "ai", "content": answer})
+
+            # Rerun to update history and keep OTC check at the bottom
+            # (wait for any background write so the rerun reads this turn back)
+            registry.rag.wait_for_persistence()
+            st.rerun()
+
+elif page == "Performance":
+    st.markdown("<h1 class='animate-header'><span class='gradient-text'>Performance</span></h1>", unsafe_allow_html=True)
+    store = get_tracer().store
+    if not store:
+        st.info("Tracing is off. Set TRACING_ENABLED=true to record chat turns and uploads.")
+    else:
+        windows = {"Last hour": 3600, "Last 24 hours": 86400, "Everything kept": None}
+        window = st.selectbox("Window", list(windows))
+        since = time.time() - windows[window] if windows[window] else None
+
+        st.subheader("Latency per operation")
+        stats = store.operation_stats(since=since)
+        if stats:
+            st.dataframe(stats, use_container_width=True, hide_index=True)
+        else:
+            st.caption("No spans recorded yet.")
+
+        st.subheader(f"Slow traces (over {Config.TRACE_SLOW_MS:.0f}ms)")
+        slow = [t for t in store.slow_traces() if since is None or t["started_at"] >= since]
+        if not slow:
+            st.caption("No slow chat turns or uploads.")
+        else:
+            st.dataframe([{
+                "trace": t["trace_id"], "operation": t["name"], "duration_ms": t["duration_ms"], "status": t["status"],
+                "at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t["started_at"])),
+            } for t in slow], use_container_width=True, hide_index=True)
+            trace_id = st.selectbox("Inspect trace", [t["trace_id"] for t in slow])
+            spans = store.trace_spans(trace_id)
+            if spans:
+                # Waterfall: each span's offset from the start of the trace
+                origin = spans[0]["started_at"]
+                st.dataframe([{
+                    "operation": s["name"], "offset_ms": round((s["started_at"] - origin) * 1000, 1),
+                    "duration_ms": s["duration_ms"], "status": s["status"], "attrs": s["attrs"] or "",
+                } for s in spans], use_container_width=True, hide_index=True)
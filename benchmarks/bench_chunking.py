@@ -0,0 +1,141 @@
+"""
+Prompt size and retrieval precision of per-medicine chunking versus one chunk
+per prescription, over a fixed sample of prescriptions and questions.
+
+Each question is labelled with the medicines (or the header: date/notes) it is
+about. Precision is the share of medicine entries in the retrieved context that
+are relevant (a single-chunk prescription always brings every entry along);
+recall is the share of relevant entries that made it into the context.
+
+Embeddings come from HashingEmbeddings (bag of words) unless --live is given,
+in which case Gemini embeddings are used (needs GOOGLE_API_KEY). Tokens are
+counted with src.prompt_budget.count_tokens (cl100k_base, or ~4 characters each offline).
+
+Usage:
+    python benchmarks/bench_chunking.py [--live]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.config import Config
+from src.prescription_pipeline import build_chunks, format_medicines, medicine_key
+from src.prompt_budget import count_tokens
+from benchmarks.fakes import HashingEmbeddings
+
+
+def _med(name, quantity, morning, afternoon, night, instruction, frequency, duration):
+    return {"name": name, "quantity": quantity, "frequency": frequency, "duration": duration,
+            "timing": {"morning": morning, "afternoon": afternoon, "night": night, "instruction": instruction}}
+
+
+SAMPLES = [
+    {"date": "12/03/2024", "notes": "Drink plenty of fluids", "medicines": [
+        _med("Crocin 650", "1 tablet", "Yes", "No", "Yes", "After meal", "1-0-1", "5 days"),
+        _med("Azithral 500", "1 tablet", "Yes", "No", "No", "Before meal", "1-0-0", "3 days"),
+        _med("Montair LC", "1 tablet", "No", "No", "Yes", "After meal", "0-0-1", "7 days"),
+        _med("Pan 40", "1 tablet", "Yes", "No", "No", "Empty stomach", "1-0-0", "5 days")]},
+    {"date": "02/07/2024", "notes": "Review after one week", "medicines": [
+        _med("Augmentin 625", "1 tablet", "Yes", "No", "Yes", "After meal", "1-0-1", "5 days"),
+        _med("Allegra 120", "1 tablet", "No", "No", "Yes", "After meal", "0-0-1", "10 days"),
+        _med("Benadryl syrup", "10 ml", "No", "No", "Yes", "After meal", "0-0-1", "5 days")]},
+    {"date": "21/09/2024", "notes": "Avoid spicy food", "medicines": [
+        _med("Omez 20", "1 capsule", "Yes", "No", "No", "Before meal", "1-0-0", "14 days"),
+        _med("Sucralfate syrup", "10 ml", "Yes", "Yes", "Yes", "Before meal", "1-1-1", "14 days"),
+        _med("Domstal 10", "1 tablet", "Yes", "No", "Yes", "Before meal", "1-0-1", "7 days"),
+        _med("Zincovit", "1 tablet", "No", "Yes", "No", "After meal", "0-1-0", "30 days"),
+        _med("Becosules", "1 capsule", "No", "Yes", "No", "After meal", "0-1-0", "30 days")]},
+    {"date": "05/11/2024", "notes": "Check blood sugar weekly", "medicines": [
+        _med("Glycomet 500", "1 tablet", "Yes", "No", "Yes", "After meal", "1-0-1", "90 days"),
+        _med("Telma 40", "1 tablet", "Yes", "No", "No", "After meal", "1-0-0", "90 days"),
+        _med("Ecosprin 75", "1 tablet", "No", "Yes", "No", "After meal", "0-1-0", "90 days")]},
+    {"date": "17/01/2025", "notes": "Apply ice pack twice a day", "medicines": [
+        _med("Zerodol SP", "1 tablet", "Yes", "No", "Yes", "After meal", "1-0-1", "5 days"),
+        _med("Shelcal 500", "1 tablet", "No", "Yes", "No", "After meal", "0-1-0", "30 days"),
+        _med("Volini gel", "Apply locally", "Yes", "Yes", "Yes", "-", "1-1-1", "7 days"),
+        _med("Rantac 150", "1 tablet", "Yes", "No", "No", "Before meal", "1-0-0", "5 days")]},
+]
+
+NAMED_QUESTIONS = [
+    "How many times a day should I take {name}?",
+    "Should {name} be taken before or after food?",
+    "For how many days is {name} prescribed?",
+]
+
+
+def _questions(data):
+    """(question, relevant units) pairs; units are medicine keys or "header"."""
+    questions = []
+    for med in data["medicines"]:
+        for template in NAMED_QUESTIONS:
+            questions.append((template.format(name=med["name"]), {medicine_key(med["name"])}))
+    night = {medicine_key(m["name"]) for m in data["medicines"] if m["timing"]["night"] == "Yes"}
+    questions.append(("Which medicines do I need to take at night?", night))
+    questions.append(("What is the date of this prescription?", {"header"}))
+    questions.append(("Did the doctor leave any special notes?", {"header"}))
+    return questions
+
+
+def _legacy_chunk(data):
+    """The single chunk per prescription that was indexed before per-medicine chunking."""
+    return f"Date: {data.get('date')}\n\nMedicines:\n{format_medicines(data)}\n\nNotes: {data.get('notes')}"
+
+
+def _units(match, data):
+    if match.metadata.get("chunk_type") == "medicine":
+        return {match.metadata["medicine"]}
+    if match.metadata.get("chunk_type") == "header":
+        return {"header"}
+    # Legacy chunk: every entry of the prescription
+    return {"header"} | {medicine_key(m["name"]) for m in data["medicines"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Use Gemini embeddings instead of HashingEmbeddings")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    Config.VECTOR_BACKEND = "local"
+    Config.LOCAL_INDEX_DIR = tmp
+    if not args.live:
+        Config.GOOGLE_API_KEY = None
+    from src.vector_store import VectorStoreManager
+    store = VectorStoreManager()
+    if not args.live:
+        store.embeddings = HashingEmbeddings()
+
+    for i, data in enumerate(SAMPLES):
+        store.add_prescription(f"legacy_{i}", [_legacy_chunk(data)], {"filename": f"rx{i}"})
+        records = build_chunks(data)
+        store.add_prescription(f"chunked_{i}", [text for text, _ in records], {"filename": f"rx{i}"},
+                               chunk_metadata=[meta for _, meta in records])
+
+    results = {}
+    for mode in ("legacy", "chunked"):
+        tokens, precision, recall, count = 0, 0.0, 0.0, 0
+        for i, data in enumerate(SAMPLES):
+            for question, relevant in _questions(data):
+                matches = store.search_chunks(question, prescription_id=f"{mode}_{i}")
+                retrieved = set().union(*(_units(m, data) for m in matches)) if matches else set()
+                units = sum(len(_units(m, data)) for m in matches)
+                tokens += count_tokens("\n\n".join(m.metadata["text"] for m in matches))
+                precision += len(retrieved & relevant) / units if units else 0.0
+                recall += len(retrieved & relevant) / len(relevant) if relevant else 1.0
+                count += 1
+        results[mode] = {"tokens": tokens / count, "precision": precision / count, "recall": recall / count}
+
+    print(f"{count} questions over {len(SAMPLES)} prescriptions ({'Gemini' if args.live else 'hashing'} embeddings)\n")
+    print(f"{'chunking':<14}{'context tokens':>16}{'precision':>11}{'recall':>8}")
+    for mode, label in (("legacy", "one per rx"), ("chunked", "per medicine")):
+        row = results[mode]
+        print(f"{label:<14}{row['tokens']:>16.1f}{row['precision']:>11.2f}{row['recall']:>8.2f}")
+    saved = 1 - results["chunked"]["tokens"] / results["legacy"]["tokens"]
+    print(f"\nContext tokens per question: {saved:.0%} fewer with per-medicine chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Bytes sent to Gemini per prescription image, before and after ImagePreprocessor,
+over the images in data/input. With --extract (needs GOOGLE_API_KEY) it also
+times end-to-end extract_data() with preprocessing off and on.
+
+Usage:
+    python benchmarks/bench_image_preprocess.py [--input data/input] [--extract] [--repeats 1]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.config import Config
+from src.image_preprocess import ImagePreprocessor
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def _time_extract(extractor, path, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extractor.extract_data(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=Config.INPUT_DIR)
+    parser.add_argument("--extract", action="store_true", help="Also time Gemini extraction (uses API quota)")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.input, name) for name in os.listdir(args.input)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        print(f"No images found in {args.input}")
+        return
+
+    preprocessor = ImagePreprocessor()
+    extractor = None
+    if args.extract:
+        if not Config.GOOGLE_API_KEY:
+            print("GOOGLE_API_KEY is not set; skipping extraction timings")
+        else:
+            from src.extractor import PrescriptionExtractor
+            extractor = PrescriptionExtractor()
+
+    print(f"Settings: max_edge={preprocessor.max_edge} format={preprocessor.image_format} "
+          f"quality={preprocessor.quality} max_bytes={preprocessor.max_bytes} "
+          f"grayscale={preprocessor.grayscale} autocontrast={preprocessor.autocontrast}\n")
+    header = f"{'image':<40}{'before':>10}{'after':>10}{'saved':>8}{'prep ms':>9}"
+    if extractor:
+        header += f"{'extract ms (raw -> prep)':>28}"
+    print(header)
+
+    total_before = total_after = 0
+    raw_latencies, prep_latencies = [], []
+    for path in paths:
+        _, stats = preprocessor.process(path)
+        before = os.path.getsize(path) # the SDK uploads an opened image file byte-for-byte
+        total_before += before
+        total_after += stats["bytes"]
+        line = (f"{os.path.basename(path)[:39]:<40}{before:>10}{stats['bytes']:>10}"
+                f"{1 - stats['bytes'] / before:>8.0%}{stats['ms']:>9.1f}")
+        if extractor:
+            saved_preprocessor = extractor.preprocessor
+            extractor.preprocessor = None
+            raw_ms = _time_extract(extractor, path, args.repeats)
+            extractor.preprocessor = saved_preprocessor or preprocessor
+            prep_ms = _time_extract(extractor, path, args.repeats)
+            raw_latencies.append(raw_ms)
+            prep_latencies.append(prep_ms)
+            line += f"{raw_ms:>16.0f} -> {prep_ms:<8.0f}"
+        print(line)
+
+    print(f"\nTotal bytes: {total_before} -> {total_after} ({1 - total_after / total_before:.0%} smaller)")
+    if extractor:
+        print(f"Median extraction latency: {statistics.median(raw_latencies):.0f}ms -> "
+              f"{statistics.median(prep_latencies):.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Compares the flat `messages` layout with bucketed message storage on long sessions:
+latency of reading the last K messages and of appending one message, plus the
+documents each tail read examines (when the server supports explain).
+
+Runs against MONGO_BENCH_URI when set, otherwise against mongomock (in-process,
+so latencies only show the relative cost of the two layouts).
+
+Usage:
+    python benchmarks/bench_message_buckets.py --sessions 3 --messages 10000 --tail 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.db_indexes import ensure_indexes
+from src.message_buckets import MessageBucketStore
+from src.migrate_messages import migrate
+
+
+def _client():
+    uri = os.getenv("MONGO_BENCH_URI")
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri), True
+    import mongomock
+    return mongomock.MongoClient(), False
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _timed(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _docs_examined(collection, filter_dict, sort, limit):
+    try:
+        plan = collection.database.command(
+            "explain", {"find": collection.name, "filter": filter_dict, "sort": sort, "limit": limit},
+            verbosity="executionStats",
+        )
+        return plan["executionStats"]["totalDocsExamined"]
+    except Exception:
+        return None
+
+
+def _report(name, latencies, examined=None):
+    extra = f"  docs examined={examined}" if examined is not None else ""
+    print(f"{name:<28} p50={statistics.median(latencies):8.3f}ms  p95={_percentile(latencies, 95):8.3f}ms{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=10000, help="Messages per session")
+    parser.add_argument("--tail", type=int, default=5, help="K in 'last K messages'")
+    parser.add_argument("--bucket-size", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    client, real_server = _client()
+    db = client[f"pillguard_bench_{uuid.uuid4().hex[:8]}"]
+    ensure_indexes(db, force=True)
+    store = MessageBucketStore(db, bucket_size=args.bucket_size)
+
+    print(f"Seeding {args.sessions} sessions x {args.messages} messages "
+          f"({'MongoDB' if real_server else 'mongomock'})...")
+    base = datetime.utcnow() - timedelta(days=30)
+    session_ids = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    for session_id in session_ids:
+        db.messages.insert_many([
+            {"session_id": session_id, "role": "user" if i % 2 == 0 else "ai",
+             "content": f"message {i}", "timestamp": base + timedelta(seconds=i)}
+            for i in range(args.messages)
+        ])
+    start = time.perf_counter()
+    summary = migrate(db, bucket_size=args.bucket_size)
+    print(f"Migration: {summary['messages']} messages -> {summary['buckets']} buckets "
+          f"in {time.perf_counter() - start:.2f}s\n")
+
+    target = session_ids[0]
+    flat_filter = {"session_id": target}
+
+    def flat_tail():
+        return list(db.messages.find(flat_filter).sort("timestamp", -1).limit(args.tail))[::-1]
+
+    def flat_head():
+        # The previous get_history query: ascending sort + limit
+        return list(db.messages.find(flat_filter).sort("timestamp", 1).limit(args.tail))
+
+    def bucket_tail():
+        return store.tail(target, args.tail)
+
+    assert [m["content"] for m in flat_tail()] == [m["content"] for m in bucket_tail()]
+
+    print(f"Tail reads (last {args.tail} of {args.messages} messages, {args.repeats} runs):")
+    _report("flat, ascending (old)", _timed(flat_head, args.repeats),
+            _docs_examined(db.messages, flat_filter, {"timestamp": 1}, args.tail))
+    _report("flat, descending", _timed(flat_tail, args.repeats),
+            _docs_examined(db.messages, flat_filter, {"timestamp": -1}, args.tail))
+    buckets_read = -(-args.tail // args.bucket_size) + 1
+    _report("bucketed", _timed(bucket_tail, args.repeats),
+            _docs_examined(store.collection, flat_filter, {"opened_at": -1}, buckets_read))
+
+    clock = iter(base + timedelta(days=1, seconds=i) for i in range(10 * args.repeats))
+
+    def flat_append():
+        db.messages.insert_one({"session_id": target, "role": "user", "content": "x", "timestamp": next(clock)})
+
+    def bucket_append():
+        store.append(target, [{"role": "user", "content": "x", "timestamp": next(clock)}])
+
+    print(f"\nAppends ({args.repeats} runs):")
+    _report("flat insert_one", _timed(flat_append, args.repeats))
+    _report("bucketed $push", _timed(bucket_append, args.repeats))
+
+    print(f"\nDocuments per session: flat={db.messages.count_documents(flat_filter)} "
+          f"bucketed={store.collection.count_documents(flat_filter)}")
+    client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
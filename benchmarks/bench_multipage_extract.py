@@ -0,0 +1,62 @@
+"""
+Wall-clock time of extracting multi-page PDFs with one request for the whole
+document versus one concurrent request per page (EXTRACT_PAGES_IN_PARALLEL).
+
+By default the model is FakeGeminiModel, whose latency grows with input size and
+with the number of medicines it returns;
+with --live (needs GOOGLE_API_KEY) the real Gemini model is used.
+
+Usage:
+    python benchmarks/bench_multipage_extract.py [--input data/input] [--live] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.config import Config
+from src.extractor import PrescriptionExtractor
+from benchmarks.fakes import FakeGeminiModel
+
+
+def _run(extractor, path, parallel):
+    Config.EXTRACT_PAGES_IN_PARALLEL = parallel
+    report = {}
+    start = time.perf_counter()
+    result = extractor.extract_data(path, report=report)
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, report, len((result or {}).get("medicines", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=Config.INPUT_DIR)
+    parser.add_argument("--live", action="store_true", help="Call Gemini instead of the fake model")
+    parser.add_argument("--workers", type=int, default=Config.EXTRACT_PAGE_WORKERS)
+    parser.add_argument("--base-ms", type=float, default=600.0, help="Fake model fixed latency per request")
+    parser.add_argument("--per-kb-ms", type=float, default=10.0, help="Fake model latency per KB of input")
+    parser.add_argument("--per-item-ms", type=float, default=500.0, help="Fake model latency per extracted medicine")
+    args = parser.parse_args()
+
+    Config.EXTRACT_PAGE_WORKERS = args.workers
+    extractor = PrescriptionExtractor()
+    if not args.live:
+        extractor.model = FakeGeminiModel(args.base_ms, args.per_kb_ms, args.per_item_ms)
+    elif not Config.GOOGLE_API_KEY:
+        sys.exit("--live needs GOOGLE_API_KEY")
+
+    pdfs = sorted(os.path.join(args.input, n) for n in os.listdir(args.input) if n.lower().endswith(".pdf"))
+    print(f"Model: {'Gemini ' + Config.GEMINI_MODEL_NAME if args.live else 'FakeGeminiModel'}, workers={args.workers}\n")
+    print(f"{'file':<45}{'pages':>6}{'single ms':>11}{'parallel ms':>13}{'speedup':>9}{'medicines':>11}")
+    for path in pdfs:
+        single_ms, report, single_meds = _run(extractor, path, parallel=False)
+        parallel_ms, report, parallel_meds = _run(extractor, path, parallel=True)
+        pages = len(report.get("pages", []))
+        print(f"{os.path.basename(path)[:44]:<45}{pages:>6}{single_ms:>11.0f}{parallel_ms:>13.0f}"
+              f"{single_ms / parallel_ms:>8.1f}x{single_meds:>5} / {parallel_meds:<4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Offline microbenchmarks of the app's own code paths, with deterministic local
+stand-ins for the external services: FakeChatModel for Gemini, HashingEmbeddings
+for the embedding API, FakePineconeIndex for Pinecone, and mongomock for MongoDB
+(or a real server at MONGO_BENCH_URI). Each stand-in sleeps for a configurable
+latency, so the numbers show our overhead on top of a known service cost.
+Needs the dev requirements: pip install -r requirements-dev.txt
+
+Timed paths:
+    vector_store.add_texts, vector_store.search
+    otc.check_medicines (cold and with cached verdicts)
+    rag.invoke (LLM answer, semantic cache hit, intent-routed answer)
+    memory.add_message (write-behind and direct), memory.get_history, memory.create_sessions
+
+Usage:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --json results.json
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json   # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Keep every local file (embedding cache, traces, index) out of data/, make sure no real client is built,
+# and turn off the client-side embedding rate limit, which would otherwise dominate add_texts
+_scratch = tempfile.mkdtemp(prefix="bench-suite-")
+os.environ.update({
+    "GOOGLE_API_KEY": "", "VECTOR_BACKEND": "local", "BACKGROUND_BOOTSTRAP": "false", "EMBED_RATE_LIMIT": "0",
+    "LOCAL_INDEX_DIR": os.path.join(_scratch, "index"), "CACHE_DIR": os.path.join(_scratch, "cache"),
+    "TRACE_DB_PATH": os.path.join(_scratch, "traces.sqlite3"),
+})
+
+from src.config import Config
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+from benchmarks.fakes import FakeChatModel, FakePineconeIndex, HashingEmbeddings
+
+PRESCRIPTION = {
+    "date": "12/03/2024", "notes": "Drink plenty of fluids",
+    "medicines": [
+        {"name": "Dolo 650", "quantity": "1 tablet", "frequency": "1-0-1", "duration": "5 days",
+         "timing": {"morning": "Yes", "afternoon": "No", "night": "Yes", "instruction": "After meal"}},
+        {"name": "Azithral 500", "quantity": "1 tablet", "frequency": "1-0-0", "duration": "3 days",
+         "timing": {"morning": "Yes", "afternoon": "No", "night": "No", "instruction": "Before meal"}},
+        {"name": "Pan 40", "quantity": "1 tablet", "frequency": "1-0-0", "duration": "5 days",
+         "timing": {"morning": "Yes", "afternoon": "No", "night": "No", "instruction": "Empty stomach"}},
+    ],
+}
+# An alias hit, one vector search + LLM verification, and two without a close catalog entry
+OTC_MEDICINES = ["Crocin", "Naproxen Sodium", "Digene Gel", "Azithral 500"]
+QUERIES = [f"{verb} {med['name']}" for verb in ("dose of", "timing for", "side effects of", "what is")
+           for med in PRESCRIPTION["medicines"]]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _mongo_client():
+    uri = os.getenv("MONGO_BENCH_URI")
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+    import mongomock
+    return mongomock.MongoClient()
+
+
+def _bench(name, fn, iterations, warmup=2, setup=None):
+    """Times `fn(i)` over `iterations` calls (after `warmup` untimed ones); `setup(i)` runs untimed before each."""
+    latencies = []
+    for i in range(warmup + iterations):
+        if setup:
+            setup(i)
+        start = time.perf_counter()
+        fn(i)
+        if i >= warmup:
+            latencies.append((time.perf_counter() - start) * 1000)
+    return name, {
+        "iterations": iterations,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+    }
+
+
+def build_fixtures(args):
+    from src.graph import RAGGraph
+    from src.memory import MemoryManager
+    from src.otc_manager import OTCManager
+    from src.prescription_pipeline import PrescriptionPipeline
+    from src.vector_store import VectorStoreManager
+
+    client = _mongo_client()
+    Config.MONGO_DB_NAME = f"bench_{uuid.uuid4().hex[:8]}"
+    vector_store = VectorStoreManager()
+    embedder = HashingEmbeddings(latency_ms=args.embed_ms)
+    vector_store.embeddings = CachedEmbeddings(
+        embedder, EmbeddingCache(os.path.join(_scratch, "cache", "embeddings.sqlite3")), "bench-embedder"
+    )
+    vector_store.index = FakePineconeIndex(latency_ms=args.rtt_ms)
+    memory = MemoryManager(client=client)
+    llm = FakeChatModel(first_token_ms=args.llm_first_token_ms, per_token_ms=args.llm_token_ms)
+
+    otc = OTCManager(vector_store=vector_store, client=client, llm=llm)
+    rag = RAGGraph(vector_store=vector_store, memory=memory, llm=llm)
+
+    # One indexed prescription with a chat session, as after an upload
+    pipeline = PrescriptionPipeline(None, vector_store, memory)
+    item = {"prescription_id": "bench-rx", "data": PRESCRIPTION, "cached": None, "filename": "bench.png",
+            "user_id": "bench-user", "content_hash": "bench-hash"}
+    pipeline.index([item])
+    pipeline.register([item])
+    session_id = memory.sessions.find_one({"prescription_id": "bench-rx"})["session_id"]
+    for i in range(200):
+        memory.add_message(session_id, "user" if i % 2 == 0 else "ai", f"Earlier message {i} about the prescription")
+    memory.flush()
+    return {"client": client, "vector_store": vector_store, "memory": memory, "otc": otc, "rag": rag,
+            "graph": rag.build_graph(), "session_id": session_id}
+
+
+def run_suite(args):
+    f = build_fixtures(args)
+    vector_store, memory, otc, rag, graph = f["vector_store"], f["memory"], f["otc"], f["rag"], f["graph"]
+    session_id = f["session_id"]
+    n = args.iterations
+    results = []
+
+    # Fresh texts every iteration, so each one pays for embedding and upsert
+    results.append(_bench("vector_store.add_texts[50]", lambda i: vector_store.add_texts(
+        [f"bench text {i} {j} paracetamol dose" for j in range(50)], [{"n": j} for j in range(50)],
+        namespace="bench"), n))
+    results.append(_bench("vector_store.search", lambda i: vector_store.search(
+        QUERIES[i % len(QUERIES)], prescription_id="bench-rx"), n))
+
+    def forget_verdicts(i):
+        otc.verdict_cache.collection.delete_many({})
+        otc.verdict_cache._lru.clear()
+    results.append(_bench("otc.check_medicines[cold]", lambda i: otc.check_medicines_with_llm(OTC_MEDICINES), n,
+                          setup=forget_verdicts))
+    results.append(_bench("otc.check_medicines[cached]", lambda i: otc.check_medicines_with_llm(OTC_MEDICINES), n))
+
+    def ask(question):
+        return graph.invoke({"question": question, "prescription_id": "bench-rx", "session_id": session_id,
+                             "context": [], "answer": "", "started_at": time.perf_counter()})
+    answer_cache = rag.answer_cache
+    rag.answer_cache = None
+    results.append(_bench("rag.invoke[llm]", lambda i: ask(f"What is {PRESCRIPTION['medicines'][i % 3]['name']} used for?"), n))
+    rag.answer_cache = answer_cache
+    if answer_cache:
+        results.append(_bench("rag.invoke[cache hit]", lambda i: ask("Are there any food restrictions?"), n))
+    results.append(_bench("rag.invoke[routed]", lambda i: ask(f"When do I take {PRESCRIPTION['medicines'][i % 3]['name']}?"), n))
+
+    results.append(_bench("memory.add_message", lambda i: memory.add_message(session_id, "user", f"bench {i}"), n * 10))
+    write_behind, memory.write_behind = memory.write_behind, None
+    results.append(_bench("memory.add_message[direct]", lambda i: memory.add_message(session_id, "user", f"bench {i}"), n * 10))
+    memory.write_behind = write_behind
+    memory.flush()
+    results.append(_bench("memory.get_history[5]", lambda i: memory.get_history(session_id, limit=5), n * 10))
+    results.append(_bench("memory.create_sessions[20]", lambda i: memory.create_sessions([
+        {"user_id": "bench-user", "prescription_id": f"rx-{i}-{j}", "title": "Bench"} for j in range(20)
+    ]), n))
+    rag.wait_for_persistence()
+    return dict(results)
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Returns human-readable regressions of `report` against `baseline` (on p50)."""
+    regressions = []
+    if report["settings"] != baseline.get("settings"):
+        regressions.append(f"settings differ from the baseline's: {baseline.get('settings')}")
+        return regressions
+    for name, row in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        delta = row["p50_ms"] - before["p50_ms"]
+        if delta > min_delta_ms and row["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {before['p50_ms']}ms -> {row['p50_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="Simulated embedding API round trip")
+    parser.add_argument("--rtt-ms", type=float, default=10.0, help="Simulated Pinecone round trip")
+    parser.add_argument("--llm-first-token-ms", type=float, default=50.0, help="Simulated Gemini time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=0.5, help="Simulated Gemini time per further token")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    settings = {"iterations": args.iterations, "embed_ms": args.embed_ms, "rtt_ms": args.rtt_ms,
+                "llm_first_token_ms": args.llm_first_token_ms, "llm_token_ms": args.llm_token_ms,
+                "mongo": "server" if os.getenv("MONGO_BENCH_URI") else "mongomock"}
+    report = {"python": sys.version.split()[0], "settings": settings, "results": run_suite(args)}
+
+    print(f"{'benchmark':<30}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, row in report["results"].items():
+        print(f"{name:<30}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['mean_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nBenchmark regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo benchmark regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares query latency and recall@k of the embedded LocalVectorIndex against the
+Pinecone path, modelled by FakePineconeIndex with a configurable round-trip latency.
+
+Usage:
+    python benchmarks/bench_vector_index.py --vectors 2000 --queries 200 --rtt-ms 40
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.local_index import LocalVectorIndex
+from benchmarks.fakes import FakePineconeIndex
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def _time_queries(index, queries, top_k, namespace, filters):
+    latencies, results = [], []
+    for query, filter_dict in zip(queries, filters):
+        start = time.perf_counter()
+        response = index.query(vector=query.tolist(), top_k=top_k, include_metadata=True,
+                               filter=filter_dict, namespace=namespace)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([m.id for m in response.matches])
+    return latencies, results
+
+
+def _exact_top_k(data, ids, groups, query, top_k, group):
+    normed = data / np.linalg.norm(data, axis=1, keepdims=True)
+    scores = normed @ (query / np.linalg.norm(query))
+    if group is not None:
+        scores = np.where(groups == group, scores, -np.inf)
+    order = np.argsort(-scores)[:top_k]
+    return [ids[i] for i in order if np.isfinite(scores[i])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="Simulated Pinecone round trip")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = rng.standard_normal((args.vectors, args.dimension)).astype(np.float32)
+    ids = [f"vec_{i}" for i in range(args.vectors)]
+    groups = rng.integers(0, 50, size=args.vectors)
+    vectors = [(ids[i], data[i].tolist(), {"prescription_id": f"rx_{groups[i]}", "text": ids[i]})
+               for i in range(args.vectors)]
+
+    # Queries are perturbed copies of stored vectors; half of them use a metadata filter
+    picks = rng.integers(0, args.vectors, size=args.queries)
+    queries = data[picks] + 0.3 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    filters = [{"prescription_id": {"$eq": f"rx_{groups[p]}"}} if i % 2 else None for i, p in enumerate(picks)]
+    truth = [_exact_top_k(data, ids, groups, q, args.top_k, groups[p] if f else None)
+             for q, p, f in zip(queries, picks, filters)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local = LocalVectorIndex(tmp, dimension=args.dimension)
+        local.upsert(vectors, namespace="bench")
+
+        start = time.perf_counter()
+        reloaded = LocalVectorIndex(tmp, dimension=args.dimension)
+        reload_ms = (time.perf_counter() - start) * 1000
+
+        remote = FakePineconeIndex(latency_ms=args.rtt_ms)
+        remote.upsert(vectors, namespace="bench")
+
+        report = {}
+        for name, index in (("local", reloaded), ("pinecone-standin", remote)):
+            latencies, results = _time_queries(index, queries, args.top_k, "bench", filters)
+            recall = statistics.mean(
+                len(set(got) & set(expected)) / max(1, len(expected)) for got, expected in zip(results, truth)
+            )
+            report[name] = (latencies, recall)
+
+    print(f"{args.vectors} vectors x {args.dimension}d, {args.queries} queries, top_k={args.top_k}, "
+          f"simulated RTT {args.rtt_ms} ms")
+    print(f"Local index reload (memory-mapped): {reload_ms:.2f} ms")
+    print(f"{'backend':<18}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'recall@k':>10}")
+    for name, (latencies, recall) in report.items():
+        print(f"{name:<18}{_percentile(latencies, 50):>10.3f}{_percentile(latencies, 95):>10.3f}"
+              f"{statistics.mean(latencies):>10.3f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Local stand-ins for external services, used by the benchmarks in this folder.
+They mimic the interfaces the app uses so the real code paths can be timed offline.
+"""
+import time
+import numpy as np
+
+
+class _Match:
+    def __init__(self, id, score, metadata):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+
+class _QueryResponse:
+    def __init__(self, matches, namespace):
+        self.matches = matches
+        self.namespace = namespace
+
+
+class FakePineconeIndex:
+    """
+    In-memory index with Pinecone's upsert/query/delete interface.
+    Every call sleeps for `latency_ms` to model the network round trip to the managed service.
+    """
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.namespaces = {}
+
+    def _round_trip(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+    def upsert(self, vectors, namespace=None):
+        self._round_trip()
+        ns = self.namespaces.setdefault(namespace or "", {})
+        for item in vectors:
+            if isinstance(item, dict):
+                ns[item["id"]] = (np.asarray(item["values"], dtype=np.float64), dict(item.get("metadata", {})))
+            else:
+                ns[item[0]] = (np.asarray(item[1], dtype=np.float64), dict(item[2] if len(item) > 2 else {}))
+        return {"upserted_count": len(vectors)}
+
+    def delete(self, ids=None, delete_all=False, namespace=None):
+        self._round_trip()
+        ns = self.namespaces.get(namespace or "", {})
+        if delete_all:
+            ns.clear()
+        for vector_id in ids or []:
+            ns.pop(vector_id, None)
+        return {}
+
+    def describe_index_stats(self):
+        self._round_trip()
+        return {"namespaces": {name: {"vector_count": len(ns)} for name, ns in self.namespaces.items() if ns}}
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None, namespace=None, **kwargs):
+        self._round_trip()
+        ns = self.namespaces.get(namespace or "", {})
+        query = np.asarray(vector, dtype=np.float64)
+        query_norm = np.linalg.norm(query) or 1.0
+        scored = []
+        for vector_id, (values, meta) in ns.items():
+            if filter and not all(
+                meta.get(field) in (cond.get("$in") or [cond.get("$eq")] if isinstance(cond, dict) else [cond])
+                for field, cond in filter.items()
+            ):
+                continue
+            score = float(values @ query / ((np.linalg.norm(values) or 1.0) * query_norm))
+            scored.append(_Match(vector_id, score, meta if include_metadata else {}))
+        scored.sort(key=lambda m: m.score, reverse=True)
+        return _QueryResponse(scored[:top_k], namespace or "")
+
+
+class _GenerateResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel. The reply lists one medicine per "[Page N"
+    marker in the content, and generate_content() sleeps for `base_ms`, plus
+    `per_kb_ms` per KB of input (text and inline blobs), plus `per_item_ms` per
+    medicine in the reply, since output tokens are generated one after another.
+    """
+    def __init__(self, base_ms=600.0, per_kb_ms=10.0, per_item_ms=500.0):
+        self.base_ms = base_ms
+        self.per_kb_ms = per_kb_ms
+        self.per_item_ms = per_item_ms
+        self.calls = 0
+
+    def generate_content(self, content):
+        import json
+        import re
+        self.calls += 1
+        size = 0
+        pages = []
+        for part in content:
+            if isinstance(part, str):
+                size += len(part)
+                pages += re.findall(r"\[Page (\d+)", part)
+            elif isinstance(part, dict):
+                size += len(part.get("data", b""))
+        time.sleep((self.base_ms + self.per_kb_ms * size / 1024 + self.per_item_ms * len(pages)) / 1000.0)
+        medicines = [{"name": f"Medicine {n}", "quantity": "1 tablet", "frequency": "1-0-1", "duration": "5 days"}
+                     for n in pages]
+        return _GenerateResponse(json.dumps({"date": "01/01/2024", "medicines": medicines, "notes": "-"}))
+
+
+class HashingEmbeddings:
+    """
+    Deterministic bag-of-words embedder: each lowercase word maps to a fixed random
+    vector and a text is the normalized sum. Texts sharing words score higher, which
+    is enough to compare retrieval strategies offline. Each call sleeps for
+    `latency_ms` to model the embedding API round trip.
+    """
+    def __init__(self, dimension=768, latency_ms=0.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._words = {}
+
+    def _word(self, word):
+        vector = self._words.get(word)
+        if vector is None:
+            import hashlib
+            seed = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dimension)
+            self._words[word] = vector
+        return vector
+
+    def _embed(self, text):
+        import re
+        total = np.zeros(self.dimension)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            total += self._word(word)
+        norm = np.linalg.norm(total)
+        return (total / norm if norm else total).tolist()
+
+    def _round_trip(self):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+    def embed_query(self, text, **kwargs):
+        self._round_trip()
+        return self._embed(text)
+
+    def embed_documents(self, texts, **kwargs):
+        self._round_trip()
+        return [self._embed(text) for text in texts]
+
+
+class _ChatChunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChatModel:
+    """
+    Stand-in for ChatGoogleGenerativeAI with invoke/stream/astream.
+    A reply takes `first_token_ms` plus `per_token_ms` for each of its words. Prompts
+    that list "N. Extracted Medicine" blocks (OTC verification) get a JSON verdict per
+    block, matched to its first candidate; anything else gets a fixed-length answer.
+    """
+    def __init__(self, first_token_ms=0.0, per_token_ms=0.0, answer_words=40):
+        self.first_token_ms = first_token_ms
+        self.per_token_ms = per_token_ms
+        self.answer_words = answer_words
+        self.calls = 0
+
+    def _reply(self, prompt):
+        import json
+        import re
+        self.calls += 1
+        ids = re.findall(r"^\s*(\d+)\. Extracted Medicine", prompt, re.M)
+        if ids:
+            candidates = re.findall(r"Allowed OTC Candidates \(from database\):\n\s*- (.+)", prompt)
+            return json.dumps({"results": [
+                {"id": int(i), "is_otc": True, "matched_candidate": candidate.strip(), "reason": "Same active ingredient"}
+                for i, candidate in zip(ids, candidates)
+            ]})
+        return " ".join(f"word{i}" for i in range(self.answer_words))
+
+    def _delays(self, words):
+        return [self.first_token_ms] + [self.per_token_ms] * (len(words) - 1)
+
+    def invoke(self, prompt, **kwargs):
+        reply = self._reply(prompt)
+        time.sleep((self.first_token_ms + self.per_token_ms * max(len(reply.split()) - 1, 0)) / 1000.0)
+        return _ChatChunk(reply)
+
+    def stream(self, prompt, **kwargs):
+        words = self._reply(prompt).split(" ")
+        for word, delay in zip(words, self._delays(words)):
+            time.sleep(delay / 1000.0)
+            yield _ChatChunk(word + " ")
+
+    async def astream(self, prompt, **kwargs):
+        import asyncio
+        words = self._reply(prompt).split(" ")
+        for word, delay in zip(words, self._delays(words)):
+            await asyncio.sleep(delay / 1000.0)
+            yield _ChatChunk(word + " ")
@@ -0,0 +1,144 @@
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Words that point back into the conversation ("and the second one?", "is it safe with that?")
+FOLLOW_UP_RE = re.compile(
+    r"^\s*(and|but|also|so|then|what about|how about)\b|"
+    r"\b(it|its|this|that|these|those|they|them|their|one|ones|same|above|previous|earlier|"
+    r"first|second|third|last|other|another|else|too)\b",
+    re.IGNORECASE,
+)
+
+
+def depends_on_history(question, max_short_words=4):
+    """True for questions that only make sense after earlier turns: anaphoric, or too short to stand alone."""
+    return len(question.split()) <= max_short_words or bool(FOLLOW_UP_RE.search(question))
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of (question embedding, answer) pairs, scoped by prescription and language.
+    Prescription ids are per user; global (prescription_id None) chats are never cached,
+    since that scope would be shared by every user.
+
+    A new question is served from the cache when its cosine similarity to a cached
+    question in the same scope reaches `threshold`. Entries expire after `ttl_seconds`,
+    the least recently used are evicted past `max_entries`, and re-indexing a
+    prescription drops its whole scope.
+    """
+    def __init__(self, threshold=None, ttl_seconds=None, max_entries=None):
+        self.threshold = Config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl_seconds = Config.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = Config.ANSWER_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries = OrderedDict() # entry id -> entry, in LRU order
+        self._scopes = {} # (prescription_id, language) -> set of entry ids
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def _scope(prescription_id, language):
+        return (prescription_id, (language or "English").lower())
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry:
+            scope_ids = self._scopes.get(entry["scope"])
+            if scope_ids is not None:
+                scope_ids.discard(entry_id)
+                if not scope_ids:
+                    del self._scopes[entry["scope"]]
+
+    def lookup(self, prescription_id, language, embedding):
+        """Returns (answer, similarity) for the closest cached question above the threshold, else None."""
+        if not prescription_id:
+            return None
+        scope = self._scope(prescription_id, language)
+        query = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            ids = list(self._scopes.get(scope, ()))
+            for entry_id in ids:
+                if now - self._entries[entry_id]["created_at"] > self.ttl_seconds:
+                    self._drop(entry_id)
+            ids = list(self._scopes.get(scope, ()))
+            if not ids:
+                self.stats["misses"] += 1
+                return None
+
+            scores = np.stack([self._entries[i]["embedding"] for i in ids]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.stats["hits"] += 1
+            return self._entries[entry_id]["answer"], float(scores[best])
+
+    def store(self, prescription_id, language, question, embedding, answer):
+        if not prescription_id:
+            return
+        scope = self._scope(prescription_id, language)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "scope": scope,
+                "question": question,
+                "embedding": self._normalize(embedding),
+                "answer": answer,
+                "created_at": time.time(),
+            }
+            self._scopes.setdefault(scope, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, prescription_id):
+        """Drops every cached answer for a prescription, in all languages."""
+        with self._lock:
+            doomed = [i for i, e in self._entries.items() if e["scope"][0] == prescription_id]
+            for entry_id in doomed:
+                self._drop(entry_id)
+            if doomed:
+                self.stats["invalidations"] += 1
+        if doomed:
+            logger.info(f"Invalidated {len(doomed)} cached answers for prescription {prescription_id}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Returns the process-wide SemanticAnswerCache."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SemanticAnswerCache()
+        return _shared_cache
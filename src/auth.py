@@ -2,6 +2,7 @@ import bcrypt
 from pymongo import MongoClient
 from datetime import datetime
 from src.config import Config
+from src.db_indexes import ensure_indexes
 from src.utils import setup_logger
 
 logger = setup_logger(__name__)
@@ -10,10 +11,11 @@ class AuthManager:
     """
     Manages User Authentication (Login/Register).
     """
-    def __init__(self):
-        self.client = MongoClient(Config.MONGO_URI)
-        self.db = self.client.get_database("prescription_db")
+    def __init__(self, client=None):
+        self.client = client or MongoClient(Config.MONGO_URI)
+        self.db = self.client.get_database(Config.MONGO_DB_NAME)
         self.users = self.db.users
+        ensure_indexes(self.db)
 
     def register_user(self, username, password):
         """Registers a new user."""
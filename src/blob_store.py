@@ -0,0 +1,243 @@
+"""
+Content-addressed store for uploaded prescription files.
+
+Usage:
+    python -m src.blob_store gc [--grace-hours 24] [--reconcile] [--dry-run]
+"""
+import argparse
+import contextlib
+import hashlib
+import mmap
+import os
+import time
+import uuid
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def mapped(path):
+    """
+    Read-only memory map of a file, usable wherever a binary file object is
+    (PIL, pypdf), so readers page the file in instead of copying it into memory.
+    Empty files, which can't be mapped, are opened as regular files.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+class BlobStore:
+    """
+    Uploaded files stored once per distinct content, under their SHA-256.
+
+    Layout: <root>/<h[:2]>/<h[2:4]>/<h><ext>. Writes stream into <root>/tmp while
+    being hashed and are moved into place with an atomic rename, so a blob path
+    either doesn't exist or holds the complete file.
+
+    References live in the MongoDB `blobs` collection as a set of owners per blob
+    (a chat session, or an upload job while it runs); retain/release are idempotent.
+    gc() deletes blobs without owners once they are older than a grace period.
+    """
+    def __init__(self, root=None, client=None):
+        self.root = root or Config.BLOB_DIR
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._client = client
+
+    @property
+    def refs(self):
+        # Only reference counting needs MongoDB; process-pool workers that just store blobs never connect
+        if self._client is None:
+            self._client = MongoClient(Config.MONGO_URI)
+        return self._client.get_database(Config.MONGO_DB_NAME).blobs
+
+    def _shard_dir(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4])
+
+    def path_for(self, digest):
+        """Path of a stored blob, or None."""
+        shard = self._shard_dir(digest)
+        try:
+            for name in os.listdir(shard):
+                if name.startswith(digest):
+                    return os.path.join(shard, name)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def put(self, source, ext="", expected_digest=None, known_digest=None, chunk_size=CHUNK_SIZE):
+        """
+        Streams a binary file object into the store, hashing as it writes.
+        Returns (digest, path, size). Content that is already stored is not written twice.
+        Pass `known_digest` when the caller has just hashed the same bytes (see
+        extraction_cache.content_hash): they are then copied without hashing again,
+        and not even read if that content is already stored.
+        """
+        if known_digest:
+            existing = self.path_for(known_digest)
+            if existing:
+                os.utime(existing)
+                return known_digest, existing, os.path.getsize(existing)
+        digest = hashlib.sha256() if not known_digest else None
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            with open(tmp_path, "wb") as out:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    if digest:
+                        digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            hex_digest = digest.hexdigest() if digest else known_digest
+            if expected_digest and hex_digest != expected_digest:
+                raise ValueError(f"Content hash mismatch: expected {expected_digest[:12]}, got {hex_digest[:12]}")
+
+            existing = self.path_for(hex_digest)
+            if existing:
+                os.remove(tmp_path)
+                # Fresh mtime restarts the GC grace period until the caller retains it
+                os.utime(existing)
+                return hex_digest, existing, size
+            os.makedirs(self._shard_dir(hex_digest), exist_ok=True)
+            path = os.path.join(self._shard_dir(hex_digest), hex_digest + ext.lower())
+            os.replace(tmp_path, path)
+            logger.info(f"Stored blob {hex_digest[:12]} ({size} bytes)")
+            return hex_digest, path, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            if hasattr(source, "seek"):
+                source.seek(0)
+
+    def put_file(self, file_path, expected_digest=None):
+        """put() for a file already on disk, keeping its extension."""
+        with open(file_path, "rb") as f:
+            return self.put(f, ext=os.path.splitext(file_path)[1], expected_digest=expected_digest)
+
+    def retain(self, digest, owner):
+        """Adds `owner` to the blob's references."""
+        self.retain_many([(digest, owner)])
+
+    def retain_many(self, pairs):
+        """retain() for many (digest, owner) pairs in one bulk write."""
+        if not pairs:
+            return
+        now = datetime.utcnow()
+        try:
+            self.refs.bulk_write([
+                UpdateOne({"_id": digest}, {"$addToSet": {"owners": owner}, "$set": {"updated_at": now},
+                                            "$setOnInsert": {"created_at": now}}, upsert=True)
+                for digest, owner in pairs
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to retain {len(pairs)} blob references: {e}")
+
+    def release(self, digest, owner):
+        """Drops `owner` from the blob's references."""
+        try:
+            self.refs.update_one({"_id": digest}, {"$pull": {"owners": owner}, "$set": {"updated_at": datetime.utcnow()}})
+        except Exception as e:
+            logger.error(f"Failed to release blob {digest[:12]} for {owner}: {e}")
+
+    def refcount(self, digest):
+        doc = self.refs.find_one({"_id": digest}, {"owners": 1})
+        return len(doc.get("owners", [])) if doc else 0
+
+    def reconcile(self, sessions):
+        """Rebuilds session references from the sessions collection (e.g. for sessions created before blobs)."""
+        from src.prescription_pipeline import session_owner
+        pairs = [(doc["content_hash"], session_owner(doc["user_id"], doc["prescription_id"]))
+                 for doc in sessions.find({"content_hash": {"$exists": True}},
+                                          {"content_hash": 1, "user_id": 1, "prescription_id": 1})]
+        self.retain_many(pairs)
+        return len(pairs)
+
+    def gc(self, grace_seconds=None, dry_run=False):
+        """
+        Deletes unreferenced blobs older than the grace period, and stale temp files.
+        The grace period covers the gap between put() and the first retain().
+        """
+        grace_seconds = Config.BLOB_GC_GRACE_HOURS * 3600 if grace_seconds is None else grace_seconds
+        cutoff = time.time() - grace_seconds
+        summary = {"scanned": 0, "deleted": 0, "bytes_freed": 0, "tmp_deleted": 0}
+
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            if os.path.getmtime(path) < cutoff:
+                if not dry_run:
+                    os.remove(path)
+                summary["tmp_deleted"] += 1
+
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                dirnames[:] = [d for d in dirnames if d != "tmp"]
+                continue
+            candidates = {}
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                summary["scanned"] += 1
+                if os.path.getmtime(path) < cutoff:
+                    candidates[os.path.splitext(name)[0]] = path
+            if not candidates:
+                continue
+            referenced = {doc["_id"] for doc in self.refs.find(
+                {"_id": {"$in": list(candidates)}, "owners.0": {"$exists": True}}, {"_id": 1})}
+            for digest, path in candidates.items():
+                if digest in referenced:
+                    continue
+                size = os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+                    self.refs.delete_one({"_id": digest, "owners.0": {"$exists": False}})
+                summary["deleted"] += 1
+                summary["bytes_freed"] += size
+        logger.info(f"Blob GC: {summary}")
+        return summary
+
+    def get_stats(self):
+        """Blob count and total size. Walks the whole store, so call it on demand only."""
+        blobs = total = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root:
+                dirnames[:] = [d for d in dirnames if d != "tmp"]
+            blobs += len(filenames)
+            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return {"blobs": blobs, "bytes": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["gc"])
+    parser.add_argument("--grace-hours", type=float, default=Config.BLOB_GC_GRACE_HOURS)
+    parser.add_argument("--reconcile", action="store_true", help="First add references for every session's content hash")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted")
+    args = parser.parse_args()
+
+    store = BlobStore()
+    if args.reconcile:
+        sessions = store.refs.database.sessions
+        print(f"Reconciled {store.reconcile(sessions)} session references")
+    summary = store.gc(grace_seconds=args.grace_hours * 3600, dry_run=args.dry_run)
+    prefix = "[dry run] " if args.dry_run else ""
+    print(f"{prefix}Deleted {summary['deleted']} of {summary['scanned']} blobs ({summary['bytes_freed']} bytes) "
+          f"and {summary['tmp_deleted']} stale temp files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Bulk prescription ingestion for onboarding a backlog of files.
+
+Walks a directory for PDFs and images, copies each into the blob store (hashing it on
+the way) and extracts it through a worker pool, then embeds + upserts the vectors and
+creates the chat sessions in batches. Every file's
+outcome is appended to a JSONL manifest; a rerun skips files already recorded as done
+(or duplicate) with an unchanged size and mtime, so a crashed run resumes where it stopped.
+
+Usage:
+    python -m src.bulk_ingest data/input --user clinic_a
+    python -m src.bulk_ingest data/input --user clinic_a --workers 8 --executor process --batch-size 64
+    python -m src.bulk_ingest data/input --user clinic_a --retry-failed
+
+Prints throughput and p50/p95 timings per stage (store, extract, index, session).
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from src.config import Config
+from src.prescription_pipeline import prescription_id_for
+from src.tracing import get_tracer
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+SKIP_STATUSES = ("done", "duplicate")
+
+# Blob store and extraction-only pipeline of a process-pool worker (thread workers use the registry's)
+_worker_blob_store = None
+_worker_pipeline = None
+
+
+class IngestManifest:
+    """Append-only JSONL record of per-file outcomes; the last entry for a file wins."""
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # torn last line from a crash
+                    self.entries[(entry["user_id"], entry["path"])] = entry
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a")
+
+    def is_settled(self, user_id, path, retry_failed=False):
+        """True if the file was already handled and hasn't changed since."""
+        entry = self.entries.get((user_id, path))
+        if not entry:
+            return False
+        statuses = SKIP_STATUSES if retry_failed else SKIP_STATUSES + ("failed",)
+        stat = os.stat(path)
+        return entry["status"] in statuses and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime
+
+    def record(self, entry):
+        entry["at"] = time.time()
+        self.entries[(entry["user_id"], entry["path"])] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def find_files(root):
+    """Supported files under `root`, in a stable order."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, name) for name in sorted(filenames)
+                     if name.lower().endswith(SUPPORTED_EXTENSIONS))
+    return paths
+
+
+def _init_process_worker():
+    global _worker_blob_store, _worker_pipeline
+    from src.blob_store import BlobStore
+    from src.extraction_cache import ExtractionCache
+    from src.extractor import PrescriptionExtractor
+    from src.prescription_pipeline import PrescriptionPipeline
+    cache = ExtractionCache() if Config.EXTRACTION_CACHE_ENABLED else None
+    _worker_blob_store = BlobStore()
+    _worker_pipeline = PrescriptionPipeline(PrescriptionExtractor(), None, None, extraction_cache=cache)
+
+
+def _extract_file(path):
+    """Store + extract one file. Runs on a pool worker."""
+    from src.registry import get_registry
+    blob_store = _worker_blob_store or get_registry().blob_store
+    pipeline = _worker_pipeline or get_registry().pipeline
+    result = {"path": path, "timings": {}}
+    with get_tracer().trace("bulk_ingest.file", filename=os.path.basename(path)):
+        try:
+            start = time.perf_counter()
+            result["content_hash"], blob_path, result["size_bytes"] = blob_store.put_file(path)
+            result["timings"]["store_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            result["data"], result["cached"], result["timings"]["extract_ms"] = pipeline.extract(blob_path, result["content_hash"])
+        except Exception as e:
+            result["error"] = str(e)
+    return result
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+class BulkIngester:
+    def __init__(self, user_id, manifest, workers=None, executor="thread", batch_size=None, retry_failed=False):
+        from src.registry import get_registry
+        self.user_id = user_id
+        self.manifest = manifest
+        self.workers = workers or Config.BULK_INGEST_WORKERS
+        self.executor = executor
+        self.batch_size = batch_size or Config.BULK_INGEST_BATCH_SIZE
+        self.retry_failed = retry_failed
+        self.registry = get_registry()
+        self.pipeline = self.registry.pipeline
+        self.timings = {"store_ms": [], "extract_ms": [], "index_ms": [], "session_ms": []}
+        self.counts = {"done": 0, "duplicate": 0, "failed": 0, "skipped": 0}
+        self._seen_hashes = set()
+
+    def _record(self, result, status, **fields):
+        stat = os.stat(result["path"])
+        entry = {"path": result["path"], "user_id": self.user_id, "status": status,
+                 "content_hash": result.get("content_hash"), "size": stat.st_size, "mtime": stat.st_mtime,
+                 "timings": result.get("timings", {})}
+        entry.update(fields)
+        self.manifest.record(entry)
+        self.counts[status] += 1
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            with get_tracer().trace("bulk_ingest.batch", files=len(batch)):
+                index_ms = self.pipeline.index(batch)
+                session_ms = self.pipeline.register(batch)
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} files failed to index: {e}")
+            for item in batch:
+                self._record(item["result"], "failed", error=str(e))
+                self._seen_hashes.discard(item["content_hash"])
+            return
+        self.timings["index_ms"].append(index_ms)
+        self.timings["session_ms"].append(session_ms)
+        for item in batch:
+            self._record(item["result"], "done", prescription_id=item["prescription_id"])
+        self.manifest.sync()
+        logger.info(f"Indexed a batch of {len(batch)} files ({index_ms}ms index, {session_ms}ms sessions)")
+
+    def _handle(self, result, batch):
+        for stage, ms in result["timings"].items():
+            self.timings[stage].append(ms)
+        if result.get("error") or not result.get("data"):
+            self._record(result, "failed", error=result.get("error") or "Failed to extract data.")
+            return
+        digest = result["content_hash"]
+        existing = self.registry.memory.get_prescription_by_hash(self.user_id, digest)
+        if existing or digest in self._seen_hashes:
+            self._record(result, "duplicate", prescription_id=existing or prescription_id_for(self.user_id, digest))
+            return
+        self._seen_hashes.add(digest)
+        batch.append({
+            "prescription_id": prescription_id_for(self.user_id, digest), "data": result["data"],
+            "cached": result["cached"], "filename": os.path.basename(result["path"]), "user_id": self.user_id,
+            "content_hash": digest, "size_bytes": result["size_bytes"], "result": result,
+        })
+
+    def run(self, paths):
+        todo = [p for p in paths if not self.manifest.is_settled(self.user_id, p, self.retry_failed)]
+        self.counts["skipped"] = len(paths) - len(todo)
+        if self.counts["skipped"]:
+            logger.info(f"Skipping {self.counts['skipped']} files already in the manifest")
+
+        if self.executor == "process":
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_process_worker)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-ingest")
+        batch = []
+        try:
+            futures = [pool.submit(_extract_file, path) for path in todo]
+            for future in as_completed(futures):
+                self._handle(future.result(), batch)
+                if len(batch) >= self.batch_size:
+                    self._flush(batch)
+                    batch = []
+            self._flush(batch)
+        finally:
+            # On Ctrl-C, drop what hasn't started; the manifest already holds every flushed batch
+            pool.shutdown(wait=True, cancel_futures=True)
+        return len(todo)
+
+    def report(self, elapsed, processed):
+        print(f"\nProcessed {processed} files in {elapsed:.1f}s "
+              f"({processed / elapsed if elapsed > 0 else 0:.2f} files/s): "
+              f"{self.counts['done']} indexed, {self.counts['duplicate']} duplicates, "
+              f"{self.counts['failed']} failed, {self.counts['skipped']} skipped (already in manifest)")
+        print(f"\n{'stage':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, values in self.timings.items():
+            if values:
+                name = stage[:-3] + (" (per batch)" if stage in ("index_ms", "session_ms") else "")
+                print(f"{name:<20}{len(values):>7}{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default=Config.INPUT_DIR)
+    parser.add_argument("--user", required=True, help="User the prescriptions are created for")
+    parser.add_argument("--workers", type=int, default=Config.BULK_INGEST_WORKERS)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Pool for extraction (threads suit the API-bound default path)")
+    parser.add_argument("--batch-size", type=int, default=Config.BULK_INGEST_BATCH_SIZE,
+                        help="Files per vector upsert / session bulk write")
+    parser.add_argument("--manifest", default=os.path.join(Config.PROCESSED_DIR, "ingest_manifest.jsonl"))
+    parser.add_argument("--retry-failed", action="store_true", help="Also retry files the manifest lists as failed")
+    args = parser.parse_args()
+
+    paths = find_files(args.directory)
+    if not paths:
+        print(f"No supported files found in {args.directory}")
+        sys.exit(1)
+
+    manifest = IngestManifest(args.manifest)
+    ingester = BulkIngester(args.user, manifest, workers=args.workers, executor=args.executor,
+                            batch_size=args.batch_size, retry_failed=args.retry_failed)
+    print(f"Ingesting {len(paths)} files from {args.directory} for '{args.user}' "
+          f"({args.workers} {args.executor} workers, batches of {args.batch_size})")
+    start = time.perf_counter()
+    try:
+        processed = ingester.run(paths)
+    except KeyboardInterrupt:
+        processed = sum(ingester.counts[s] for s in ("done", "duplicate", "failed"))
+        print("\nInterrupted; rerun the same command to resume from the manifest.")
+    finally:
+        manifest.close()
+        ingester.registry.memory.flush()
+    ingester.report(time.perf_counter() - start, processed)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,25 +11,128 @@ class Config:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
     MONGO_URI = os.getenv("MONGO_URI")
+    MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "prescription_db")
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50")) # Shared by all sessions in the process
     
     # Pinecone settings
     PINECONE_INDEX_NAME = "prescription-index"
     PINECONE_ENV = "us-east-1"
 
+    # Vector store backend: "pinecone" (managed) or "local" (embedded NumPy index on disk)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+    EMBEDDING_MODEL_NAME = "models/text-embedding-004"
+    EMBEDDING_DIMENSION = 768
+
+    # Embedding batching (Gemini accepts up to 100 texts per request)
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+    EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    EMBED_RATE_LIMIT = float(os.getenv("EMBED_RATE_LIMIT", "10")) # Batch requests per second, 0 = unlimited
+
+    # Retrieval over per-medicine chunks: candidates fetched, chunks kept, and how far below the best match a kept chunk may score
+    RETRIEVE_CANDIDATES = int(os.getenv("RETRIEVE_CANDIDATES", "8"))
+    RETRIEVE_TOP_K = int(os.getenv("RETRIEVE_TOP_K", "5"))
+    RETRIEVE_SCORE_MARGIN = float(os.getenv("RETRIEVE_SCORE_MARGIN", "0.1"))
+
     # Gemini Model
     GEMINI_MODEL_NAME = "gemini-2.5-flash-lite" # Using the flash lite model as requested
 
+    # Verify the Pinecone index and sync the OTC catalog on background threads so pages render immediately
+    BACKGROUND_BOOTSTRAP = os.getenv("BACKGROUND_BOOTSTRAP", "true").lower() == "true"
+
+    # Write-behind chat message persistence (batched insert_many + coalesced last_active updates)
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "true").lower() == "true"
+    WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "100"))
+    WRITE_BEHIND_FLUSH_MS = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "500"))
+
+    # Chat history layout: "flat" (one document per message) or "bucketed" (MESSAGE_BUCKET_SIZE messages per document)
+    MESSAGE_STORAGE = os.getenv("MESSAGE_STORAGE", "flat").lower()
+    MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "50"))
+
+    # Stream chat answers token by token (False = wait for the full answer via the async graph)
+    STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() == "true"
+
+    # Semantic answer cache (per prescription + language)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+    # Intent router: answer schedule/dosage/duration/list questions from the extraction without the LLM
+    INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+
+    # Prompt budget: tokens for instructions + context + history, and history's share of what instructions leave
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+    PROMPT_HISTORY_SHARE = float(os.getenv("PROMPT_HISTORY_SHARE", "0.35"))
+
+    # OTC alias matcher: fuzzy (trigram) matches must clear the threshold and beat the runner-up by the margin
+    OTC_FUZZY_THRESHOLD = float(os.getenv("OTC_FUZZY_THRESHOLD", "0.8"))
+    OTC_FUZZY_MARGIN = float(os.getenv("OTC_FUZZY_MARGIN", "0.1"))
+
+    # Cross-user OTC verdict cache (MongoDB, expires with a TTL index)
+    OTC_VERDICT_TTL_DAYS = int(os.getenv("OTC_VERDICT_TTL_DAYS", "30"))
+    OTC_VERDICT_CACHE_ITEMS = int(os.getenv("OTC_VERDICT_CACHE_ITEMS", "2048"))
+
+    # PDF pages with at least this many text-layer characters are sent as text instead of uploading the file
+    PDF_TEXT_FAST_PATH = os.getenv("PDF_TEXT_FAST_PATH", "true").lower() == "true"
+    PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "40"))
+    # Embedded images at least this many pixels are treated as a scan and always sent (logos/stamps are smaller)
+    PDF_SCAN_MIN_PIXELS = int(os.getenv("PDF_SCAN_MIN_PIXELS", "160000"))
+
+    # Multi-page PDFs / image lists: one extraction request per page, run concurrently, then merged
+    EXTRACT_PAGES_IN_PARALLEL = os.getenv("EXTRACT_PAGES_IN_PARALLEL", "true").lower() == "true"
+    EXTRACT_PAGE_WORKERS = int(os.getenv("EXTRACT_PAGE_WORKERS", "4"))
+    EXTRACT_PAGE_RETRIES = int(os.getenv("EXTRACT_PAGE_RETRIES", "2"))
+
+    # Background upload jobs (app) and the bulk ingestion CLI
+    UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+    UPLOAD_JOB_STALE_SECONDS = int(os.getenv("UPLOAD_JOB_STALE_SECONDS", "300")) # Active jobs idle this long are resumed
+    UPLOAD_JOB_RETENTION_DAYS = int(os.getenv("UPLOAD_JOB_RETENTION_DAYS", "7")) # Finished jobs are kept this long
+    UPLOAD_POLL_SECONDS = float(os.getenv("UPLOAD_POLL_SECONDS", "2"))
+    BULK_INGEST_WORKERS = int(os.getenv("BULK_INGEST_WORKERS", "4"))
+    BULK_INGEST_BATCH_SIZE = int(os.getenv("BULK_INGEST_BATCH_SIZE", "32"))
+
+    # Image preprocessing before Gemini extraction
+    IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "true").lower() == "true"
+    IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600")) # Long edge in pixels
+    IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "false").lower() == "true"
+    IMAGE_AUTOCONTRAST = os.getenv("IMAGE_AUTOCONTRAST", "false").lower() == "true"
+    IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG") # JPEG or WEBP
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+    IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(500 * 1024)))
+
+    # Extraction results shared across users, keyed by the SHA-256 of the uploaded file
+    EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+    EXTRACTION_CACHE_TTL_DAYS = int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "180")) # Since last use
+    EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "10000"))
+
     # Paths
     DATA_DIR = os.path.join(os.getcwd(), "data")
     INPUT_DIR = os.path.join(DATA_DIR, "input")
     PROCESSED_DIR = os.path.join(DATA_DIR, "processed")
+    BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(DATA_DIR, "blobs")) # Uploads, stored by content hash
+    BLOB_GC_GRACE_HOURS = float(os.getenv("BLOB_GC_GRACE_HOURS", "24")) # Unreferenced blobs younger than this are kept
+    LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(DATA_DIR, "vector_index"))
+    CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+
+    # Embedding cache (in-memory LRU + on-disk float32 records)
+    EMBED_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+    EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "4096"))
+    EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "64"))
+
+    # Tracing: spans of chat turns and uploads in a local SQLite ring buffer (Performance page)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_DB_PATH = os.getenv("TRACE_DB_PATH", os.path.join(CACHE_DIR, "traces.sqlite3"))
+    TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "50000"))
+    TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "2"))
+    TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "3000")) # Turns/uploads slower than this are listed as slow
+    ADMIN_USERS = [u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()] # Can open the Performance page
 
     @staticmethod
     def validate():
         """Validate that all necessary API keys are present."""
         if not Config.MONGO_URI:
             raise ValueError("MONGO_URI is missing in .env")
-        if not Config.PINECONE_API_KEY:
+        if Config.VECTOR_BACKEND == "pinecone" and not Config.PINECONE_API_KEY:
             raise ValueError("PINECONE_API_KEY is missing in .env")
         if not Config.GOOGLE_API_KEY:
             print("Warning: GOOGLE_API_KEY is missing. Ensure you have access.")
@@ -0,0 +1,57 @@
+import threading
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Indexes backing every query issued by MemoryManager and AuthManager
+INDEX_SPECS = {
+    "messages": [
+        # get_history: find(session_id).sort(timestamp desc), walked backwards
+        IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING)], name="session_timestamp"),
+    ],
+    "message_buckets": [
+        # MessageBucketStore.tail: newest buckets of a session
+        IndexModel([("session_id", ASCENDING), ("opened_at", DESCENDING)], name="session_opened_at"),
+    ],
+    "sessions": [
+        # get_session_details / get_summary / update_* by session_id
+        IndexModel([("session_id", ASCENDING)], name="session_id", unique=True),
+        # get_or_create_session: user_id + prescription_id
+        IndexModel([("user_id", ASCENDING), ("prescription_id", ASCENDING)], name="user_prescription"),
+        # get_user_prescriptions: user_id, sorted by last_active
+        IndexModel([("user_id", ASCENDING), ("last_active", DESCENDING)], name="user_last_active"),
+        # get_prescription_by_filename: user_id + filename
+        IndexModel([("user_id", ASCENDING), ("filename", ASCENDING)], name="user_filename"),
+        # get_prescription_by_hash: user_id + content_hash
+        IndexModel([("user_id", ASCENDING), ("content_hash", ASCENDING)], name="user_content_hash"),
+        # get_all_sessions: sorted by last_active
+        IndexModel([("last_active", DESCENDING)], name="last_active"),
+    ],
+    "users": [
+        # AuthManager login/register
+        IndexModel([("username", ASCENDING)], name="username", unique=True),
+    ],
+}
+
+_bootstrapped = set()
+_lock = threading.Lock()
+
+
+def ensure_indexes(db, force=False):
+    """
+    Idempotently creates the indexes in INDEX_SPECS on `db`.
+    Runs once per database per process; later calls are free unless force=True.
+    """
+    key = (id(db.client), db.name)
+    with _lock:
+        if key in _bootstrapped and not force:
+            return
+        for collection, indexes in INDEX_SPECS.items():
+            try:
+                # create_indexes is a no-op for indexes that already exist with the same spec
+                db[collection].create_indexes(indexes)
+            except Exception as e:
+                logger.error(f"Failed to create indexes on {db.name}.{collection}: {e}")
+        _bootstrapped.add(key)
+    logger.info(f"MongoDB indexes verified on '{db.name}'")
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from src.config import Config
+from src.tracing import get_tracer
+from src.utils import setup_logger, ensure_directory
+
+logger = setup_logger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model name, SHA-256 of the text).
+
+    Two tiers:
+    - an in-memory LRU of recently used vectors,
+    - an on-disk SQLite table of compact float32 records, evicted least-recently-used
+      first once it grows past `max_disk_bytes`.
+    """
+    def __init__(self, path, memory_items=4096, max_disk_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        ensure_directory(os.path.dirname(self.path))
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def _hash(text):
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get_many(self, model, texts):
+        """Returns a list aligned with `texts`: the cached vector, or None on a miss."""
+        keys = [(model, self._hash(t)) for t in texts]
+        results = [None] * len(texts)
+        disk_lookups = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.stats["memory_hits"] += 1
+                else:
+                    disk_lookups.append(i)
+
+            if disk_lookups:
+                now = time.time()
+                for i in disk_lookups:
+                    row = self._conn.execute(
+                        "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", keys[i]
+                    ).fetchone()
+                    if row is None:
+                        self.stats["misses"] += 1
+                        continue
+                    vector = array("f", row[0]).tolist()
+                    results[i] = vector
+                    self._remember(keys[i], vector)
+                    self.stats["disk_hits"] += 1
+                    self._conn.execute(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?", (now, *keys[i])
+                    )
+                self._conn.commit()
+
+        return results
+
+    def put_many(self, model, texts, vectors):
+        """Stores vectors for `texts` in both tiers."""
+        now = time.time()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = (model, self._hash(text))
+                blob = array("f", vector).tobytes()
+                previous = self._conn.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND text_hash = ?", key
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    (*key, blob, now),
+                )
+                self._disk_bytes += len(blob) - (previous[0] if previous else 0)
+                self._remember(key, list(vector))
+            self._evict_disk()
+            self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Drops least-recently-used records until the disk tier fits its byte budget."""
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = self._conn.execute(
+                "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_used ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            for model, text_hash, size in rows:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                self._conn.execute("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, text_hash))
+                self._disk_bytes -= size
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        """Returns hit/miss counters plus current tier sizes."""
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+            stats["memory_items"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings object so every embed call goes through the EmbeddingCache.
+    Only texts that miss both tiers are sent to the provider.
+    """
+    def __init__(self, embeddings, cache, model_name):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def _cache_model(self, task_type):
+        # Query and document task types produce different vectors, so they are cached apart
+        return f"{self.model_name}|{task_type or 'RETRIEVAL_QUERY'}"
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text], task_type=kwargs.pop("task_type", "RETRIEVAL_QUERY"), **kwargs)[0]
+
+    def embed_documents(self, texts, **kwargs):
+        task_type = kwargs.get("task_type", "RETRIEVAL_DOCUMENT")
+        model = self._cache_model(task_type)
+        vectors = self.cache.get_many(model, texts)
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+
+        if missing:
+            miss_texts = list(missing)
+            with get_tracer().span("gemini.embed", texts=len(miss_texts)):
+                if len(miss_texts) == 1 and task_type == "RETRIEVAL_QUERY":
+                    fresh = [self.embeddings.embed_query(miss_texts[0])]
+                else:
+                    fresh = self.embeddings.embed_documents(miss_texts, **kwargs)
+            self.cache.put_many(model, miss_texts, fresh)
+            for text, vector in zip(miss_texts, fresh):
+                for i in missing[text]:
+                    vectors[i] = list(vector)
+
+        return vectors
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Returns the process-wide EmbeddingCache, creating it on first use."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache(
+                Config.EMBED_CACHE_PATH,
+                memory_items=Config.EMBED_CACHE_MEMORY_ITEMS,
+                max_disk_bytes=Config.EMBED_CACHE_MAX_MB * 1024 * 1024,
+            )
+        return _shared_cache
@@ -0,0 +1,141 @@
+import hashlib
+import threading
+from datetime import datetime
+from pymongo import MongoClient, ASCENDING
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(source, chunk_size=HASH_CHUNK_SIZE):
+    """
+    SHA-256 hex digest of a file path or binary file object, read in chunks so
+    large uploads are never held in memory twice. File objects are rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    start = source.tell() if hasattr(source, "tell") else None
+    if start is not None:
+        source.seek(0)
+    for chunk in iter(lambda: source.read(chunk_size), b""):
+        digest.update(chunk)
+    if start is not None:
+        source.seek(start)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Extraction results keyed by the SHA-256 of the uploaded bytes, shared across users.
+
+    Each entry holds the structured JSON from Gemini plus the indexed text chunks and
+    their embeddings, so an identical upload skips both extraction and embedding.
+    Vectors are still written per upload (under the uploader's own prescription id),
+    so retrieval stays scoped to each user's prescriptions.
+
+    Retention: entries expire EXTRACTION_CACHE_TTL_DAYS after their last use (TTL
+    index), and past EXTRACTION_CACHE_MAX_ENTRIES the least recently used are evicted.
+    """
+    def __init__(self, client=None):
+        self.client = client or MongoClient(Config.MONGO_URI)
+        self.collection = self.client.get_database(Config.MONGO_DB_NAME).extractions
+        self.max_entries = Config.EXTRACTION_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        try:
+            self.collection.create_index([("content_hash", ASCENDING)], unique=True, name="content_hash")
+            self.collection.create_index(
+                "last_used", expireAfterSeconds=Config.EXTRACTION_CACHE_TTL_DAYS * 86400, name="extraction_ttl"
+            )
+        except Exception as e:
+            logger.error(f"Failed to create extraction cache indexes: {e}")
+
+    def get(self, digest):
+        """Returns the cached entry for a content hash, or None."""
+        try:
+            entry = self.collection.find_one_and_update(
+                {"content_hash": digest},
+                {"$set": {"last_used": datetime.utcnow()}, "$inc": {"hits": 1}},
+                projection={"_id": 0},
+            )
+        except Exception as e:
+            logger.error(f"Extraction cache lookup failed: {e}")
+            entry = None
+        with self._lock:
+            self.stats["hits" if entry else "misses"] += 1
+        if entry:
+            logger.info(f"Extraction cache hit for {digest[:12]} (reused {entry.get('hits', 0) + 1} times)")
+        return entry
+
+    def put(self, digest, data, chunks=None, embeddings=None, size_bytes=None):
+        """Stores the extraction result (and optionally the embedded chunks) for a content hash."""
+        now = datetime.utcnow()
+        try:
+            self.collection.update_one(
+                {"content_hash": digest},
+                {
+                    "$set": {"data": data, "chunks": chunks, "embeddings": embeddings,
+                             "size_bytes": size_bytes, "last_used": now},
+                    "$setOnInsert": {"created_at": now, "hits": 0},
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.error(f"Failed to store extraction for {digest[:12]}: {e}")
+            return
+        with self._lock:
+            self.stats["stores"] += 1
+            self._writes_since_evict += 1
+            due = self._writes_since_evict >= 50
+            if due:
+                self._writes_since_evict = 0
+        if due:
+            self.evict()
+
+    @staticmethod
+    def embeddings_for(entry, chunks):
+        """The cached embeddings if they were computed for exactly these chunks, else None."""
+        if entry and entry.get("embeddings") and entry.get("chunks") == list(chunks):
+            return entry["embeddings"]
+        return None
+
+    def evict(self):
+        """Deletes the least recently used entries beyond max_entries."""
+        try:
+            excess = self.collection.estimated_document_count() - self.max_entries
+            if excess <= 0:
+                return 0
+            # Oldest first, via the TTL index on last_used
+            doomed = [doc["_id"] for doc in
+                      self.collection.find({}, {"_id": 1}).sort("last_used", ASCENDING).limit(excess)]
+            deleted = self.collection.delete_many({"_id": {"$in": doomed}}).deleted_count
+        except Exception as e:
+            logger.error(f"Extraction cache eviction failed: {e}")
+            return 0
+        with self._lock:
+            self.stats["evictions"] += deleted
+        logger.info(f"Evicted {deleted} extraction cache entries")
+        return deleted
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        try:
+            stats["entries"] = self.collection.estimated_document_count()
+        except Exception as e:
+            logger.error(f"Failed to read extraction cache stats: {e}")
+        return stats
@@ -1,22 +1,19 @@
-import google.generativeai as genai
 from src.config import Config
+from src.image_preprocess import ImagePreprocessor
+from src.ingestion import IngestionManager
+from src.tracing import get_tracer, propagate
 from src.utils import setup_logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 import json
 import os
+import re
 import time
 
 logger = setup_logger(__name__)
 
-class PrescriptionExtractor:
-    def __init__(self):
-        if not Config.GOOGLE_API_KEY:
-            logger.warning("Google API Key not found")
-        else:
-            genai.configure(api_key=Config.GOOGLE_API_KEY)
-            self.model = genai.GenerativeModel(Config.GEMINI_MODEL_NAME)
-
-    def extract_data(self, file_input):
-        prompt = """
+# Prompt for every extraction request
+EXTRACTION_PROMPT = """
         You are an expert medical assistant. Analyze this prescription and extract the following information in JSON format.
         Focus strictly on the medicine details and instructions.
         
@@ -40,44 +37,258 @@ class PrescriptionExtractor:
         }
         If a field is missing, use "-". Return ONLY the JSON.
         """
+PAGE_HINT = "This is page {page} of {total} of the same prescription. Extract only what appears on this page."
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y", "%Y-%m-%d", "%Y/%m/%d",
+                "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y", "%d-%b-%Y")
+
 
+def _parse_date(value):
+    text = str(value or "").strip().rstrip(".")
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _medicine_key(med):
+    """Identity of a medicine entry for de-duplication across pages."""
+    name = re.sub(r"[^a-z0-9]+", " ", str(med.get("name", "")).lower()).strip()
+    return (name, str(med.get("quantity", "")).strip().lower(), str(med.get("frequency", "")).strip().lower())
+
+
+def merge_page_results(results):
+    """
+    Merges per-page extraction results (in page order) into one:
+    medicines are concatenated with repeats removed, the earliest parseable date
+    wins (else the first one given), and distinct notes are joined.
+    """
+    medicines, seen = [], {}
+    dates, notes = [], []
+    for result in results:
+        if not result:
+            continue
+        for med in result.get("medicines") or []:
+            key = _medicine_key(med)
+            if not key[0] or key[0] == "-":
+                continue
+            if key in seen:
+                # Fill fields the earlier page left blank
+                kept = seen[key]
+                for field, value in med.items():
+                    if kept.get(field) in (None, "", "-"):
+                        kept[field] = value
+                continue
+            seen[key] = med
+            medicines.append(med)
+        date = result.get("date")
+        if date and date != "-":
+            dates.append(date)
+        note = str(result.get("notes") or "").strip()
+        if note and note != "-" and note not in notes:
+            notes.append(note)
+
+    parsed = [(d, _parse_date(d)) for d in dates]
+    dated = [pair for pair in parsed if pair[1]]
+    date = min(dated, key=lambda pair: pair[1])[0] if dated else (dates[0] if dates else "-")
+    return {"date": date, "medicines": medicines, "notes": " ".join(notes) or "-"}
+
+
+class PrescriptionExtractor:
+    def __init__(self):
+        # Images are downscaled/re-encoded before upload (see ImagePreprocessor)
+        self.preprocessor = ImagePreprocessor() if Config.IMAGE_PREPROCESS else None
+        if not Config.GOOGLE_API_KEY:
+            logger.warning("Google API Key not found")
+        else:
+            import google.generativeai as genai
+            genai.configure(api_key=Config.GOOGLE_API_KEY)
+            self.model = genai.GenerativeModel(Config.GEMINI_MODEL_NAME)
+
+    def _image_part(self, source):
+        """Preprocessed image blob for generate_content(), or the image as-is when preprocessing is off."""
+        if not self.preprocessor:
+            if isinstance(source, str):
+                import PIL.Image
+                return PIL.Image.open(source)
+            return source
+        try:
+            part, stats = self.preprocessor.process(source)
+        except Exception as e:
+            logger.error(f"Image preprocessing failed, sending original: {e}")
+            import PIL.Image
+            return PIL.Image.open(source) if isinstance(source, str) else source
+        logger.info(
+            f"Preprocessed image {stats['original_size']} -> {stats['size']}, "
+            f"{stats['original_bytes'] or '?'} -> {stats['bytes']} bytes in {stats['ms']}ms"
+        )
+        return part
+
+    def _pdf_pages(self, file_path, report):
+        """
+        Content parts for a PDF built locally, one list per page: text-layer pages as
+        compact text, scanned pages as their (preprocessed) images, pages with both as
+        text plus images, and pages that yield
+        neither as an inline single-page PDF. Nothing is uploaded through the File API.
+        """
+        start = time.perf_counter()
+        pages = IngestionManager.split_pdf(file_path)
+        page_parts = []
+        for page in pages:
+            if page["kind"] == "text":
+                parts = [f"[Page {page['page']} - text layer]\n{page['text']}"]
+            elif page["kind"] == "mixed":
+                parts = [f"[Page {page['page']} - text layer and scanned image]\n{page['text']}"]
+                parts.extend(self._image_part(img) for img in page["images"])
+            elif page["kind"] == "image":
+                parts = [f"[Page {page['page']} - scanned image]"]
+                parts.extend(self._image_part(img) for img in page["images"])
+            else:
+                parts = [f"[Page {page['page']}]", self._pdf_page_part(file_path, page["page"])]
+            page_parts.append(parts)
+            logger.info(f"PDF page {page['page']}: {page['kind']} ({page['chars']} chars, "
+                        f"{len(page['images'])} images) classified in {page['ms']}ms")
+        report["pages"] = [{k: v for k, v in page.items() if k not in ("text", "images")} for page in pages]
+        report["split_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return page_parts
+
+    @staticmethod
+    def _pdf_page_part(file_path, number):
+        import io
+        import pypdf
+        from src.blob_store import mapped
+        with mapped(file_path) as view:
+            writer = pypdf.PdfWriter()
+            writer.add_page(pypdf.PdfReader(view).pages[number - 1])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+        return {"mime_type": "application/pdf", "data": buffer.getvalue()}
+
+    @staticmethod
+    def _upload_pdf(file_path, timeout=120):
+        """Uploads a PDF through the File API and polls with backoff until it is processed."""
+        import google.generativeai as genai
+        with get_tracer().span("gemini.upload_file"):
+            sample_file = genai.upload_file(path=file_path, display_name="Prescription")
+        delay, deadline = 0.25, time.monotonic() + timeout
+        while sample_file.state.name == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"File processing did not finish within {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 4)
+            sample_file = genai.get_file(sample_file.name)
+        return sample_file
+
+    @staticmethod
+    def _parse_response(text):
+        # Clean up markdown code blocks if present
+        if "```json" in text:
+            text = text.split("```json")[1].split("```")[0]
+        elif "```" in text:
+            text = text.split("```")[1].split("```")[0]
+        return json.loads(text.strip())
+
+    def _extract_page(self, number, total, parts):
+        start = time.perf_counter()
+        with get_tracer().span("gemini.extract_page", page=number, pages=total):
+            response = self.model.generate_content([EXTRACTION_PROMPT, PAGE_HINT.format(page=number, total=total)] + parts)
+        result = self._parse_response(response.text)
+        return result, round((time.perf_counter() - start) * 1000, 1)
+
+    def _extract_pages(self, pages, report):
+        """
+        Extracts each page in its own request, at most EXTRACT_PAGE_WORKERS at a time,
+        then merges the results. Pages that fail are retried on their own, up to
+        EXTRACT_PAGE_RETRIES times. If any page still fails the whole extraction fails
+        (returns None, with the pages in report["failed_pages"]): a merge of the other
+        pages would silently drop that page's medicines.
+        """
+        total = len(pages)
+        results, page_ms, attempts = {}, {}, {}
+        pending = list(range(total))
+        workers = max(1, min(Config.EXTRACT_PAGE_WORKERS, total))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract-page") as pool:
+            for attempt in range(Config.EXTRACT_PAGE_RETRIES + 1):
+                if not pending:
+                    break
+                futures = {pool.submit(propagate(self._extract_page), i + 1, total, pages[i]): i for i in pending}
+                failed = []
+                for future in as_completed(futures):
+                    i = futures[future]
+                    attempts[i + 1] = attempt + 1
+                    try:
+                        results[i], page_ms[i + 1] = future.result()
+                    except Exception as e:
+                        logger.warning(f"Page {i + 1}/{total} extraction failed (attempt {attempt + 1}): {e}")
+                        failed.append(i)
+                pending = sorted(failed)
+
+        report["page_ms"] = page_ms
+        report["page_attempts"] = attempts
+        report["failed_pages"] = [i + 1 for i in pending]
+        if pending:
+            logger.error(f"Pages {report['failed_pages']} could not be extracted; discarding the partial result")
+            return None
+        return merge_page_results([results[i] for i in sorted(results)])
+
+    def extract_data(self, file_input, report=None):
+        """
+        Extracts structured prescription data from a file path, PIL image or list of images.
+        Multi-page input is extracted page by page in parallel and merged (EXTRACT_PAGES_IN_PARALLEL).
+        Pass a dict as `report` to receive the path taken, per-page decisions and timings.
+        """
+        prompt = EXTRACTION_PROMPT
+
+        report = {} if report is None else report
+        start = time.perf_counter()
         try:
             content = []
             content.append(prompt)
             
+            # Per-page content parts, when the input has pages of its own
+            pages = None
             if isinstance(file_input, str):
-                if file_input.endswith(".pdf"):
-                    sample_file = genai.upload_file(path=file_input, display_name="Prescription")
-                    while sample_file.state.name == "PROCESSING":
-                        time.sleep(2)
-                        sample_file = genai.get_file(sample_file.name)
-                    content.append(sample_file)
+                if file_input.lower().endswith(".pdf"):
+                    if Config.PDF_TEXT_FAST_PATH:
+                        try:
+                            pages = self._pdf_pages(file_input, report)
+                            report["mode"] = "local"
+                        except Exception as e:
+                            logger.error(f"Local PDF split failed, uploading instead: {e}")
+                    if pages is None:
+                        content.append(self._upload_pdf(file_input))
+                        report["mode"] = "upload"
                 else:
-                    import PIL.Image
-                    img = PIL.Image.open(file_input)
-                    content.append(img)
+                    content.append(self._image_part(file_input))
             elif hasattr(file_input, 'read'):
                  # We might need to save it temporarily or convert to PIL
                  pass 
             else:
                 # Assume PIL Image or list of images
                 if isinstance(file_input, list):
-                    content.extend(file_input)
+                    pages = [[self._image_part(img)] for img in file_input]
                 else:
-                    content.append(file_input)
+                    content.append(self._image_part(file_input))
 
-            response = self.model.generate_content(content)
-            
-            # Parse JSON from response
-            text = response.text
-            # Clean up markdown code blocks if present
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0]
-            
-            return json.loads(text.strip())
+            model_start = time.perf_counter()
+            if pages is not None and len(pages) > 1 and Config.EXTRACT_PAGES_IN_PARALLEL:
+                report["mode"] = f"{report.get('mode', 'images')}-parallel"
+                result = self._extract_pages(pages, report)
+            else:
+                content.extend(part for parts in pages or [] for part in parts)
+                with get_tracer().span("gemini.extract", parts=len(content) - 1):
+                    response = self.model.generate_content(content)
+                # Parse JSON from response
+                result = self._parse_response(response.text)
+            report["model_ms"] = round((time.perf_counter() - model_start) * 1000, 1)
+            return result
 
         except Exception as e:
             logger.error(f"Extraction failed: {e}")
             return None
+        finally:
+            report["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            if "mode" in report:
+                logger.info(f"Extraction via {report['mode']} path: {report.get('split_ms', 0)}ms local, "
+                            f"{report.get('model_ms', 0)}ms model, {report['total_ms']}ms total")
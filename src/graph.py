@@ -1,13 +1,43 @@
-from typing import TypedDict, List, Optional
-from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, List, Optional, Annotated
 from src.config import Config
 from src.vector_store import VectorStoreManager
 from src.memory import MemoryManager
+from src.answer_cache import depends_on_history, get_answer_cache
+from src.intent_router import IntentRouter
+from src.prompt_budget import PromptBudget
+from src.tracing import current_trace_id, get_tracer, propagate
 from src.utils import setup_logger, remove_stopwords
 
 logger = setup_logger(__name__)
 
+PROMPT_TEMPLATE = """
+        You are a helpful medical assistant. Answer the user's question based on the provided context and chat history.
+
+        IMPORTANT INSTRUCTIONS:
+        1. Answer in the following language: {language}
+        2. If the user asks about a medicine ("What is this for?"), provide TWO things:
+           a) The specific instructions from the prescription (dosage, timing).
+           b) General medical knowledge about what the medicine is commonly used for (e.g., "Paracetamol is commonly used for fever and pain relief").
+
+        Context from Prescriptions:
+        {context}
+
+        Chat History:
+        {history}
+
+        User Question: {question}
+
+        Answer:
+        """
+
+def merge_timings(left, right):
+    """Reducer so parallel branches can each report their own timings."""
+    return {**(left or {}), **(right or {})}
+
 class GraphState(TypedDict):
     question: str
     prescription_id: Optional[str] # None for Global, ID for Local
@@ -15,88 +45,367 @@ class GraphState(TypedDict):
     language: str # New field
     # history_summary: str # Removed
     context: List[str]
+    history: List[dict]
     answer: str
+    timings: Annotated[dict, merge_timings] # Per-node latency in ms
+    started_at: Optional[float] # perf_counter() at turn start, for time-to-first-token
+    question_embedding: Optional[List[float]]
+    cache_hit: bool
+    intent: Optional[str] # Set when the router answered from the extraction
 
 class RAGGraph:
-    def __init__(self):
-        self.vector_store = VectorStoreManager()
-        self.memory = MemoryManager()
-        self.llm = ChatGoogleGenerativeAI(model=Config.GEMINI_MODEL_NAME, google_api_key=Config.GOOGLE_API_KEY)
+    def __init__(self, vector_store=None, memory=None, extraction_cache=None, llm=None):
+        self.vector_store = vector_store or VectorStoreManager()
+        self.memory = memory or MemoryManager()
+        if llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            llm = ChatGoogleGenerativeAI(model=Config.GEMINI_MODEL_NAME, google_api_key=Config.GOOGLE_API_KEY)
+        self.llm = llm
+        # Persists finished turns off the request path (async graph only)
+        self._persist_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-persist")
+        self._pending_writes = set()
+        # Perceived-latency metrics of recent turns (time-to-first-token, generation time)
+        self.turn_metrics = deque(maxlen=200)
+        self.answer_cache = get_answer_cache() if Config.ANSWER_CACHE_ENABLED else None
+        self.router = IntentRouter() if Config.INTENT_ROUTER_ENABLED else None
+        self.prompt_budget = PromptBudget()
+        # Fallback source of structured data for sessions created before it was stored on them
+        self.extraction_cache = extraction_cache
+
+    def _extraction(self, session_id):
+        extraction, content_hash = self.memory.get_extraction(session_id)
+        if extraction is None and content_hash and self.extraction_cache:
+            entry = self.extraction_cache.get(content_hash)
+            extraction = entry["data"] if entry else None
+        return extraction
+
+    def route(self, state: GraphState):
+        """
+        Answer schedule/dosage/duration/list questions from the prescription's structured
+        extraction with a template, skipping embedding, retrieval and the LLM.
+        """
+        logger.info("Node: Route")
+        if not self.router or not state.get("prescription_id"):
+            return {"intent": None}
+        start = time.perf_counter()
+        try:
+            data = self._extraction(state["session_id"])
+        except Exception as e:
+            logger.error(f"Failed to load extraction for routing: {e}")
+            data = None
+        answer, intent = self.router.route(state["question"], data, state.get("language"))
+        timings = {"route_ms": (time.perf_counter() - start) * 1000}
+        if answer:
+            return {"answer": answer, "intent": intent, "timings": timings}
+        return {"intent": None, "timings": timings}
+
+    async def aroute(self, state: GraphState):
+        return await asyncio.to_thread(self.route, state)
+
+    def route_after_router(self, state: GraphState):
+        return "serve_routed" if state.get("intent") else "check_cache"
+
+    def _routed_metrics(self, state: GraphState):
+        return {"routed": state["intent"], "route_ms": (state.get("timings") or {}).get("route_ms", 0.0)}
+
+    def serve_routed(self, state: GraphState):
+        """Records a turn answered by the intent router."""
+        logger.info("Node: Serve Routed")
+        self._persist_turn(state["session_id"], state["question"], state["answer"], metrics=self._routed_metrics(state))
+        return {}
+
+    async def aserve_routed(self, state: GraphState):
+        self._persist_in_background(state["session_id"], state["question"], state["answer"], self._routed_metrics(state))
+        return {}
+
+    def router_stats(self):
+        """
+        Router hit rate and the latency it saved: each routed turn is credited with the
+        average end-to-end time of recent LLM turns, minus the time spent routing.
+        """
+        if not self.router:
+            return None
+        stats = self.router.get_stats()
+        llm_turns = [m["total_ms"] for m in list(self.turn_metrics)]
+        avg_llm_ms = sum(llm_turns) / len(llm_turns) if llm_turns else 0.0
+        stats["avg_llm_turn_ms"] = round(avg_llm_ms, 1)
+        stats["saved_ms"] = round(max(avg_llm_ms - stats["avg_router_ms"], 0.0) * stats["routed"], 1)
+        return stats
+
+    def check_cache(self, state: GraphState):
+        """
+        Serve near-duplicate questions about the same prescription from the semantic answer cache.
+        Global chats and follow-ups that lean on the conversation so far skip the cache both ways.
+        """
+        logger.info("Node: Check Cache")
+        if not self.answer_cache or not self.vector_store.embeddings or not state.get("prescription_id"):
+            return {"cache_hit": False}
+        start = time.perf_counter()
+        if depends_on_history(state["question"]) and self.memory.get_history(state["session_id"], limit=1):
+            # "and the second one?" means something different in every conversation
+            return {"cache_hit": False, "timings": {"cache_ms": (time.perf_counter() - start) * 1000}}
+        # Goes through the embedding cache, so retrieve() reuses this embedding for free
+        embedding = self.vector_store.embeddings.embed_query(state["question"])
+        hit = self.answer_cache.lookup(state.get("prescription_id"), state.get("language"), embedding)
+        timings = {"cache_ms": (time.perf_counter() - start) * 1000}
+        if hit:
+            answer, score = hit
+            logger.info(f"Semantic cache hit (similarity {score:.3f})")
+            return {"answer": answer, "cache_hit": True, "question_embedding": embedding, "timings": timings}
+        return {"cache_hit": False, "question_embedding": embedding, "timings": timings}
+
+    async def acheck_cache(self, state: GraphState):
+        return await asyncio.to_thread(self.check_cache, state)
+
+    def route_after_cache(self, state: GraphState):
+        if state.get("cache_hit"):
+            return "serve_cached"
+        return ["retrieve", "load_history"]
+
+    def serve_cached(self, state: GraphState):
+        """Records a turn answered from the cache."""
+        logger.info("Node: Serve Cached")
+        self._persist_turn(state["session_id"], state["question"], state["answer"], metrics={"cache_hit": True})
+        return {}
+
+    async def aserve_cached(self, state: GraphState):
+        self._persist_in_background(state["session_id"], state["question"], state["answer"], {"cache_hit": True})
+        return {}
+
+    def _remember_answer(self, state: GraphState, answer):
+        if self.answer_cache and state.get("question_embedding") and answer:
+            self.answer_cache.store(
+                state.get("prescription_id"), state.get("language"),
+                state["question"], state["question_embedding"], answer
+            )
 
     def retrieve(self, state: GraphState):
         """
         Retrieve relevant chunks from Pinecone.
         """
         logger.info("Node: Retrieve")
+        start = time.perf_counter()
         question = state["question"]
         prescription_id = state.get("prescription_id")
-        
-        # Search Pinecone
-        results = self.vector_store.search(question, prescription_id=prescription_id)
-        
+
+        # Search Pinecone, keeping only the chunks of the medicines the question is about
+        results = self.vector_store.search_chunks(question, prescription_id=prescription_id)
+
         # Extract text from results
         context = [match.metadata["text"] for match in results]
-        
-        return {"context": context}
+
+        return {"context": context, "timings": {"retrieve_ms": (time.perf_counter() - start) * 1000}}
+
+    async def aretrieve(self, state: GraphState):
+        return await asyncio.to_thread(self.retrieve, state)
+
+    def load_history(self, state: GraphState):
+        """
+        Fetch recent chat history from MongoDB. Runs in parallel with retrieve.
+        """
+        logger.info("Node: Load History")
+        start = time.perf_counter()
+        history = self.memory.get_history(state["session_id"], limit=5)
+        return {"history": history, "timings": {"history_ms": (time.perf_counter() - start) * 1000}}
+
+    async def aload_history(self, state: GraphState):
+        return await asyncio.to_thread(self.load_history, state)
+
+    def _build_prompt(self, state: GraphState):
+        """Returns (prompt, size stats), with context and history trimmed to the prompt token budget."""
+        language = state.get("language", "English") # Default to English
+
+        # Apply stop word removal
+        history = [f"{msg['role'].capitalize()}: {remove_stopwords(msg['content'])}" for msg in state.get("history", [])]
+        instructions = PROMPT_TEMPLATE.format(language=language, context="", history="", question=state["question"])
+        context, history, stats = self.prompt_budget.fit(instructions, state.get("context", []), history)
+
+        prompt = PROMPT_TEMPLATE.format(
+            language=language, context="\n\n".join(context), history="\n".join(history), question=state["question"]
+        )
+        return prompt, stats
+
+    def _persist_turn(self, session_id, question, answer, metrics=None):
+        start = time.perf_counter()
+        self.memory.add_message(session_id, "user", question)
+        self.memory.add_message(session_id, "ai", answer, metrics=metrics)
+        return (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _chunk_text(chunk):
+        """Text of a streamed message chunk (Gemini may return a list of content parts)."""
+        content = chunk.content
+        if isinstance(content, list):
+            return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+        return content or ""
+
+    def _generation_metrics(self, state, llm_start, first_token_at, prompt_stats):
+        end = time.perf_counter()
+        turn_start = state.get("started_at") or llm_start
+        metrics = {
+            "llm_ms": (end - llm_start) * 1000,
+            "ttft_ms": ((first_token_at or end) - turn_start) * 1000,
+            "generation_ms": (end - (first_token_at or end)) * 1000,
+            "total_ms": (end - turn_start) * 1000,
+            "prompt_tokens": prompt_stats["prompt_tokens"],
+            "context_tokens": prompt_stats["context_tokens"],
+            "history_tokens": prompt_stats["history_tokens"],
+            "trimmed_tokens": prompt_stats["trimmed_tokens"],
+        }
+        trace_id = current_trace_id()
+        if trace_id:
+            metrics["trace_id"] = trace_id
+        self.turn_metrics.append({"session_id": state["session_id"], **metrics})
+        return metrics
+
+    def _log_breakdown(self, timings, persist_ms=None):
+        retrieve_ms = timings.get("retrieve_ms", 0.0)
+        history_ms = timings.get("history_ms", 0.0)
+        saved_ms = retrieve_ms + history_ms - max(retrieve_ms, history_ms)
+        if persist_ms is not None:
+            saved_ms += persist_ms
+        logger.info(
+            f"Turn latency: retrieve={retrieve_ms:.0f}ms history={history_ms:.0f}ms "
+            f"llm={timings.get('llm_ms', 0.0):.0f}ms prompt={timings.get('prompt_tokens', 0)}tok ttft={timings.get('ttft_ms', 0.0):.0f}ms persist={persist_ms or 0.0:.0f}ms "
+            f"(saved vs sequential: {saved_ms:.0f}ms)"
+        )
 
     def generate(self, state: GraphState):
         """
         Generate answer using Gemini.
+        The model is streamed, so graph.stream(..., stream_mode="messages") yields tokens as they arrive.
         """
         logger.info("Node: Generate")
-        question = state["question"]
-        context = state["context"]
-        language = state.get("language", "English") # Default to English
-        # summary = state["history_summary"] # Removed
-        
-        context_str = "\n\n".join(context)
-        
-        # Fetch History
-        history = self.memory.get_history(state["session_id"], limit=5)
-        # Apply stop word removal 
-        history_str = "\n".join([f"{msg['role'].capitalize()}: {remove_stopwords(msg['content'])}" for msg in history])
-        
-        prompt = f"""
-        You are a helpful medical assistant. Answer the user's question based on the provided context and chat history.
-        
-        IMPORTANT INSTRUCTIONS:
-        1. Answer in the following language: {language}
-        2. If the user asks about a medicine ("What is this for?"), provide TWO things:
-           a) The specific instructions from the prescription (dosage, timing).
-           b) General medical knowledge about what the medicine is commonly used for (e.g., "Paracetamol is commonly used for fever and pain relief").
-        
-        Context from Prescriptions:
-        {context_str}
-        
-        Chat History:
-        {history_str}
-        
-        User Question: {question}
-        
-        Answer:
-        """
-        
-        response = self.llm.invoke(prompt)
+        prompt, prompt_stats = self._build_prompt(state)
+
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        with get_tracer().span("gemini.generate", prompt_tokens=prompt_stats["prompt_tokens"]):
+            for chunk in self.llm.stream(prompt):
+                text = self._chunk_text(chunk)
+                if text and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(text)
+        answer = "".join(parts)
+        timings = self._generation_metrics(state, start, first_token_at, prompt_stats)
+        self._remember_answer(state, answer)
+
         # Add to memory manually here since we removed the summarize node
-        self.memory.add_message(state["session_id"], "user", question)
-        self.memory.add_message(state["session_id"], "ai", response.content)
-        
-        return {"answer": response.content}
+        self._persist_turn(state["session_id"], state["question"], answer, metrics=timings)
+        self._log_breakdown(merge_timings(state.get("timings"), timings))
+
+        return {"answer": answer, "timings": timings}
+
+    async def agenerate(self, state: GraphState):
+        """
+        Async generate: streams the LLM, then hands persistence to a background
+        thread so the answer is returned without waiting on MongoDB.
+        """
+        logger.info("Node: Generate (async)")
+        prompt, prompt_stats = self._build_prompt(state)
+
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        with get_tracer().span("gemini.generate", prompt_tokens=prompt_stats["prompt_tokens"]):
+            async for chunk in self.llm.astream(prompt):
+                text = self._chunk_text(chunk)
+                if text and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(text)
+        answer = "".join(parts)
+        timings = self._generation_metrics(state, start, first_token_at, prompt_stats)
+        self._remember_answer(state, answer)
+
+        self._persist_in_background(
+            state["session_id"], state["question"], answer, timings,
+            all_timings=merge_timings(state.get("timings"), timings)
+        )
+        return {"answer": answer, "timings": timings}
+
+    def _persist_in_background(self, session_id, question, answer, metrics, all_timings=None):
+        # Keeps the turn's trace, so the MongoDB writes show up in it
+        future = self._persist_pool.submit(propagate(self._persist_turn), session_id, question, answer, metrics)
+        self._pending_writes.add(future)
+
+        def on_persisted(done):
+            self._pending_writes.discard(done)
+            if done.exception():
+                logger.error(f"Failed to persist chat turn: {done.exception()}")
+            elif all_timings is not None:
+                self._log_breakdown(all_timings, persist_ms=done.result())
+        future.add_done_callback(on_persisted)
+
+    def stream_answer(self, graph, inputs):
+        """
+        Runs the compiled graph and yields answer tokens from the generate node as they arrive.
+        The completed turn is persisted once, when generation finishes.
+        """
+        inputs = dict(inputs, started_at=time.perf_counter())
+        for mode, payload in graph.stream(inputs, stream_mode=["messages", "updates"]):
+            if mode == "updates":
+                # Routed and cached answers produce no tokens; emit them in one piece
+                routed = payload.get("route") or {}
+                cached = payload.get("check_cache") or {}
+                if routed.get("intent"):
+                    yield routed["answer"]
+                elif cached.get("cache_hit"):
+                    yield cached["answer"]
+                continue
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") != "generate":
+                continue
+            text = self._chunk_text(chunk)
+            if text:
+                yield text
+
+    def wait_for_persistence(self, timeout=10):
+        """Blocks until background writes from earlier turns have reached MongoDB."""
+        for future in list(self._pending_writes):
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Pending chat write did not complete: {e}")
 
     def build_graph(self):
         """
         Builds the LangGraph workflow.
+        The intent router runs first and answers structured questions itself; otherwise
+        a semantic cache check follows, and on a miss retrieval and history loading
+        are parallel branches that join at generate.
+        The compiled graph supports both invoke() and ainvoke().
         """
+        # Imported here so loading this module doesn't pull in LangGraph
+        from langchain_core.runnables import RunnableLambda
+        from langgraph.graph import StateGraph, START, END
+
         workflow = StateGraph(GraphState)
-        
-        # Add nodes
-        workflow.add_node("retrieve", self.retrieve)
-        workflow.add_node("generate", self.generate)
-        
+
+        tracer = get_tracer()
+
+        def node(name, func, afunc):
+            # Every node runs inside a span of the turn's trace
+            return RunnableLambda(tracer.wrap(f"node.{name}", func), afunc=tracer.wrap(f"node.{name}", afunc))
+
+        # Add nodes (sync + async implementations)
+        workflow.add_node("route", node("route", self.route, self.aroute))
+        workflow.add_node("serve_routed", node("serve_routed", self.serve_routed, self.aserve_routed))
+        workflow.add_node("check_cache", node("check_cache", self.check_cache, self.acheck_cache))
+        workflow.add_node("serve_cached", node("serve_cached", self.serve_cached, self.aserve_cached))
+        workflow.add_node("retrieve", node("retrieve", self.retrieve, self.aretrieve))
+        workflow.add_node("load_history", node("load_history", self.load_history, self.aload_history))
+        workflow.add_node("generate", node("generate", self.generate, self.agenerate))
+
         # Define edges
-        workflow.set_entry_point("retrieve")
-        workflow.add_edge("retrieve", "generate")
+        workflow.add_edge(START, "route")
+        workflow.add_conditional_edges("route", self.route_after_router, ["serve_routed", "check_cache"])
+        workflow.add_edge("serve_routed", END)
+        workflow.add_conditional_edges(
+            "check_cache", self.route_after_cache, ["serve_cached", "retrieve", "load_history"]
+        )
+        workflow.add_edge("serve_cached", END)
+        workflow.add_edge(["retrieve", "load_history"], "generate")
         workflow.add_edge("generate", END)
-        
-        return workflow.compile()
 
+        return workflow.compile()
@@ -0,0 +1,116 @@
+import io
+import os
+import time
+from PIL import Image, ImageOps
+from src.blob_store import mapped
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ImagePreprocessor:
+    """
+    Shrinks prescription images before they are sent to Gemini.
+
+    Steps: EXIF orientation fix, downscale to `max_edge` on the long side, optional
+    grayscale and autocontrast, then re-encode as JPEG/WebP, lowering quality (and
+    finally the size) until the result fits in `max_bytes`. If the original file is
+    already smaller and needs no rotation or resizing, it is sent unchanged.
+    """
+    MIN_QUALITY = 40
+
+    def __init__(self, max_edge=None, grayscale=None, autocontrast=None, image_format=None, quality=None, max_bytes=None):
+        self.max_edge = max_edge or Config.IMAGE_MAX_EDGE
+        self.grayscale = Config.IMAGE_GRAYSCALE if grayscale is None else grayscale
+        self.autocontrast = Config.IMAGE_AUTOCONTRAST if autocontrast is None else autocontrast
+        self.image_format = (image_format or Config.IMAGE_FORMAT).upper()
+        if self.image_format not in ("JPEG", "WEBP"):
+            raise ValueError(f"Unsupported image format: {self.image_format}")
+        self.quality = quality or Config.IMAGE_QUALITY
+        self.max_bytes = max_bytes or Config.IMAGE_MAX_BYTES
+
+    @staticmethod
+    def _open(source):
+        """
+        Returns (image, original encoded bytes or None) for raw bytes, a PIL image or a
+        memory-mapped file. The original is only copied out if it is sent unchanged.
+        """
+        if isinstance(source, Image.Image):
+            filename = getattr(source, "filename", None)
+            if filename and os.path.isfile(filename):
+                with open(filename, "rb") as f:
+                    return source, f.read()
+            return source, None
+        if isinstance(source, (bytes, bytearray)):
+            return Image.open(io.BytesIO(source)), source
+        return Image.open(source), source
+
+    def _prepare(self, image):
+        image = ImageOps.exif_transpose(image)
+        if self.grayscale:
+            image = image.convert("L")
+        elif image.mode not in ("RGB", "L"):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        if self.autocontrast:
+            image = ImageOps.autocontrast(image, cutoff=1)
+        if max(image.size) > self.max_edge:
+            image = image.copy()
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+        return image
+
+    def _encode(self, image):
+        quality = self.quality
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.image_format, quality=quality, optimize=True)
+            data = buffer.getvalue()
+            if len(data) <= self.max_bytes:
+                return data, quality, image
+            if quality > self.MIN_QUALITY:
+                quality = max(self.MIN_QUALITY, quality - 10)
+            elif min(image.size) > 256:
+                image = image.resize((int(image.width * 0.8), int(image.height * 0.8)), Image.LANCZOS)
+            else:
+                return data, quality, image
+
+    def process(self, source):
+        """
+        Returns (part, stats) where `part` is a {"mime_type", "data"} blob that
+        google.generativeai accepts in generate_content().
+        """
+        if isinstance(source, str):
+            # Paths (e.g. blobs) are decoded straight from a memory map
+            with mapped(source) as view:
+                return self.process(view)
+
+        start = time.perf_counter()
+        image, original = self._open(source)
+        original_size = image.size
+        original_format = image.format
+        upright = image.getexif().get(0x0112, 1) == 1 # EXIF Orientation tag
+        prepared = self._prepare(image)
+
+        data, quality, encoded = self._encode(prepared)
+        mime_type = MIME_TYPES[self.image_format]
+        unchanged = upright and encoded.size == original_size and not self.grayscale and not self.autocontrast
+        if (original and unchanged and original_format in MIME_TYPES
+                and len(original) <= min(len(data), self.max_bytes)):
+            data, mime_type, quality = bytes(original), MIME_TYPES[original_format], None
+
+        stats = {
+            "original_bytes": len(original) if original else None,
+            "bytes": len(data),
+            "original_size": original_size,
+            "size": encoded.size,
+            "mime_type": mime_type,
+            "quality": quality,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        return {"mime_type": mime_type, "data": data}, stats
@@ -1,6 +1,10 @@
 import os
+import re
+import time
 from PIL import Image
 import pypdf
+from src.blob_store import mapped
+from src.config import Config
 from src.utils import setup_logger
 
 logger = setup_logger(__name__)
@@ -42,3 +46,58 @@ class IngestionManager:
         else:
             raise ValueError(f"Unsupported file type: {ext}")
 
+    @staticmethod
+    def compact_text(text):
+        """Collapses runs of spaces and blank lines in a page's text layer."""
+        lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+        return "\n".join(line for line in lines if line)
+
+    @staticmethod
+    def split_pdf(file_path, min_chars=None, min_scan_pixels=None):
+        """
+        Classifies each PDF page by what can be pulled out of it locally:
+        - "text":  the text layer has at least `min_chars` non-space characters and the page
+                   carries no scan-sized image; its compact text is used
+        - "mixed": a usable text layer plus a scan-sized image (e.g. a handwritten prescription
+                   under a printed letterhead); both the text and the images are used
+        - "image": no usable text, but the page carries embedded images (a scan/photo); those are used
+        - "empty": neither; the page can't be handled locally
+
+        Returns a list of dicts: {page, kind, text, images, chars, ms}.
+        """
+        min_chars = Config.PDF_TEXT_MIN_CHARS if min_chars is None else min_chars
+        min_scan_pixels = Config.PDF_SCAN_MIN_PIXELS if min_scan_pixels is None else min_scan_pixels
+        pages = []
+        # pypdf reads what it needs from the memory map instead of loading the whole file
+        with mapped(file_path) as view:
+            reader = pypdf.PdfReader(view)
+            for number, page in enumerate(reader.pages, start=1):
+                start = time.perf_counter()
+                try:
+                    text = IngestionManager.compact_text(page.extract_text() or "")
+                except Exception as e:
+                    logger.warning(f"Text layer of page {number} is unreadable: {e}")
+                    text = ""
+                chars = len("".join(text.split()))
+
+                images = []
+                try:
+                    images = [img.image for img in page.images]
+                except Exception as e:
+                    logger.warning(f"Could not read images of page {number}: {e}")
+                if images:
+                    # Keep the scan itself, not logos/stamps that are a fraction of its size
+                    largest = max(img.width * img.height for img in images)
+                    images = [img for img in images if img.width * img.height >= 0.1 * largest]
+
+                entry = {"page": number, "kind": "text", "text": text, "images": [], "chars": chars}
+                if chars >= min_chars:
+                    if images and largest >= min_scan_pixels:
+                        entry.update(kind="mixed", images=images)
+                elif images:
+                    entry.update(kind="image", text="", images=images)
+                else:
+                    entry.update(kind="empty")
+                entry["ms"] = round((time.perf_counter() - start) * 1000, 1)
+                pages.append(entry)
+        return pages
@@ -0,0 +1,147 @@
+import re
+import threading
+import time
+from src.prescription_pipeline import medicine_key, mentioned_medicines
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Keyword rules, checked in this order; the first intent with a matching rule wins
+INTENT_RULES = [
+    ("duration", re.compile(r"\bhow (many|much) (days|weeks|months)\b|\bhow long\b|\bduration\b|\bfor how many\b|\buntil when\b|\bwhen (do|should|can) i stop\b")),
+    ("dosage", re.compile(r"\bdos(e|age|es)\b|\bhow much\b|\bhow many (tablets?|tabs?|capsules?|pills?|ml|drops|spoons?)\b|\bquantity\b|\bstrength\b")),
+    ("schedule", re.compile(r"\bwhen\b|\bwhat time\b|\btiming\b|\bschedule\b|\bmorning\b|\bafternoon\b|\bnight\b|\bbedtime\b|\b(before|after) (food|meals?|breakfast|lunch|dinner|eating)\b|\bempty stomach\b|\bhow often\b|\btimes a day\b|\bfrequency\b")),
+    ("list", re.compile(r"\b(list|name)\b.*\b(medicines?|medications?|tablets?|meds|drugs)\b|\b(what|which) (are )?(my |the |all )?(medicines?|medications?|tablets?|meds|drugs)\b.*\b(prescribed|have|got|on)\b|\bwhat (medicines?|medications?|tablets?|meds) (are|were) (prescribed|there)\b")),
+]
+# Questions that need medical knowledge or judgement always go to the LLM
+OPEN_ENDED = re.compile(
+    r"\bwhy\b|\bwhat (is|are) .* for\b|\bused for\b|\bside ?effects?\b|\bsafe\b|\bcan i\b|\balcohol\b|"
+    r"\bpregnan|\binteract|\bexplain\b|\binstead\b|\bmiss(ed)?\b|\boverdose\b|\ballerg|\bsubstitute\b|\bgeneric\b|\bwhat if\b"
+)
+# Without a medicine name, only questions about all medicines are answered from the template
+ALL_MEDICINES = re.compile(r"\b(all|each|every|my) (of )?(my |the )?(medicines?|medications?|tablets?|meds|drugs)\b|\b(medicines|medications|tablets|meds|drugs)\b")
+# Drug-class words and the brand/generic name prefixes they cover; "the antibiotic" means the entries that match
+DRUG_CLASSES = [
+    (re.compile(r"\bantibiotics?\b"), ("azith", "amox", "augmentin", "clav", "cef", "cipro", "oflox", "levoflox",
+                                       "doxy", "metronid", "flagyl", "linezol", "clarith", "erythro", "norflox")),
+    (re.compile(r"\b(pain ?killers?|pain relievers?|analgesics?|pain (tablets?|medicines?))\b"),
+     ("dolo", "paracetamol", "crocin", "calpol", "ibu", "brufen", "combiflam", "diclo", "aceclo", "zerodol",
+      "naprox", "aspirin", "tramadol", "etoric", "nimes")),
+    (re.compile(r"\b(antacids?|acidity (tablets?|medicines?)|gastric (tablets?|medicines?))\b"),
+     ("pantop", "omep", "omez", "rabep", "razo", "esomep", "ranitid", "rantac", "aciloc", "famot",
+      "gelusil", "digene")),
+    (re.compile(r"\b(antihistamines?|allergy (tablets?|medicines?))\b"),
+     ("cetiri", "cetzine", "levocet", "fexofen", "allegra", "loratad", "montair", "avil", "chlorphen")),
+]
+
+
+def _given(value):
+    return value not in (None, "", "-") and str(value).strip().lower() not in ("-", "n/a", "na", "none")
+
+
+def _when(med):
+    timing = med.get("timing") or {}
+    slots = [slot for slot in ("morning", "afternoon", "night") if str(timing.get(slot, "")).strip().lower() == "yes"]
+    parts = []
+    if slots:
+        parts.append(" and ".join(slots) if len(slots) < 3 else "morning, afternoon and night")
+    if _given(timing.get("instruction")):
+        parts.append(str(timing["instruction"]).strip().lower())
+    text = ", ".join(parts) or "timing not specified on the prescription"
+    if _given(med.get("frequency")):
+        text += f" ({med['frequency']})"
+    return text
+
+
+def _dose(med):
+    text = f"{med['quantity']} per dose" if _given(med.get("quantity")) else "dose not specified on the prescription"
+    if _given(med.get("frequency")):
+        text += f", {med['frequency']}"
+    return text
+
+
+def _duration(med):
+    return str(med["duration"]) if _given(med.get("duration")) else "duration not specified on the prescription"
+
+
+TEMPLATES = {"schedule": _when, "dosage": _dose, "duration": _duration}
+HEADINGS = {"schedule": "When to take", "dosage": "How much to take", "duration": "How long to take"}
+
+
+class IntentRouter:
+    """
+    Local classifier for chat questions about a prescription's structured extraction.
+
+    Keyword rules pick an intent (schedule, dosage, duration, list) and medicine names
+    are matched against the extracted medicines. Those questions are answered from a
+    template over the extraction; open-ended ones, non-English turns and anything the
+    rules can't pin down fall through to retrieval + the LLM.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"questions": 0, "routed": 0, "by_intent": {}, "router_ms": 0.0}
+
+    def classify(self, question, medicines):
+        """Returns (intent, matched medicines); intent is None for open-ended questions."""
+        text = question.lower()
+        if OPEN_ENDED.search(text):
+            return None, []
+        intent = next((name for name, rule in INTENT_RULES if rule.search(text)), None)
+        if intent is None:
+            return None, []
+        if intent == "list":
+            return intent, list(medicines)
+
+        keys = [medicine_key(med.get("name")) for med in medicines]
+        asked = set(mentioned_medicines(question, [key for key in keys if key]))
+        if asked:
+            return intent, [med for med, key in zip(medicines, keys) if key in asked]
+        # e.g. "how many days for the antibiotic?" names a class, not a medicine; if no entry
+        # is recognised as one, answer for every medicine so the patient can find it by name
+        prefixes = tuple(prefix for rule, names in DRUG_CLASSES if rule.search(text) for prefix in names)
+        if prefixes:
+            in_class = [med for med, key in zip(medicines, keys) if key and any(word.startswith(prefixes) for word in key.split())]
+            return intent, in_class or list(medicines)
+        if ALL_MEDICINES.search(text):
+            return intent, list(medicines)
+        return None, []
+
+    @staticmethod
+    def render(intent, matched, data):
+        if intent == "list":
+            names = "\n".join(f"- {med.get('name')}" for med in matched)
+            dated = f" dated {data['date']}" if _given(data.get("date")) else ""
+            return f"Your prescription{dated} lists {len(matched)} medicine(s):\n{names}"
+        lines = [f"- **{med.get('name')}**: {TEMPLATES[intent](med)}" for med in matched]
+        answer = f"{HEADINGS[intent]}, as written on your prescription:\n" + "\n".join(lines)
+        if _given(data.get("notes")):
+            answer += f"\n\nDoctor's notes: {data['notes']}"
+        return answer
+
+    def route(self, question, data, language=None):
+        """Template answer and intent for a question, or (None, None) to use the LLM."""
+        start = time.perf_counter()
+        intent, matched, answer = None, [], None
+        if data and data.get("medicines") and (language or "English").lower() == "english":
+            intent, matched = self.classify(question, data["medicines"])
+            if intent and matched:
+                answer = self.render(intent, matched, data)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["questions"] += 1
+            self.stats["router_ms"] += elapsed
+            if answer:
+                self.stats["routed"] += 1
+                self.stats["by_intent"][intent] = self.stats["by_intent"].get(intent, 0) + 1
+        if answer:
+            logger.info(f"Router answered '{intent}' question from the extraction in {elapsed:.1f}ms")
+            return answer, intent
+        return None, None
+
+    def get_stats(self):
+        with self._lock:
+            stats = {**self.stats, "by_intent": dict(self.stats["by_intent"])}
+        questions = stats["questions"]
+        stats["hit_rate"] = round(stats["routed"] / questions, 4) if questions else 0.0
+        stats["avg_router_ms"] = round(stats.pop("router_ms") / questions, 2) if questions else 0.0
+        return stats
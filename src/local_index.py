@@ -0,0 +1,338 @@
+import contextlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from src.utils import setup_logger, ensure_directory
+
+logger = setup_logger(__name__)
+
+DEFAULT_NAMESPACE = "__default__"
+SEGMENT_RE = re.compile(r"segment-(\d+)\.json")
+
+
+class LocalMatch:
+    """A single query hit, shaped like Pinecone's ScoredVector."""
+    def __init__(self, id, score, metadata):
+        self.id = id
+        self.score = score
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"LocalMatch(id={self.id!r}, score={self.score:.4f})"
+
+
+class LocalQueryResult:
+    """Query response, shaped like Pinecone's QueryResponse."""
+    def __init__(self, matches, namespace):
+        self.matches = matches
+        self.namespace = namespace
+
+
+class _Namespace:
+    """Vectors, ids and metadata for one namespace."""
+    def __init__(self, dimension):
+        self.matrix = np.zeros((0, dimension), dtype=np.float32)
+        self.ids = []
+        self.metadata = []
+        self.positions = {}
+        self.filter_cache = {}
+        # Append-only log on top of the base files: committed segment numbers and the rows they hold
+        self.segments = []
+        self.segment_rows = 0
+        self.base_rows = 0
+        self._buffer = None
+
+    def reindex(self):
+        self.positions = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.filter_cache = {}
+
+    def apply_upsert(self, ids, rows, metadata):
+        """
+        Replaces or appends rows. Concurrent queries keep a consistent snapshot: replacements
+        copy the matrix, and appends go past the end of any snapshot taken so far.
+        """
+        all_ids, all_meta = list(self.ids), list(self.metadata)
+        replaced, appended = {}, []
+        for vector_id, row, meta in zip(ids, rows, metadata):
+            position = self.positions.get(vector_id)
+            if position is None:
+                appended.append(row)
+                all_ids.append(vector_id)
+                all_meta.append(meta)
+            else:
+                replaced[position] = row
+                all_meta[position] = meta
+
+        if replaced:
+            self.matrix = np.array(self.matrix, dtype=np.float32)
+            self._buffer = None
+            for position, row in replaced.items():
+                self.matrix[position] = row
+        if appended:
+            self._append_rows(np.asarray(appended, dtype=np.float32))
+        self.ids, self.metadata = all_ids, all_meta
+        self.reindex()
+
+    def _append_rows(self, rows):
+        # Rows live at the front of a buffer with spare capacity, so appends are amortized O(batch)
+        count = self.matrix.shape[0]
+        buffer = self._buffer
+        if buffer is None or buffer.shape[0] < count + len(rows):
+            buffer = np.empty((max(2 * count, count + len(rows), 64), self.matrix.shape[1]), dtype=np.float32)
+            buffer[:count] = self.matrix
+            self._buffer = buffer
+        buffer[count:count + len(rows)] = rows
+        self.matrix = buffer[:count + len(rows)]
+
+    def apply_delete(self, ids):
+        doomed = set(ids)
+        keep = [row for row, vector_id in enumerate(self.ids) if vector_id not in doomed]
+        self.matrix = np.array(self.matrix, dtype=np.float32)[keep]
+        self._buffer = None
+        self.ids = [self.ids[row] for row in keep]
+        self.metadata = [self.metadata[row] for row in keep]
+        self.reindex()
+
+
+class LocalVectorIndex:
+    """
+    Embedded vector index with the same upsert/query/delete surface as a Pinecone Index.
+
+    Each namespace is a float32 matrix of L2-normalised vectors, so cosine similarity is a
+    single matrix-vector product. Namespaces are persisted as .npy files and memory-mapped
+    on load, which makes restarts instant regardless of index size.
+
+    Writes append a segment holding only the batch's rows (or deleted ids), so a bulk
+    ingest costs I/O proportional to what it adds. Segments are replayed over the base
+    files on load and folded into them once they outgrow the base (or pile up past
+    MAX_SEGMENTS), which keeps the total rewrite cost linear in the index size.
+    """
+    MAX_SEGMENTS = 512
+    COMPACT_MIN_ROWS = 1024
+
+    def __init__(self, path, dimension=768):
+        self.path = path
+        self.dimension = dimension
+        self._lock = threading.RLock()
+        self._namespaces = {}
+        ensure_directory(self.path)
+        self._load()
+
+    # ---- Persistence ----
+
+    def _ns_dir(self, namespace):
+        return os.path.join(self.path, namespace)
+
+    def _segment_path(self, name, number, ext):
+        return os.path.join(self._ns_dir(name), f"segment-{number:06d}.{ext}")
+
+    def _load(self):
+        for name in sorted(os.listdir(self.path)):
+            ns_dir = self._ns_dir(name)
+            if not os.path.isdir(ns_dir):
+                continue
+            matrix_path = os.path.join(ns_dir, "vectors.npy")
+            meta_path = os.path.join(ns_dir, "meta.json")
+            # A segment is committed once its .json exists (it is written last)
+            segments = sorted(int(m.group(1)) for m in map(SEGMENT_RE.fullmatch, os.listdir(ns_dir)) if m)
+            has_base = os.path.exists(matrix_path) and os.path.exists(meta_path)
+            if not (has_base or segments):
+                continue
+            try:
+                ns = _Namespace(self.dimension)
+                if has_base:
+                    ns.matrix = np.load(matrix_path, mmap_mode="r")
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        meta = json.load(f)
+                    ns.ids = meta["ids"]
+                    ns.metadata = meta["metadata"]
+                    ns.base_rows = len(ns.ids)
+                    ns.reindex()
+                for number in segments:
+                    with open(self._segment_path(name, number, "json"), "r", encoding="utf-8") as f:
+                        segment = json.load(f)
+                    if segment.get("deleted"):
+                        ns.apply_delete(segment["deleted"])
+                    if segment.get("ids"):
+                        rows = np.load(self._segment_path(name, number, "npy"))
+                        ns.apply_upsert(segment["ids"], rows, segment["metadata"])
+                    ns.segment_rows += len(segment.get("ids", [])) + len(segment.get("deleted", []))
+                ns.segments = segments
+                self._namespaces[name] = ns
+            except Exception as e:
+                logger.error(f"Failed to load local index namespace '{name}': {e}")
+        logger.info(f"Loaded local vector index from {self.path} ({len(self._namespaces)} namespaces)")
+
+    def _persist(self, name, ns):
+        """Rewrites the namespace's base files from memory and drops its segments."""
+        ns_dir = self._ns_dir(name)
+        ensure_directory(ns_dir)
+        matrix_path = os.path.join(ns_dir, "vectors.npy")
+        meta_path = os.path.join(ns_dir, "meta.json")
+
+        # Write to temp files and swap in, so a crash never leaves a half-written namespace
+        tmp_matrix = matrix_path + ".tmp.npy"
+        np.save(tmp_matrix, np.ascontiguousarray(ns.matrix, dtype=np.float32))
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"ids": ns.ids, "metadata": ns.metadata}, f)
+        os.replace(tmp_matrix, matrix_path)
+        os.replace(tmp_meta, meta_path)
+
+        # Replaying a segment over a base that already includes it is harmless, so a crash here is safe
+        for number in ns.segments:
+            for ext in ("json", "npy"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._segment_path(name, number, ext))
+        ns.segments, ns.segment_rows, ns.base_rows = [], 0, len(ns.ids)
+        ns.matrix, ns._buffer = np.load(matrix_path, mmap_mode="r"), None
+
+    def _append_segment(self, name, ns, ids=(), rows=None, metadata=(), deleted=()):
+        """Logs one write as a new segment, compacting into the base files when the log has grown too big."""
+        ensure_directory(self._ns_dir(name))
+        number = ns.segments[-1] + 1 if ns.segments else 1
+        if ids:
+            tmp_rows = self._segment_path(name, number, "tmp.npy")
+            np.save(tmp_rows, np.ascontiguousarray(rows, dtype=np.float32))
+            os.replace(tmp_rows, self._segment_path(name, number, "npy"))
+        tmp_meta = self._segment_path(name, number, "json.tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"ids": list(ids), "metadata": list(metadata), "deleted": list(deleted)}, f)
+        os.replace(tmp_meta, self._segment_path(name, number, "json"))
+        ns.segments.append(number)
+        ns.segment_rows += len(ids) + len(deleted)
+
+        if ns.segment_rows > max(ns.base_rows, self.COMPACT_MIN_ROWS) or len(ns.segments) >= self.MAX_SEGMENTS:
+            self._persist(name, ns)
+
+    # ---- Index API ----
+
+    def upsert(self, vectors, namespace=None):
+        """
+        Inserts or replaces vectors. Accepts (id, values, metadata) tuples or
+        {"id", "values", "metadata"} dicts, like Pinecone.
+        """
+        name = namespace or DEFAULT_NAMESPACE
+        staged = {}
+        for item in vectors:
+            if isinstance(item, dict):
+                vector_id, values, meta = item["id"], item["values"], item.get("metadata", {})
+            else:
+                vector_id, values = item[0], item[1]
+                meta = item[2] if len(item) > 2 else {}
+            staged[vector_id] = (values, dict(meta or {}))
+
+        if not staged:
+            return {"upserted_count": 0}
+
+        new_rows = np.asarray([values for values, _ in staged.values()], dtype=np.float32)
+        new_rows = new_rows.reshape(len(staged), self.dimension)
+        norms = np.linalg.norm(new_rows, axis=1, keepdims=True)
+        new_rows /= np.where(norms == 0, 1.0, norms)
+        ids = list(staged)
+        metadata = [meta for _, meta in staged.values()]
+
+        with self._lock:
+            ns = self._namespaces.get(name) or _Namespace(self.dimension)
+            ns.apply_upsert(ids, new_rows, metadata)
+            self._namespaces[name] = ns
+            self._append_segment(name, ns, ids=ids, rows=new_rows, metadata=metadata)
+
+        return {"upserted_count": len(staged)}
+
+    def delete(self, ids=None, delete_all=False, namespace=None):
+        """Removes vectors by id, or the whole namespace with delete_all=True."""
+        name = namespace or DEFAULT_NAMESPACE
+        with self._lock:
+            ns = self._namespaces.get(name)
+            if not ns:
+                return {}
+            if delete_all:
+                ns.apply_delete(ns.ids)
+                self._persist(name, ns)
+            else:
+                doomed = [vector_id for vector_id in ids or [] if vector_id in ns.positions]
+                if doomed:
+                    ns.apply_delete(doomed)
+                    self._append_segment(name, ns, deleted=doomed)
+        return {}
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None, namespace=None, **kwargs):
+        """Returns the top_k most cosine-similar vectors, optionally filtered by metadata."""
+        name = namespace or DEFAULT_NAMESPACE
+        ns = self._namespaces.get(name)
+        if ns is None or not ns.ids or top_k <= 0:
+            return LocalQueryResult([], namespace or "")
+
+        # Snapshot under the lock; scoring runs lock-free on the immutable snapshot
+        with self._lock:
+            matrix, ids, metadata = ns.matrix, ns.ids, ns.metadata
+            rows = self._filter_rows(ns, filter) if filter else None
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if rows is None:
+            scores = matrix @ query
+        elif len(rows) == 0:
+            return LocalQueryResult([], namespace or "")
+        else:
+            scores = matrix[rows] @ query
+
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for idx in top:
+            row = int(rows[idx]) if rows is not None else int(idx)
+            meta = dict(metadata[row]) if include_metadata else {}
+            matches.append(LocalMatch(ids[row], float(scores[idx]), meta))
+        return LocalQueryResult(matches, namespace or "")
+
+    def describe_index_stats(self):
+        return {
+            "dimension": self.dimension,
+            "namespaces": {name: {"vector_count": len(ns.ids)} for name, ns in self._namespaces.items()},
+            "total_vector_count": sum(len(ns.ids) for ns in self._namespaces.values()),
+        }
+
+    # ---- Filtering ----
+
+    def _filter_rows(self, ns, filter_dict):
+        """
+        Resolves a metadata filter ({"field": {"$eq"|"$in": value}} or {"field": value}) to row numbers.
+        As in Pinecone, a list-valued field matches when any of its items does.
+        """
+        key = json.dumps(filter_dict, sort_keys=True, default=str)
+        rows = ns.filter_cache.get(key)
+        if rows is None:
+            conditions = []
+            for field, condition in filter_dict.items():
+                if isinstance(condition, dict):
+                    unsupported = set(condition) - {"$eq", "$in"}
+                    if unsupported:
+                        raise ValueError(f"Unsupported filter operator(s) for local index: {unsupported}")
+                    if "$eq" in condition:
+                        conditions.append((field, [condition["$eq"]]))
+                    if "$in" in condition:
+                        conditions.append((field, list(condition["$in"])))
+                else:
+                    conditions.append((field, [condition]))
+            rows = np.array(
+                [row for row, meta in enumerate(ns.metadata)
+                 if all(_matches(meta.get(field), values) for field, values in conditions)],
+                dtype=np.int64,
+            )
+            ns.filter_cache[key] = rows
+        return rows
+
+
+def _matches(value, allowed):
+    if isinstance(value, list):
+        return any(item in allowed for item in value)
+    return value in allowed
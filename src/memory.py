@@ -1,7 +1,10 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime
 import uuid
 from src.config import Config
+from src.db_indexes import ensure_indexes
+from src.message_buckets import MessageBucketStore
+from src.write_behind import get_write_behind
 from src.utils import setup_logger
 
 logger = setup_logger(__name__)
@@ -10,14 +13,19 @@ class MemoryManager:
     """
     Manages chat history and sessions - MongoDB.
     """
-    def __init__(self):
-        self.client = MongoClient(Config.MONGO_URI)
-        self.db = self.client.get_database("prescription_db")
+    def __init__(self, client=None):
+        self.client = client or MongoClient(Config.MONGO_URI)
+        self.db = self.client.get_database(Config.MONGO_DB_NAME)
         self.sessions = self.db.sessions
         self.messages = self.db.messages
+        ensure_indexes(self.db)
+        # Bucketed history layout (None = one document per message in `messages`)
+        self.buckets = MessageBucketStore(self.db) if Config.MESSAGE_STORAGE == "bucketed" else None
+        # Shared write-behind queue for chat messages (None = write synchronously)
+        self.write_behind = get_write_behind(self.db) if Config.MESSAGE_WRITE_BEHIND else None
         logger.info("Connected to MongoDB")
 
-    def get_or_create_session(self, user_id, prescription_id, title=None, filename=None, details=None):
+    def get_or_create_session(self, user_id, prescription_id, title=None, filename=None, details=None, content_hash=None):
         """
         Retrieves an existing session for the (user, prescription) pair, 
         or creates a new one if it doesn't exist.
@@ -37,6 +45,8 @@ class MemoryManager:
                 updates["filename"] = filename
             if details and not existing_session.get("details"):
                 updates["details"] = details
+            if content_hash and not existing_session.get("content_hash"):
+                updates["content_hash"] = content_hash
             
             if updates:
                 self.sessions.update_one(
@@ -61,16 +71,47 @@ class MemoryManager:
             doc["filename"] = filename
         if details:
             doc["details"] = details
+        if content_hash:
+            doc["content_hash"] = content_hash
             
         self.sessions.insert_one(doc)
         logger.info(f"Created new session {session_id} for user {user_id} on prescription {prescription_id}")
         return session_id
 
+    def create_sessions(self, sessions):
+        """
+        Bulk get_or_create_session for new uploads: one upsert per (user, prescription)
+        in a single unordered bulk write. Existing sessions are left as they are.
+        Returns the number of sessions created.
+        """
+        if not sessions:
+            return 0
+        now = datetime.utcnow()
+        requests = []
+        for fields in sessions:
+            doc = {k: v for k, v in fields.items() if v and k not in ("user_id", "prescription_id")}
+            doc.update(session_id=str(uuid.uuid4()), summary="", created_at=now, last_active=now)
+            requests.append(UpdateOne(
+                {"user_id": fields["user_id"], "prescription_id": fields["prescription_id"]},
+                {"$setOnInsert": doc},
+                upsert=True,
+            ))
+        result = self.sessions.bulk_write(requests, ordered=False)
+        logger.info(f"Created {result.upserted_count} sessions ({len(requests) - result.upserted_count} already existed)")
+        return result.upserted_count
+
     def get_session_details(self, session_id):
         """Retrieves details (medicine summary) for a session."""
         session = self.sessions.find_one({"session_id": session_id})
         return session.get("details", "") if session else ""
 
+    def get_extraction(self, session_id):
+        """Returns (structured extraction, content hash) stored with a session; either may be None."""
+        session = self.sessions.find_one({"session_id": session_id}, {"extraction": 1, "content_hash": 1})
+        if not session:
+            return None, None
+        return session.get("extraction"), session.get("content_hash")
+
     def get_prescription_by_filename(self, user_id, filename):
         """Checks if a user has already uploaded a file with this name."""
         # Find session with this filename for this user
@@ -82,20 +123,53 @@ class MemoryManager:
             return session["prescription_id"]
         return None
 
-    def add_message(self, session_id, role, content):
-        """Adds a message to the session history."""
-        self.messages.insert_one({
+    def get_prescription_by_hash(self, user_id, content_hash):
+        """Checks if a user has already uploaded a file with these exact bytes (under any name)."""
+        session = self.sessions.find_one({"user_id": user_id, "content_hash": content_hash})
+        if session:
+            return session["prescription_id"]
+        return None
+
+    def add_message(self, session_id, role, content, metrics=None):
+        """Adds a message to the session history. `metrics` holds per-turn latency figures."""
+        doc = {
             "session_id": session_id,
             "role": role,
             "content": content,
             "timestamp": datetime.utcnow()
-        })
+        }
+        if metrics:
+            doc["metrics"] = metrics
+        if self.write_behind:
+            # Insert and last_active bump are batched by the background flusher
+            self.write_behind.enqueue(doc)
+            return
+        if self.buckets:
+            self.buckets.append(session_id, [doc])
+        else:
+            self.messages.insert_one(doc)
         self.update_last_active(session_id)
 
     def get_history(self, session_id, limit=10):
-        """Retrieves recent messages for a session."""
-        cursor = self.messages.find({"session_id": session_id}).sort("timestamp", 1).limit(limit)
-        return list(cursor)
+        """Retrieves the last `limit` messages of a session, oldest first."""
+        if self.buckets:
+            history = self.buckets.tail(session_id, limit)
+        else:
+            cursor = self.messages.find({"session_id": session_id}).sort("timestamp", -1).limit(limit)
+            history = list(cursor)[::-1]
+        if self.write_behind:
+            # Read-your-writes: include messages still waiting in the write-behind queue
+            pending = self.write_behind.pending_for(session_id)
+            if pending:
+                stored = {doc["_id"] for doc in history}
+                history.extend(doc for doc in pending if doc["_id"] not in stored)
+                history = sorted(history, key=lambda doc: doc["timestamp"])[-limit:]
+        return history
+
+    def flush(self):
+        """Forces queued messages to MongoDB."""
+        if self.write_behind:
+            self.write_behind.flush()
 
     def get_summary(self, session_id):
         """Retrieves the summary for a session."""
@@ -0,0 +1,110 @@
+from collections import defaultdict
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class MessageBucketStore:
+    """
+    Bucketed chat history: each session's messages are packed into documents of at
+    most `bucket_size` messages, shaped like
+        {session_id, opened_at, count, messages: [...], last_ts}
+
+    Each append is a single upsert that $push-es into the session's open bucket (or
+    opens a new one once it is full), and the last K messages come
+    from one query on the (session_id, opened_at) index that reads only the newest
+    bucket or two, no matter how long the session is.
+    """
+    def __init__(self, db, bucket_size=None):
+        self.collection = db.message_buckets
+        self.bucket_size = bucket_size or Config.MESSAGE_BUCKET_SIZE
+
+    def _chunks(self, docs):
+        for i in range(0, len(docs), self.bucket_size):
+            yield docs[i:i + self.bucket_size]
+
+    def _append_op(self, session_id, doc):
+        # Only a bucket with room matches; once the open bucket is full the upsert starts a new one
+        return UpdateOne(
+            {"session_id": session_id, "count": {"$lt": self.bucket_size}},
+            {
+                "$push": {"messages": doc},
+                "$inc": {"count": 1},
+                "$max": {"last_ts": doc["timestamp"]},
+                "$setOnInsert": {"opened_at": doc["timestamp"]},
+            },
+            upsert=True,
+        )
+
+    def append(self, session_id, docs):
+        """Appends messages (oldest first) to a session."""
+        self.append_many({session_id: docs})
+
+    def append_many(self, docs_by_session):
+        """
+        Appends {session_id: [message, ...]} in one ordered bulk write (one $push per
+        message), so a bucket is filled exactly before the next one is opened.
+        """
+        ops = []
+        for session_id, docs in docs_by_session.items():
+            for doc in docs:
+                doc.setdefault("_id", ObjectId())
+                ops.append(self._append_op(session_id, {k: v for k, v in doc.items() if k != "session_id"}))
+        if ops:
+            self.collection.bulk_write(ops, ordered=True)
+
+    def append_documents(self, docs):
+        """Appends flat message documents (each carrying its session_id), keeping their order."""
+        grouped = defaultdict(list)
+        for doc in docs:
+            grouped[doc["session_id"]].append(doc)
+        self.append_many(grouped)
+
+    def tail(self, session_id, limit=10):
+        """Returns the last `limit` messages of a session, oldest first."""
+        if limit <= 0:
+            return []
+        # The newest bucket may hold a single message, so read enough buckets to cover `limit`
+        buckets = -(-limit // self.bucket_size) + 1
+        cursor = self.collection.find(
+            {"session_id": session_id},
+            {"messages": {"$slice": -limit}},
+        ).sort("opened_at", -1).limit(buckets)
+
+        # Oldest bucket first, then push order within each bucket. Timestamps only break remaining ties:
+        # BSON keeps milliseconds, so a turn's question and answer often share one
+        buckets = sorted(cursor, key=lambda bucket: (bucket.get("opened_at") or datetime.min, bucket["_id"]))
+        messages = {}
+        for bucket_rank, bucket in enumerate(buckets):
+            for position, msg in enumerate(bucket.get("messages", [])):
+                # Keyed by _id: a retried write-behind flush may have pushed a message twice; the first copy wins
+                messages.setdefault(msg["_id"], ((bucket_rank, position, msg["timestamp"]), msg))
+        ordered = [msg for _, msg in sorted(messages.values(), key=lambda entry: entry[0])]
+        return [dict(msg, session_id=session_id) for msg in ordered[-limit:]]
+
+    def count(self, session_id):
+        """Total number of stored messages in a session."""
+        result = list(self.collection.aggregate([
+            {"$match": {"session_id": session_id}},
+            {"$group": {"_id": None, "total": {"$sum": "$count"}}},
+        ]))
+        return result[0]["total"] if result else 0
+
+    def import_session(self, session_id, docs):
+        """Writes an ordered message list as full buckets (used by the migration tool)."""
+        buckets = []
+        for chunk in self._chunks(docs):
+            buckets.append({
+                "session_id": session_id,
+                "opened_at": chunk[0].get("timestamp") or datetime.utcnow(),
+                "last_ts": chunk[-1].get("timestamp"),
+                "count": len(chunk),
+                "messages": [{k: v for k, v in doc.items() if k != "session_id"} for doc in chunk],
+            })
+        if buckets:
+            self.collection.insert_many(buckets, ordered=True)
+        return len(buckets)
@@ -0,0 +1,71 @@
+"""
+Copies chat history from the flat `messages` collection into the bucketed
+`message_buckets` layout used when MESSAGE_STORAGE=bucketed.
+
+Usage:
+    python -m src.migrate_messages [--bucket-size 50] [--session ID] [--force] [--dry-run]
+
+Sessions that already have buckets are skipped unless --force is given, in which
+case their buckets are rebuilt. The flat collection is left untouched.
+"""
+import argparse
+import time
+from pymongo import MongoClient
+from src.config import Config
+from src.db_indexes import ensure_indexes
+from src.message_buckets import MessageBucketStore
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def migrate(db, bucket_size=None, session_ids=None, force=False, dry_run=False):
+    """Migrates the given sessions (default: all) and returns a summary dict."""
+    store = MessageBucketStore(db, bucket_size=bucket_size)
+    ensure_indexes(db)
+    summary = {"sessions": 0, "skipped": 0, "messages": 0, "buckets": 0}
+
+    for session_id in session_ids or db.messages.distinct("session_id"):
+        if store.collection.find_one({"session_id": session_id}, {"_id": 1}):
+            if not force:
+                summary["skipped"] += 1
+                continue
+            if not dry_run:
+                store.collection.delete_many({"session_id": session_id})
+
+        # Walks the session_timestamp index, so messages arrive in order
+        docs = list(db.messages.find({"session_id": session_id}).sort("timestamp", 1))
+        if not docs:
+            continue
+        summary["sessions"] += 1
+        summary["messages"] += len(docs)
+        if dry_run:
+            summary["buckets"] += -(-len(docs) // store.bucket_size)
+            continue
+        try:
+            summary["buckets"] += store.import_session(session_id, docs)
+        except Exception as e:
+            logger.error(f"Failed to migrate session {session_id}: {e}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket-size", type=int, default=Config.MESSAGE_BUCKET_SIZE)
+    parser.add_argument("--session", action="append", dest="sessions", help="Only migrate this session (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Rebuild sessions that already have buckets")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would be migrated without writing")
+    args = parser.parse_args()
+
+    client = MongoClient(Config.MONGO_URI)
+    start = time.perf_counter()
+    summary = migrate(client.get_database(Config.MONGO_DB_NAME), args.bucket_size, args.sessions,
+                      force=args.force, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+    prefix = "[dry run] " if args.dry_run else ""
+    print(f"{prefix}Migrated {summary['messages']} messages from {summary['sessions']} sessions "
+          f"into {summary['buckets']} buckets in {elapsed:.1f}s ({summary['skipped']} sessions already bucketed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+from src.config import Config
+from src.otc_data import OTC_LIST_DATA
+from src.utils import setup_logger, ensure_directory
+
+logger = setup_logger(__name__)
+
+
+def entry_hash(item):
+    """Content hash of one catalog entry (name + metadata)."""
+    return hashlib.sha256(json.dumps(item, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def catalog_fingerprint(items=None):
+    """Fingerprint of the whole catalog; changes whenever any entry is added, edited or removed."""
+    items = OTC_LIST_DATA if items is None else items
+    digest = hashlib.sha256()
+    for h in sorted(entry_hash(item) for item in items):
+        digest.update(h.encode("ascii"))
+    return digest.hexdigest()
+
+
+def entry_metadata(item):
+    """Vector metadata stored alongside a catalog entry."""
+    meta = item.get('metadata', {}).copy()
+    meta['source'] = 'general_otc_list'
+    return meta
+
+
+class OTCCatalogSync:
+    """
+    Keeps the OTC namespace of the vector store in step with OTC_LIST_DATA.
+
+    A manifest on disk records the vector id and content hash of every entry that
+    was last synced, plus the whole-catalog fingerprint. Startup compares it with
+    the current list and only embeds/upserts added or changed entries and deletes
+    removed ones. When the fingerprint matches and the namespace still holds as many
+    vectors as the manifest lists, nothing is embedded at all; a count mismatch means
+    the manifest is stale, so the namespace is cleared and fully re-synced.
+    """
+    def __init__(self, vector_store, namespace, manifest_path=None):
+        self.vector_store = vector_store
+        self.namespace = namespace
+        backend = getattr(vector_store, "backend", "pinecone")
+        self.manifest_path = manifest_path or os.path.join(
+            Config.CACHE_DIR, f"otc_manifest_{backend}_{Config.PINECONE_INDEX_NAME}_{namespace}.json"
+        )
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"fingerprint": None, "entries": {}}
+        except Exception as e:
+            logger.warning(f"Unreadable OTC manifest, doing a full sync: {e}")
+            return {"fingerprint": None, "entries": {}}
+
+    def save_manifest(self, manifest):
+        ensure_directory(os.path.dirname(self.manifest_path))
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def sync(self, items=None):
+        """
+        Brings the namespace up to date with `items` (defaults to OTC_LIST_DATA).
+        Returns counts of added/changed/removed/unchanged entries.
+        """
+        items = OTC_LIST_DATA if items is None else items
+        fingerprint = catalog_fingerprint(items)
+        manifest = self.load_manifest()
+
+        previous = manifest.get("entries", {})
+        # The manifest is local; the namespace may have been wiped, recreated or edited from another host
+        count = self.vector_store.namespace_vector_count(self.namespace)
+        if count != len(previous):
+            logger.warning(f"OTC namespace holds {count} vectors but the manifest lists {len(previous)}; "
+                           f"doing a full sync.")
+            if count != 0:
+                self.vector_store.clear_namespace(self.namespace)
+            previous = {}
+        elif manifest.get("fingerprint") == fingerprint:
+            logger.info("OTC catalog unchanged (fingerprint match); skipping sync.")
+            return {"added": 0, "changed": 0, "removed": 0, "unchanged": len(items)}
+
+        current = {}
+        for item in items:
+            vector_id = self.vector_store.text_vector_id(item['medicine_name'], self.namespace)
+            current[vector_id] = (item, entry_hash(item))
+
+        to_upsert = [(vid, item) for vid, (item, h) in current.items() if previous.get(vid) != h]
+        removed = [vid for vid in previous if vid not in current]
+        added = sum(1 for vid, _ in to_upsert if vid not in previous)
+
+        if to_upsert:
+            texts = [item['medicine_name'] for _, item in to_upsert]
+            metadatas = [entry_metadata(item) for _, item in to_upsert]
+            if not self.vector_store.add_texts(texts, metadatas, namespace=self.namespace):
+                raise RuntimeError("Embeddings unavailable; OTC catalog not synced.")
+        if removed:
+            self.vector_store.delete_texts(removed, namespace=self.namespace)
+
+        self.save_manifest({
+            "fingerprint": fingerprint,
+            "entries": {vid: h for vid, (_, h) in current.items()},
+        })
+
+        summary = {
+            "added": added,
+            "changed": len(to_upsert) - added,
+            "removed": len(removed),
+            "unchanged": len(current) - len(to_upsert),
+        }
+        logger.info(f"OTC catalog synced: {summary}")
+        return summary
@@ -1,8 +1,13 @@
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from src.config import Config
 from src.utils import setup_logger
 from src.otc_data import OTC_LIST_DATA
+from src.otc_catalog import OTCCatalogSync, catalog_fingerprint
+from src.otc_matcher import OTCAliasIndex
+from src.otc_verdict_cache import OTCVerdictCache
+from src.tracing import get_tracer, propagate
 
 logger = setup_logger(__name__)
 
@@ -10,45 +15,53 @@ class OTCManager:
     # Use the imported list
     OTC_LIST = OTC_LIST_DATA
     
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(model=Config.GEMINI_MODEL_NAME, google_api_key=Config.GOOGLE_API_KEY)
-        # Initialize Vector Store
-        from src.vector_store import VectorStoreManager
-        self.vector_store = VectorStoreManager()
+    def __init__(self, vector_store=None, client=None, llm=None):
+        if llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            llm = ChatGoogleGenerativeAI(model=Config.GEMINI_MODEL_NAME, google_api_key=Config.GOOGLE_API_KEY)
+        self.llm = llm
+        # Initialize Vector Store (shared instance when injected by the registry)
+        if vector_store is None:
+            from src.vector_store import VectorStoreManager
+            vector_store = VectorStoreManager()
+        self.vector_store = vector_store
         self.otc_namespace = "otc_medicines"
-        self._initialize_otc_db()
+        # Catalog sync can take a while on a cold index; searches wait for it via wait_until_ready()
+        self._synced = threading.Event()
+        if Config.BACKGROUND_BOOTSTRAP:
+            threading.Thread(target=self._initialize_otc_db, name="otc-sync", daemon=True).start()
+        else:
+            self._initialize_otc_db()
+        # Deterministic matcher: exact catalog names are approved, near-misses become LLM candidates
+        self.alias_index = OTCAliasIndex(self.OTC_LIST)
+        # Verdicts shared across users; keyed on the catalog fingerprint so edits invalidate them
+        self.verdict_cache = OTCVerdictCache(catalog_fingerprint(self.OTC_LIST), client=client)
+        self.match_stats = {
+            "checks": 0, "alias_hits": 0, "cache_hits": 0, "no_candidates": 0, "llm_verified": 0, "llm_calls": 0
+        }
 
     def _initialize_otc_db(self):
         """
-        Ingests the OTC list into Pinecone if not already present.
+        Syncs the OTC list into the vector DB.
+        Only entries that changed since the last sync are embedded; see OTCCatalogSync.
         """
         try:
-            # Check if namespace has stats (count > 0)
-            # Pinecone stats might be expensive or slow to update, so we can just basic upsert
-            # For simplicity, we just upsert every time on startup (idempotent)
             logger.info("Initializing OTC Vector DB...")
-            
-            # Use data from the class list or load from markdown if needed
-            # For now, using the hardcoded list for reliability
-            
-            # Extract texts and metadatas from the list of dicts
-            texts = [item['medicine_name'] for item in self.OTC_LIST]
-            metadatas = []
-            for item in self.OTC_LIST:
-                meta = item.get('metadata', {}).copy()
-                meta['source'] = 'general_otc_list'
-                metadatas.append(meta)
-            
-            self.vector_store.add_texts(texts, metadatas, namespace=self.otc_namespace)
-            logger.info("OTC List Ingested into Pinecone.")
-            
+            OTCCatalogSync(self.vector_store, self.otc_namespace).sync(self.OTC_LIST)
         except Exception as e:
             logger.error(f"Failed to initialize OTC DB: {e}")
+        finally:
+            self._synced.set()
+
+    def wait_until_ready(self, timeout=None):
+        """Blocks until the OTC catalog has been synced into the vector DB."""
+        return self._synced.wait(timeout)
 
     def search_otc_db(self, query, top_k=10):
         """
         Searches the OTC vector database for similar medicines.
         """
+        self.wait_until_ready()
         matches = self.vector_store.search(query, namespace=self.otc_namespace, top_k=top_k)
         results = []
         for m in matches:
@@ -62,77 +75,168 @@ class OTCManager:
     def get_otc_list(self):
         return self.OTC_LIST
 
+    def get_match_stats(self):
+        """Counters for OTC checks, including the fraction resolved without an LLM call."""
+        stats = dict(self.match_stats)
+        checks = stats["checks"]
+        stats["llm_avoided_rate"] = round((checks - stats["llm_verified"]) / checks, 4) if checks else 0.0
+        return stats
+
+    @staticmethod
+    def split_medicines(details_text):
+        """
+        Splits a prescription's medicine summary into individual medicine names.
+        Summary lines look like "- Crocin (Qty: 1 tablet): Morning: Yes, ...".
+        """
+        names = []
+        for line in str(details_text).splitlines():
+            line = line.strip()
+            if not line.startswith("- "):
+                continue
+            name = line[2:].split(" (Qty:")[0].split(":")[0].strip()
+            if name:
+                names.append(name)
+        return names or [str(details_text)]
+
+    def _find_candidates(self, name):
+        """Vector search for catalog entries similar to a medicine name."""
+        matches = self.vector_store.search(name, namespace=self.otc_namespace, top_k=3)
+        return [m.metadata['text'] for m in matches if m.score > 0.7] # Threshold
+
+    def _verify_with_llm(self, pending):
+        """
+        Verifies several medicines in one structured-JSON LLM call.
+        `pending` is a list of (name, candidates); returns verdict dicts aligned with it.
+        """
+        blocks = []
+        for i, (name, candidates) in enumerate(pending, start=1):
+            candidates_str = "\n".join(f"   - {c}" for c in candidates)
+            blocks.append(f'{i}. Extracted Medicine: "{name}"\n   Allowed OTC Candidates (from database):\n{candidates_str}')
+        medicines_str = "\n\n".join(blocks)
+
+        prompt = f"""
+        You are a medical assistant. For each extracted medicine below, verify if it is strictly equivalent to any of its allowed OTC candidates.
+
+        {medicines_str}
+
+        Instructions:
+        1. Judge every medicine independently against its own candidates only.
+        2. Determine if the 'Extracted Medicine' matches an 'Allowed OTC Candidate' (Brand or Generic).
+        3. Match must be safe and exact (e.g., "Crocin" matches "Paracetamol"). Combination products, different molecules, a strength the candidate doesn't list, or another route/release form (e.g. IV, XR, "-D") are not a match.
+        4. Return JSON with one verdict per medicine, using the medicine's number as "id".
+
+        Output Format:
+        {{
+            "results": [
+                {{
+                    "id": 1,
+                    "is_otc": true/false,
+                    "matched_candidate": "Name of matched OTC item" or null,
+                    "reason": "Brief explanation"
+                }}
+            ]
+        }}
+        """
+
+        self.match_stats["llm_calls"] += 1
+        self.match_stats["llm_verified"] += len(pending)
+        with get_tracer().span("gemini.otc_verify", medicines=len(pending)):
+            response = self.llm.invoke(prompt, response_mime_type="application/json")
+        content = response.content.replace("```json", "").replace("```", "").strip()
+        verdicts = {int(v.get("id", 0)): v for v in json.loads(content).get("results", [])}
+        return [verdicts.get(i) for i in range(1, len(pending) + 1)]
+
+    @staticmethod
+    def _add_verdict(results, name, verdict):
+        bucket = "otc_medicines" if verdict.get("is_otc") else "consult_medicines"
+        results[bucket].append({"name": name, "reason": verdict.get("reason", "")})
+
     def check_medicines_with_llm(self, medicine_list):
         """
-        Checks if the provided medicines are in the OTC list using Vector Search + LLM.
+        Checks if the provided medicines are in the OTC list.
+        Exact alias hits resolve locally and known verdicts come from the shared cache;
+        the rest get candidates (from the alias index or concurrent vector searches) and
+        a single batched LLM verification call.
         """
-        logger.info("Checking medicines against OTC list using Vector Search + LLM")
+        logger.info(f"Checking {len(medicine_list)} medicines against OTC list")
         
         results = {"otc_medicines": [], "consult_medicines": []}
-        
+
+        # 1. Deterministic alias lookup; only exact hits are approved without verification
+        unresolved = []
+        alias_candidates = {}
         for med in medicine_list:
-            # 1. Parse medicine name if it's a long string
             # The input might be a full line like "- Crocin (Qty: 10)..."
-            # We trust the LLM/Extractor gave us decent strings, but let's just use the whole string for search
-            med_str = str(med)
-            
-            # 2. Vector Search for candidates
-            matches = self.vector_store.search(med_str, namespace=self.otc_namespace, top_k=3)
-            candidates = [m.metadata['text'] for m in matches if m.score > 0.7] # Threshold
-            
-            if not candidates:
-                 # No close semantic match found -> Consult
-                 results["consult_medicines"].append({
-                     "name": med_str.split('(')[0], # Simple cleanup
-                     "reason": "No matching approved OTC medicine found in database."
-                 })
-                 continue
-            
-            # 3. LLM Verification
-            # We ask the LLM: "Is [Medicine] equivalent to any of these [Candidates]?"
-            candidates_str = "\n".join(candidates)
-            
-            prompt = f"""
-            You are a medical assistant. Verify if the extracted medicine is strictly equivalent to any of the allowed OTC candidates found.
-
-            Extracted Medicine: "{med_str}"
-
-            Allowed OTC Candidates (from database):
-            {candidates_str}
-
-            Instructions:
-            1. Determine if the 'Extracted Medicine' matches any 'Allowed OTC Candidate' (Brand or Generic).
-            2. Match must be safe and exact (e.g., "Crocin" matches "Paracetamol").
-            3. Return JSON.
-
-            Output Format:
-            {{
-                "is_otc": true/false,
-                "matched_candidate": "Name of matched OTC item" or null,
-                "reason": "Brief explanation"
-            }}
-            """
-            
+            name_clean = str(med).split(':')[0].split(' (Qty')[0].strip("- ").strip()
+            self.match_stats["checks"] += 1
+
+            alias_match = self.alias_index.match(name_clean)
+            if alias_match and alias_match["method"] == "exact":
+                self.match_stats["alias_hits"] += 1
+                results["otc_medicines"].append({
+                    "name": name_clean,
+                    "reason": f"Matched with {alias_match['entry']['medicine_name']}"
+                })
+                continue
+            if alias_match:
+                # Normalized/fuzzy hits only stand in for the vector search; the LLM still verifies them
+                alias_candidates[name_clean] = [alias_match["entry"]["medicine_name"]]
+            unresolved.append(name_clean)
+
+        # 2. Verdicts already reached for the same medicine (by any user) against this catalog
+        cached = self.verdict_cache.get_many(unresolved) if unresolved else {}
+        self.match_stats["cache_hits"] += len(cached)
+        for name in unresolved:
+            if name in cached:
+                self._add_verdict(results, name, cached[name])
+        unresolved = [name for name in unresolved if name not in cached]
+
+        if not unresolved:
+            logger.info(f"OTC match stats: {self.get_match_stats()}")
+            return results
+
+        # 3. Vector Search for candidates of names the alias index couldn't place, all in parallel
+        to_search = [name for name in unresolved if name not in alias_candidates]
+        searched = {}
+        if to_search:
+            self.wait_until_ready()
+            with ThreadPoolExecutor(max_workers=min(8, len(to_search))) as pool:
+                searched = dict(zip(to_search, pool.map(propagate(self._find_candidates), to_search)))
+        candidate_lists = [alias_candidates.get(name) or searched[name] for name in unresolved]
+
+        fresh = {}
+        pending = []
+        for name, candidates in zip(unresolved, candidate_lists):
+            if candidates:
+                pending.append((name, candidates))
+            else:
+                # No close semantic match found -> Consult
+                self.match_stats["no_candidates"] += 1
+                fresh[name] = {"is_otc": False, "reason": "No matching approved OTC medicine found in database."}
+
+        # 4. One LLM round trip verifies every remaining medicine
+        if pending:
             try:
-                response = self.llm.invoke(prompt)
-                content = response.content.replace("```json", "").replace("```", "").strip()
-                verification = json.loads(content)
-                
-                name_clean = med_str.split(':')[0].strip("- ").strip()
-                
-                if verification.get("is_otc"):
-                    results["otc_medicines"].append({
-                        "name": name_clean,
-                        "reason": f"Matched with {verification.get('matched_candidate')}"
-                    })
+                verdicts = self._verify_with_llm(pending)
+            except Exception as e:
+                logger.error(f"Error verifying medicines {[name for name, _ in pending]}: {e}")
+                verdicts = [None] * len(pending)
+
+            for (name, _), verification in zip(pending, verdicts):
+                if verification is None:
+                    # Errors are reported but never cached
+                    results["consult_medicines"].append({"name": name, "reason": "Error verifying safety"})
+                elif verification.get("is_otc"):
+                    fresh[name] = {"is_otc": True, "reason": f"Matched with {verification.get('matched_candidate')}"}
                 else:
-                    results["consult_medicines"].append({
-                        "name": name_clean,
+                    fresh[name] = {
+                        "is_otc": False,
                         "reason": verification.get("reason", "Not a valid match with allowed list")
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error checking medicine {med_str}: {e}")
-                results["consult_medicines"].append({"name": med_str, "reason": "Error verifying safety"})
+                    }
+
+        for name, verdict in fresh.items():
+            self._add_verdict(results, name, verdict)
+        self.verdict_cache.put_many(fresh)
 
+        logger.info(f"OTC match stats: {self.get_match_stats()}")
         return results
@@ -0,0 +1,196 @@
+import re
+from collections import defaultdict
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# Dosage-form words that don't change which medicine a name refers to
+FORM_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules", "syp", "syrup",
+    "lozenge", "lozenges", "drop", "drops", "effervescent", "oral", "chewable",
+}
+# Parenthesised notes in the catalog that describe the product rather than name it
+DESCRIPTOR_WORDS = FORM_WORDS | {"low", "dose", "variant", "equivalent", "decongestant", "ors"}
+STRENGTH_RE = re.compile(r"^\d+(\.\d+)?(-\d+(\.\d+)?)?(mg|mcg|g|ml|iu)?$")
+UNIT_WORDS = {"mg", "mcg", "g", "ml", "iu"}
+# A prescription line naming more than one drug must never be auto-approved
+COMBINATION_RE = re.compile(r"\+|&|\band\b|\bwith\b|/")
+# Route, release and combination modifiers that make a different product ("Famotidine IV", "Loratadine-D")
+MODIFIER_WORDS = {
+    "iv", "im", "sc", "inj", "injection", "infusion", "d", "xr", "er", "sr", "cr", "mr", "xl", "la", "od",
+    "ds", "forte", "plus", "max", "gel", "cream", "ointment", "spray", "nasal", "topical", "patch",
+}
+
+
+def _tokens(text):
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+
+
+def normalize(text, keep_strength=True):
+    """Lowercases, strips punctuation and dosage-form words, and optionally strength tokens."""
+    words = [w for w in _tokens(text) if w not in FORM_WORDS]
+    if not keep_strength:
+        words = [w for w in words if not STRENGTH_RE.match(w) and w not in UNIT_WORDS]
+    return " ".join(words)
+
+
+def parse_strengths(text):
+    """Numeric strengths in a name, as (low, high) ranges: "Melatonin 3-5mg" -> [(3.0, 5.0)]."""
+    ranges = []
+    for word in re.findall(r"(?<![a-z\d.])\d[\d.]*(?:\s*-\s*\d[\d.]*)?\s*(?:mg|mcg|g|ml|iu)?\b", text.lower()):
+        word = re.sub(r"\s+", "", word)
+        if STRENGTH_RE.match(word):
+            numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", word)]
+            ranges.append((min(numbers), max(numbers)))
+    return ranges
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_catalog_name(name):
+    """
+    Splits a catalog string such as "Paracetamol (Dolo 650, Crocin)" into its
+    names (generic + brands) and strengths.
+    """
+    names, strengths = [], []
+    outside = re.sub(r"\(.*?\)", " ", name)
+    inside = " , ".join(re.findall(r"\((.*?)\)", name))
+
+    for part in outside.split(","):
+        if part.strip():
+            names.append(part.strip())
+
+    for part in re.split(r"[,/]", inside):
+        part = re.sub(r"^\s*e\.?\s*g\.?\s*", "", part.strip(), flags=re.IGNORECASE).strip()
+        if not part:
+            continue
+        words = _tokens(part)
+        if all(STRENGTH_RE.match(w) or w in UNIT_WORDS for w in words):
+            strengths.append(part)
+        elif all(w in DESCRIPTOR_WORDS for w in words):
+            continue
+        else:
+            # "Can-C equivalent" -> "Can-C"
+            names.append(re.sub(r"\s+equivalent$", "", part, flags=re.IGNORECASE))
+    return names, strengths
+
+
+class OTCAliasIndex:
+    """
+    Deterministic name matcher compiled from the OTC catalog.
+
+    Lookup tiers, in order:
+    1. exact      - the raw string equals a catalog name/brand (case-insensitive)
+    2. normalized - equal after dropping punctuation, dosage forms and strengths
+    3. fuzzy      - character-trigram Dice similarity above a threshold, with a clear
+                    margin over the best candidate from a different catalog entry
+
+    Only exact hits are safe to approve on their own; normalized and fuzzy hits are
+    candidates for LLM verification. A name whose strength contradicts the catalog's,
+    or that carries a route/release modifier, is not matched at all. Anything else is
+    reported as no match and left to vector search + LLM.
+    """
+    def __init__(self, catalog, fuzzy_threshold=None, fuzzy_margin=None):
+        self.fuzzy_threshold = Config.OTC_FUZZY_THRESHOLD if fuzzy_threshold is None else fuzzy_threshold
+        self.fuzzy_margin = Config.OTC_FUZZY_MARGIN if fuzzy_margin is None else fuzzy_margin
+        self.entries = []
+        self.exact = {}
+        self.normalized = {}
+        # Strengths a key implies: the entry's listed ones plus any in the alias itself ("Dolo 650")
+        self.key_strengths = {}
+        self.trigram_index = defaultdict(set)
+        self.key_trigrams = {}
+
+        for entry_id, item in enumerate(catalog):
+            names, strengths = parse_catalog_name(item['medicine_name'])
+            self.entries.append({"item": item, "names": names, "strengths": strengths})
+            for alias in names:
+                self.exact.setdefault(alias.lower().strip(), entry_id)
+                allowed = [r for s in strengths for r in parse_strengths(s)] + parse_strengths(alias)
+                for key in {normalize(alias), normalize(alias, keep_strength=False)}:
+                    if key and key not in self.normalized:
+                        self.normalized[key] = entry_id
+                        self.key_strengths[key] = allowed
+
+        for key in self.normalized:
+            grams = _trigrams(key)
+            self.key_trigrams[key] = grams
+            for gram in grams:
+                self.trigram_index[gram].add(key)
+
+        logger.info(f"Compiled OTC alias index: {len(self.entries)} entries, {len(self.normalized)} keys")
+
+    def _result(self, entry_id, alias, method, score):
+        return {
+            "entry": self.entries[entry_id]["item"],
+            "alias": alias,
+            "method": method,
+            "score": round(score, 3),
+        }
+
+    def match(self, medicine):
+        """
+        Returns a match dict for a hit, or None if the name is ambiguous/unknown.
+        Only method "exact" is an approval; other methods name a candidate to verify.
+        """
+        text = str(medicine).strip()
+        if not text or COMBINATION_RE.search(text.lower()):
+            return None
+
+        entry_id = self.exact.get(text.lower())
+        if entry_id is not None:
+            return self._result(entry_id, text, "exact", 1.0)
+
+        bare = normalize(text, keep_strength=False)
+        strengths = parse_strengths(text)
+
+        for key in (normalize(text), bare):
+            if key and key in self.normalized:
+                if not self._strengths_agree(strengths, key):
+                    return None
+                return self._result(self.normalized[key], key, "normalized", 1.0)
+
+        match = self._fuzzy(bare)
+        if match and not self._strengths_agree(strengths, match["alias"]):
+            return None
+        return match
+
+    def _strengths_agree(self, strengths, key):
+        """False when the catalog lists strengths for `key` and one of the input's falls outside them."""
+        allowed = self.key_strengths.get(key)
+        if not strengths or not allowed:
+            return True
+        return all(any(lo <= s_lo and s_hi <= hi for lo, hi in allowed) for s_lo, s_hi in strengths)
+
+    def _fuzzy(self, key):
+        if len(key) < 4:
+            return None
+        grams = _trigrams(key)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.trigram_index.get(gram, set())
+
+        best_by_entry = {}
+        for candidate in candidates:
+            other = self.key_trigrams[candidate]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            entry_id = self.normalized[candidate]
+            if score > best_by_entry.get(entry_id, (0.0, None))[0]:
+                best_by_entry[entry_id] = (score, candidate)
+
+        if not best_by_entry:
+            return None
+        ranked = sorted(best_by_entry.items(), key=lambda kv: kv[1][0], reverse=True)
+        entry_id, (score, alias) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else 0.0
+        # A typo changes a word; it doesn't add one or swap in a route/release modifier
+        words, alias_words = key.split(), alias.split()
+        if len(words) != len(alias_words) or MODIFIER_WORDS & (set(words) - set(alias_words)):
+            return None
+        if score >= self.fuzzy_threshold and score - runner_up >= self.fuzzy_margin:
+            return self._result(entry_id, alias, "fuzzy", score)
+        return None
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from src.config import Config
+from src.otc_matcher import normalize
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class OTCVerdictCache:
+    """
+    Cross-user store of OTC verdicts, keyed by normalized medicine name plus the
+    OTC catalog fingerprint. Verdicts from an older catalog simply stop matching
+    when OTC_LIST_DATA changes, and the TTL index removes them from MongoDB.
+
+    An in-process LRU sits in front of the Mongo collection.
+    """
+    def __init__(self, catalog_fingerprint, client=None):
+        self.catalog_fingerprint = catalog_fingerprint
+        self.client = client or MongoClient(Config.MONGO_URI)
+        self.collection = self.client.get_database(Config.MONGO_DB_NAME).otc_verdicts
+        self.max_items = Config.OTC_VERDICT_CACHE_ITEMS
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        try:
+            self.collection.create_index(
+                [("name_key", 1), ("catalog_fingerprint", 1)], unique=True, name="name_fingerprint"
+            )
+            self.collection.create_index(
+                "created_at", expireAfterSeconds=Config.OTC_VERDICT_TTL_DAYS * 86400, name="verdict_ttl"
+            )
+        except Exception as e:
+            logger.error(f"Failed to create OTC verdict indexes: {e}")
+
+    @staticmethod
+    def name_key(name):
+        return normalize(name)
+
+    def _remember(self, key, verdict):
+        self._lru[key] = verdict
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, names):
+        """Returns {name: verdict} for the names that have a cached verdict."""
+        found, missing = {}, {}
+        with self._lock:
+            for name in names:
+                key = self.name_key(name)
+                verdict = self._lru.get(key)
+                if verdict is not None:
+                    self._lru.move_to_end(key)
+                    found[name] = verdict
+                    self.stats["memory_hits"] += 1
+                else:
+                    missing.setdefault(key, []).append(name)
+
+        if missing:
+            try:
+                docs = self.collection.find(
+                    {"name_key": {"$in": list(missing)}, "catalog_fingerprint": self.catalog_fingerprint},
+                    {"_id": 0, "name_key": 1, "verdict": 1},
+                )
+                with self._lock:
+                    for doc in docs:
+                        self._remember(doc["name_key"], doc["verdict"])
+                        for name in missing.pop(doc["name_key"], []):
+                            found[name] = doc["verdict"]
+                            self.stats["db_hits"] += 1
+            except Exception as e:
+                logger.error(f"OTC verdict lookup failed: {e}")
+
+        with self._lock:
+            self.stats["misses"] += sum(len(v) for v in missing.values())
+        return found
+
+    def put_many(self, verdicts):
+        """Stores {name: verdict} pairs, where verdict is {"is_otc": bool, "reason": str}."""
+        if not verdicts:
+            return
+        now = datetime.utcnow()
+        ops = []
+        with self._lock:
+            for name, verdict in verdicts.items():
+                key = self.name_key(name)
+                self._remember(key, verdict)
+                ops.append(UpdateOne(
+                    {"name_key": key, "catalog_fingerprint": self.catalog_fingerprint},
+                    {"$set": {"verdict": verdict, "created_at": now}},
+                    upsert=True,
+                ))
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to store OTC verdicts: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, memory_items=len(self._lru))
@@ -0,0 +1,195 @@
+import threading
+import time
+import uuid
+from src.config import Config
+from src.otc_matcher import normalize
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def prescription_id_for(user_id, content_hash):
+    """Deterministic prescription id for a user's upload, so re-processing the same bytes is idempotent."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}:{content_hash}"))
+
+
+def session_owner(user_id, prescription_id):
+    """Blob reference held by a chat session."""
+    return f"session:{user_id}:{prescription_id}"
+
+
+def medicine_key(name):
+    """Normalized medicine name (no dosage form or strength) used as filterable chunk metadata."""
+    return normalize(str(name or ""), keep_strength=False)
+
+
+def mentioned_medicines(question, keys):
+    """The medicine keys (see medicine_key) whose every word appears in the question."""
+    words = set(normalize(question, keep_strength=False).split())
+    mentioned = []
+    for key in keys:
+        parts = [part for part in key.split() if len(part) > 1] or key.split()
+        if parts and all(part in words for part in parts) and key not in mentioned:
+            mentioned.append(key)
+    return mentioned
+
+
+def format_medicines(data):
+    """Medicine lines shown in the chat header and indexed for retrieval."""
+    med_details = []
+    for med in data.get('medicines', []):
+        timing = med.get('timing', {})
+        timing_str = f"Morning: {timing.get('morning')}, Afternoon: {timing.get('afternoon')}, Night: {timing.get('night')}, Instruction: {timing.get('instruction')}"
+        med_details.append(f"- {med.get('name')} (Qty: {med.get('quantity')}): {timing_str}, Freq: {med.get('frequency')}, Duration: {med.get('duration')}")
+    return "\n".join(med_details)
+
+
+def _field(value):
+    # Vector metadata can't hold None; Gemini uses "-" for missing fields
+    return str(value).strip() if value not in (None, "") else "-"
+
+
+def build_chunks(data):
+    """
+    Chunks to embed for an extraction result, as (text, metadata) pairs:
+    a header chunk (date, medicine names, notes) and one chunk per medicine whose
+    metadata carries the medicine key and its dosage/timing fields for filtering.
+    """
+    medicines = data.get('medicines', [])
+    date = _field(data.get('date'))
+    names = [_field(med.get('name')) for med in medicines]
+    chunks = [(
+        f"Prescription dated {date}\nMedicines: {', '.join(names) or '-'}\nNotes: {_field(data.get('notes'))}",
+        {"chunk_type": "header", "medicines": [medicine_key(name) for name in names]},
+    )]
+    for name, med in zip(names, medicines):
+        timing = med.get('timing') or {}
+        fields = {
+            "quantity": _field(med.get('quantity')),
+            "morning": _field(timing.get('morning')),
+            "afternoon": _field(timing.get('afternoon')),
+            "night": _field(timing.get('night')),
+            "instruction": _field(timing.get('instruction')),
+            "frequency": _field(med.get('frequency')),
+            "duration": _field(med.get('duration')),
+        }
+        text = (f"Medicine: {name} (prescription dated {date})\nQuantity: {fields['quantity']}\n"
+                f"Timing: Morning: {fields['morning']}, Afternoon: {fields['afternoon']}, Night: {fields['night']}, "
+                f"Instruction: {fields['instruction']}\nFrequency: {fields['frequency']}\nDuration: {fields['duration']}")
+        chunks.append((text, {"chunk_type": "medicine", "medicine": medicine_key(name), "medicine_name": name, **fields}))
+    return chunks
+
+
+def build_title(data, filename):
+    """Chat title from the first two medicine names."""
+    med_names = [m.get('name', 'Unknown') for m in data.get('medicines', [])]
+    if not med_names:
+        return f"Prescription {filename}"
+    title = f"Prescription: {', '.join(med_names[:2])}"
+    if len(med_names) > 2:
+        title += "..."
+    return title
+
+
+class PrescriptionPipeline:
+    """
+    The upload pipeline shared by the app's job queue and the bulk ingester:
+    extract (or reuse a cached extraction) -> chunk -> embed + upsert -> create the chat session.
+
+    Stages are separate methods so callers can batch the index and session steps.
+    Concurrent extractions of the same bytes are serialised per content hash, so the
+    second one is served from the extraction cache instead of calling Gemini again.
+    With a blob store, each created session holds a reference to its uploaded blob.
+    """
+    def __init__(self, extractor, vector_store, memory, extraction_cache=None, blob_store=None):
+        self.extractor = extractor
+        self.vector_store = vector_store
+        self.memory = memory
+        self.extraction_cache = extraction_cache
+        self.blob_store = blob_store
+        # content hash -> [lock, number of extractions holding or waiting on it]
+        self._hash_locks = {}
+        self._guard = threading.Lock()
+
+    def _acquire_hash_lock(self, content_hash):
+        with self._guard:
+            entry = self._hash_locks.setdefault(content_hash, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_hash_lock(self, content_hash):
+        with self._guard:
+            entry = self._hash_locks[content_hash]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._hash_locks[content_hash]
+
+    def extract(self, file_path, content_hash):
+        """
+        Returns (data, cache_entry, ms); data is None if extraction failed.
+        Raises RuntimeError when some pages could not be extracted, so a partial
+        result is neither cached nor indexed as if it were the whole prescription.
+        """
+        start = time.perf_counter()
+        lock = self._acquire_hash_lock(content_hash)
+        try:
+            with lock:
+                cached = self.extraction_cache.get(content_hash) if self.extraction_cache else None
+                report = {}
+                data = cached["data"] if cached else self.extractor.extract_data(file_path, report=report)
+                if report.get("failed_pages"):
+                    raise RuntimeError(f"Could not read page(s) {', '.join(map(str, report['failed_pages']))} "
+                                       f"of the prescription; please upload it again.")
+                if data and not cached and self.extraction_cache:
+                    # Store the extraction now; embeddings are added once they are computed
+                    self.extraction_cache.put(content_hash, data)
+                    cached = {"data": data}
+        finally:
+            self._release_hash_lock(content_hash)
+        return data, cached, round((time.perf_counter() - start) * 1000, 1)
+
+    def index(self, items):
+        """
+        Embeds and upserts a batch of extracted uploads in one pass.
+        Each item is a dict with prescription_id, data, filename, user_id, content_hash,
+        size_bytes and (optionally) the extraction cache entry. Returns the batch time in ms.
+        """
+        start = time.perf_counter()
+        batch = []
+        for item in items:
+            records = build_chunks(item["data"])
+            chunks = [text for text, _ in records]
+            cached = item.get("cached")
+            embeddings = self.extraction_cache.embeddings_for(cached, chunks) if self.extraction_cache and cached else None
+            batch.append({
+                "prescription_id": item["prescription_id"],
+                "chunks": chunks,
+                "chunk_metadata": [meta for _, meta in records],
+                "metadata": {"filename": item["filename"], "user_id": item["user_id"]},
+                "embeddings": embeddings,
+            })
+        self.vector_store.add_prescriptions(batch)
+        if self.extraction_cache:
+            for item, entry in zip(items, batch):
+                if entry["embeddings"] is None and entry.get("computed"):
+                    self.extraction_cache.put(item["content_hash"], item["data"], chunks=entry["chunks"],
+                                              embeddings=entry["computed"], size_bytes=item.get("size_bytes"))
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    def register(self, items):
+        """Creates the chat sessions for a batch of indexed uploads. Returns the batch time in ms."""
+        start = time.perf_counter()
+        self.memory.create_sessions([{
+            "user_id": item["user_id"],
+            "prescription_id": item["prescription_id"],
+            "title": build_title(item["data"], item["filename"]),
+            "filename": item["filename"],
+            "details": format_medicines(item["data"]),
+            # Structured fields the chat's intent router answers from
+            "extraction": item["data"],
+            "content_hash": item["content_hash"],
+        } for item in items])
+        if self.blob_store:
+            self.blob_store.retain_many([(item["content_hash"], session_owner(item["user_id"], item["prescription_id"]))
+                                         for item in items])
+        return round((time.perf_counter() - start) * 1000, 1)
@@ -0,0 +1,120 @@
+import math
+import threading
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+# A piece that would be cut below this many tokens is dropped instead
+MIN_PIECE_TOKENS = 24
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken's cl100k_base, loaded once; False if it isn't available (e.g. offline without a cached file)."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.info(f"tiktoken unavailable ({type(e).__name__}); estimating 4 characters per token")
+                    _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Token count of a prompt piece. Gemini's tokenizer isn't available locally, so this
+    uses cl100k_base (or ~4 characters per token) as a close, consistent estimate.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_tokens(text, max_tokens):
+    """The first `max_tokens` tokens of `text`."""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def _take(pieces, budget):
+    """
+    Keeps pieces in order (most valuable first) while they fit in `budget`, cutting
+    the first one that doesn't if enough room is left. Returns (kept, tokens, dropped, truncated).
+    """
+    kept, used, truncated = [], 0, 0
+    for text, tokens in pieces:
+        room = budget - used
+        if tokens <= room:
+            kept.append(text)
+            used += tokens
+            continue
+        if room >= MIN_PIECE_TOKENS:
+            kept.append(truncate_tokens(text, room))
+            used += room
+            truncated += 1
+        break
+    return kept, used, len(pieces) - len(kept), truncated
+
+
+class PromptBudget:
+    """
+    Fits retrieved context and chat history into a fixed prompt token budget.
+
+    Instructions and the question are always kept; what's left is split between history
+    (up to `history_share`) and context, and either side can use room the other leaves
+    unused. Context chunks arrive ranked, so the lowest-ranked are dropped first; history
+    keeps the newest messages and drops the oldest. The piece at the boundary is cut
+    rather than dropped when a useful part of it fits.
+    """
+    def __init__(self, total_tokens=None, history_share=None):
+        self.total_tokens = total_tokens or Config.PROMPT_TOKEN_BUDGET
+        self.history_share = Config.PROMPT_HISTORY_SHARE if history_share is None else history_share
+
+    def fit(self, instructions, context, history):
+        """
+        `instructions` is the prompt without context and history; `context` is a list of
+        chunks, best first; `history` a list of messages, oldest first.
+        Returns (context, history, stats) with the kept pieces in their original order.
+        """
+        instruction_tokens = count_tokens(instructions)
+        available = max(self.total_tokens - instruction_tokens, 0)
+        if not available:
+            logger.warning(f"Prompt instructions alone use {instruction_tokens} of {self.total_tokens} tokens")
+
+        chunks = [(text, count_tokens(text)) for text in context]
+        messages = [(text, count_tokens(text)) for text in reversed(history)] # newest first
+        history_wanted = sum(tokens for _, tokens in messages)
+        context_wanted = sum(tokens for _, tokens in chunks)
+
+        # History gets its share (or less, if it needs less); context gets the rest
+        history_cap = min(history_wanted, int(available * self.history_share))
+        kept_context, context_tokens, dropped_chunks, cut_chunks = _take(chunks, max(available - history_cap, 0))
+        kept_history, history_tokens, dropped_messages, cut_messages = _take(messages, available - context_tokens)
+
+        stats = {
+            "prompt_tokens": instruction_tokens + context_tokens + history_tokens,
+            "instruction_tokens": instruction_tokens,
+            "context_tokens": context_tokens,
+            "history_tokens": history_tokens,
+            "trimmed_tokens": context_wanted + history_wanted - context_tokens - history_tokens,
+            "dropped_chunks": dropped_chunks,
+            "dropped_messages": dropped_messages,
+            "truncated": cut_chunks + cut_messages,
+        }
+        if stats["trimmed_tokens"]:
+            logger.info(f"Prompt over budget: trimmed {stats['trimmed_tokens']} tokens "
+                        f"({dropped_chunks} chunks, {dropped_messages} messages dropped, {stats['truncated']} cut)")
+        return kept_context, list(reversed(kept_history)), stats
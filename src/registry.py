@@ -0,0 +1,208 @@
+import os
+import threading
+from pymongo import MongoClient, monitoring
+from src.config import Config
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ConnectionCounter(monitoring.ConnectionPoolListener):
+    """Tracks how many pooled MongoDB connections the process currently holds."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.created = 0
+        self.checked_out = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+    def snapshot(self):
+        with self._lock:
+            return {"open": self.open, "created": self.created, "checked_out": self.checked_out}
+
+
+class ResourceRegistry:
+    """
+    Process-wide owner of the expensive clients and managers.
+
+    Every Streamlit session (and every manager) gets the same MongoClient, vector
+    store, LLM-backed managers and compiled RAG graph from here instead of building
+    its own. Each resource is created lazily on first use, exactly once, under a
+    per-resource lock. All of them are safe to share between threads.
+    """
+    def __init__(self):
+        self._instances = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self._warm_up_thread = None
+        self.connections = ConnectionCounter()
+
+    def _get(self, name, factory):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._instances:
+                logger.info(f"Creating shared {name}")
+                self._instances[name] = factory()
+            return self._instances[name]
+
+    def is_ready(self, name):
+        """True once the named resource has been built."""
+        return name in self._instances
+
+    def warm_up(self, names=("vector_store", "otc_manager", "extractor", "rag_graph")):
+        """
+        Builds the heavy resources (SDK imports, index checks, OTC sync) on a background
+        thread, once per process, so the first page can render without waiting on them.
+        """
+        with self._guard:
+            if self._warm_up_thread is not None:
+                return self._warm_up_thread
+
+            def run():
+                for name in names:
+                    try:
+                        getattr(self, name)
+                    except Exception as e:
+                        logger.error(f"Background warm-up of {name} failed: {e}")
+
+            self._warm_up_thread = threading.Thread(target=run, name="registry-warm-up", daemon=True)
+            self._warm_up_thread.start()
+            return self._warm_up_thread
+
+    @property
+    def mongo_client(self):
+        def connect():
+            listeners = [self.connections]
+            if Config.TRACING_ENABLED:
+                from src.tracing import MongoCommandTracer, get_tracer
+                listeners.append(MongoCommandTracer(get_tracer()))
+            return MongoClient(Config.MONGO_URI, maxPoolSize=Config.MONGO_MAX_POOL_SIZE, event_listeners=listeners)
+        return self._get("mongo_client", connect)
+
+    @property
+    def vector_store(self):
+        from src.vector_store import VectorStoreManager
+        return self._get("vector_store", VectorStoreManager)
+
+    @property
+    def auth(self):
+        from src.auth import AuthManager
+        return self._get("auth", lambda: AuthManager(client=self.mongo_client))
+
+    @property
+    def memory(self):
+        from src.memory import MemoryManager
+        return self._get("memory", lambda: MemoryManager(client=self.mongo_client))
+
+    @property
+    def extractor(self):
+        from src.extractor import PrescriptionExtractor
+        return self._get("extractor", PrescriptionExtractor)
+
+    @property
+    def extraction_cache(self):
+        from src.extraction_cache import ExtractionCache
+        return self._get("extraction_cache", lambda: ExtractionCache(client=self.mongo_client))
+
+    @property
+    def blob_store(self):
+        from src.blob_store import BlobStore
+        return self._get("blob_store", lambda: BlobStore(client=self.mongo_client))
+
+    @property
+    def pipeline(self):
+        from src.prescription_pipeline import PrescriptionPipeline
+        return self._get("pipeline", lambda: PrescriptionPipeline(
+            self.extractor, self.vector_store, self.memory,
+            extraction_cache=self.extraction_cache if Config.EXTRACTION_CACHE_ENABLED else None,
+            blob_store=self.blob_store,
+        ))
+
+    @property
+    def upload_jobs(self):
+        from src.upload_jobs import UploadJobQueue
+        return self._get("upload_jobs", lambda: UploadJobQueue(self.pipeline, client=self.mongo_client,
+                                                               blob_store=self.blob_store))
+
+    @property
+    def otc_manager(self):
+        from src.otc_manager import OTCManager
+        return self._get("otc_manager", lambda: OTCManager(vector_store=self.vector_store, client=self.mongo_client))
+
+    @property
+    def rag(self):
+        from src.graph import RAGGraph
+        return self._get("rag", lambda: RAGGraph(
+            vector_store=self.vector_store, memory=self.memory,
+            extraction_cache=self.extraction_cache if Config.EXTRACTION_CACHE_ENABLED else None,
+        ))
+
+    @property
+    def rag_graph(self):
+        return self._get("rag_graph", lambda: self.rag.build_graph())
+
+    def report(self):
+        """Memory and connection figures for this process. Figures the platform can't provide are None."""
+        rss_kb = peak_kb = None
+        try:
+            with open("/proc/self/statm") as f:
+                rss_kb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+        except (OSError, ValueError, AttributeError):
+            pass
+        try:
+            # Unix only; ru_maxrss is KiB on Linux
+            import resource
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except ImportError:
+            pass
+        return {
+            "pid": os.getpid(),
+            "rss_mb": round(rss_kb / 1024, 1) if rss_kb is not None else None,
+            "peak_rss_mb": round(peak_kb / 1024, 1) if peak_kb is not None else None,
+            "threads": threading.active_count(),
+            "mongo_clients": 1 if "mongo_client" in self._instances else 0,
+            "mongo_connections": self.connections.snapshot(),
+            "mongo_max_pool_size": Config.MONGO_MAX_POOL_SIZE,
+            "resources": sorted(self._instances),
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the process-wide ResourceRegistry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ResourceRegistry()
+        return _registry
@@ -0,0 +1,148 @@
+"""
+Import-time and startup profile for the app.
+
+Each module is imported in a fresh interpreter with `-X importtime`, so the
+numbers are cold-import costs. With --resources the shared registry resources
+are also built in-process (needs the usual .env credentials), timing both
+construction and, for background-bootstrapped ones, the time until ready.
+
+Usage:
+    python -m src.startup_profile
+    python -m src.startup_profile --json profile.json
+    python -m src.startup_profile --baseline profile.json   # exit 1 on regressions
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+
+# What the login page imports, followed by the modules behind the main page
+MODULES = [
+    "src.config",
+    "src.registry",
+    "src.auth",
+    "src.memory",
+    "src.vector_store",
+    "src.otc_manager",
+    "src.extractor",
+    "src.graph",
+    "streamlit",
+]
+# Heavy SDKs that should only load on first use
+LAZY_SDKS = ["google.generativeai", "langchain_google_genai", "langgraph", "pinecone"]
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module):
+    """Cold-imports a module in a subprocess; returns its cost and which lazy SDKs it pulled in."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"module": module, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+
+    cumulative_us, loaded = 0, set()
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        loaded.add(name)
+        # Top-level entries (no indentation) add up to the total import cost
+        if not match.group(3).replace(" ", "", 1):
+            cumulative_us += int(match.group(2))
+    return {
+        "module": module,
+        "import_ms": round(cumulative_us / 1000, 1),
+        "modules_loaded": len(loaded),
+        "sdks_loaded": [sdk for sdk in LAZY_SDKS if sdk in loaded],
+    }
+
+
+def profile_resources():
+    """Builds each registry resource and times construction and readiness."""
+    from src.registry import get_registry
+    registry = get_registry()
+    results = []
+    for name in ["auth", "memory", "vector_store", "otc_manager", "extractor", "rag_graph"]:
+        start = time.perf_counter()
+        try:
+            resource = getattr(registry, name)
+        except Exception as e:
+            results.append({"resource": name, "error": str(e)})
+            continue
+        built_ms = (time.perf_counter() - start) * 1000
+        if hasattr(resource, "wait_until_ready"):
+            resource.wait_until_ready()
+        elif hasattr(resource, "is_ready"):
+            resource.index  # blocks until the background index check is done
+        results.append({
+            "resource": name,
+            "construct_ms": round(built_ms, 1),
+            "ready_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+    return results
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Returns human-readable regressions of `report` against `baseline`."""
+    previous = {row["module"]: row for row in baseline.get("imports", []) if "import_ms" in row}
+    regressions = []
+    for row in report["imports"]:
+        before = previous.get(row["module"])
+        if not before or "import_ms" not in row:
+            continue
+        delta = row["import_ms"] - before["import_ms"]
+        if delta > min_delta_ms and row["import_ms"] > before["import_ms"] * (1 + tolerance):
+            regressions.append(f"{row['module']}: {before['import_ms']}ms -> {row['import_ms']}ms")
+        new_sdks = set(row["sdks_loaded"]) - set(before.get("sdks_loaded", []))
+        if new_sdks:
+            regressions.append(f"{row['module']} now imports {', '.join(sorted(new_sdks))} eagerly")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resources", action="store_true", help="Also time building the registry resources")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=20.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "imports": [profile_import(m) for m in MODULES]}
+    print(f"{'module':<22}{'import ms':>10}{'modules':>9}  heavy SDKs loaded")
+    for row in report["imports"]:
+        if "error" in row:
+            print(f"{row['module']:<22}  error: {row['error']}")
+            continue
+        print(f"{row['module']:<22}{row['import_ms']:>10.1f}{row['modules_loaded']:>9}  {', '.join(row['sdks_loaded']) or '-'}")
+
+    if args.resources:
+        report["resources"] = profile_resources()
+        print(f"\n{'resource':<22}{'construct ms':>13}{'ready ms':>10}")
+        for row in report["resources"]:
+            if "error" in row:
+                print(f"{row['resource']:<22}  error: {row['error']}")
+            else:
+                print(f"{row['resource']:<22}{row['construct_ms']:>13.1f}{row['ready_ms']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nStartup regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo startup regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
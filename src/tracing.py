@@ -0,0 +1,266 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pymongo import monitoring
+from src.config import Config
+from src.utils import setup_logger, ensure_directory
+
+logger = setup_logger(__name__)
+
+# (trace_id, span_id) of the span the current code runs in; None outside any trace
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def current_trace_id():
+    """Id of the active trace (a chat turn or upload job), or None."""
+    current = _current.get()
+    return current[0] if current else None
+
+
+def _percentile(values, pct):
+    # Nearest rank on sorted values
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+class TraceStore:
+    """
+    Local exporter for finished spans: a SQLite table used as a ring buffer.
+
+    Spans are buffered in memory and written in batches by a background thread,
+    so recording one never waits on disk. Only the newest `max_spans` rows are kept.
+    """
+    def __init__(self, path=None, max_spans=None, flush_seconds=None):
+        self.path = path or Config.TRACE_DB_PATH
+        self.max_spans = max_spans or Config.TRACE_MAX_SPANS
+        self.flush_seconds = Config.TRACE_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+
+        ensure_directory(os.path.dirname(self.path))
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spans ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, trace_id TEXT, span_id TEXT NOT NULL, parent_id TEXT,"
+            " name TEXT NOT NULL, started_at REAL NOT NULL, duration_ms REAL NOT NULL, status TEXT NOT NULL, attrs TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_name ON spans (name, id)")
+        self._conn.commit()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        # CLI runs (bulk ingest, benchmarks) exit before the next timed flush
+        atexit.register(self.flush)
+
+    def record(self, span):
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) >= 256:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to export spans: {e}")
+
+    def flush(self):
+        """Writes buffered spans and trims the table to the newest `max_spans`."""
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if not spans:
+            return
+        with self._db_lock:
+            self._conn.executemany(
+                "INSERT INTO spans (trace_id, span_id, parent_id, name, started_at, duration_ms, status, attrs)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(s["trace_id"], s["span_id"], s["parent_id"], s["name"], s["started_at"], s["duration_ms"],
+                  s["status"], json.dumps(s["attrs"], default=str) if s["attrs"] else None) for s in spans],
+            )
+            self._conn.execute("DELETE FROM spans WHERE id <= (SELECT MAX(id) FROM spans) - ?", (self.max_spans,))
+            self._conn.commit()
+
+    def _query(self, sql, params=()):
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def operation_stats(self, since=None):
+        """Count and p50/p95/p99 duration per span name, slowest p95 first."""
+        rows = self._query("SELECT name, duration_ms, status FROM spans WHERE started_at >= ? ORDER BY name",
+                           (since or 0,))
+        by_name = {}
+        for name, duration, status in rows:
+            entry = by_name.setdefault(name, {"durations": [], "errors": 0})
+            entry["durations"].append(duration)
+            entry["errors"] += status != "ok"
+        stats = []
+        for name, entry in by_name.items():
+            durations = sorted(entry["durations"])
+            stats.append({
+                "operation": name, "count": len(durations), "errors": entry["errors"],
+                "p50_ms": round(_percentile(durations, 50), 1),
+                "p95_ms": round(_percentile(durations, 95), 1),
+                "p99_ms": round(_percentile(durations, 99), 1),
+            })
+        return sorted(stats, key=lambda s: s["p95_ms"], reverse=True)
+
+    def slow_traces(self, min_ms=None, limit=20):
+        """Most recent root spans (whole turns or uploads) slower than `min_ms`."""
+        min_ms = Config.TRACE_SLOW_MS if min_ms is None else min_ms
+        rows = self._query(
+            "SELECT trace_id, name, started_at, duration_ms, status, attrs FROM spans"
+            " WHERE parent_id IS NULL AND trace_id IS NOT NULL AND duration_ms >= ? ORDER BY id DESC LIMIT ?",
+            (min_ms, limit),
+        )
+        return [{"trace_id": r[0], "name": r[1], "started_at": r[2], "duration_ms": round(r[3], 1), "status": r[4],
+                 "attrs": json.loads(r[5]) if r[5] else {}} for r in rows]
+
+    def trace_spans(self, trace_id):
+        """All spans of one trace, in start order."""
+        rows = self._query(
+            "SELECT span_id, parent_id, name, started_at, duration_ms, status, attrs FROM spans"
+            " WHERE trace_id = ? ORDER BY started_at", (trace_id,),
+        )
+        return [{"span_id": r[0], "parent_id": r[1], "name": r[2], "started_at": r[3], "duration_ms": round(r[4], 1),
+                 "status": r[5], "attrs": json.loads(r[6]) if r[6] else {}} for r in rows]
+
+
+class Tracer:
+    """
+    Records timed spans into a TraceStore.
+
+    A trace is opened at the edge of a unit of work (a chat turn, an upload job) and
+    its id travels in a context variable, so spans opened anywhere below it — graph
+    nodes, Gemini/Pinecone calls, MongoDB commands — join it without being passed
+    anything. Thread pools don't copy context on their own; wrap submitted callables
+    with propagate(). Spans outside any trace are still recorded, without a trace id.
+    """
+    def __init__(self, store=None):
+        self.store = store
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        if not self.store:
+            yield attrs
+            return
+        parent = _current.get()
+        trace_id = parent[0] if parent else None
+        span_id = uuid.uuid4().hex[:16]
+        token = _current.set((trace_id, span_id))
+        started_at = time.time()
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            # Callers may add attributes (e.g. result sizes) to the yielded dict
+            yield attrs
+        except Exception as e:
+            status = "error"
+            attrs["error"] = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            _current.reset(token)
+            self.store.record({
+                "trace_id": trace_id, "span_id": span_id, "parent_id": parent[1] if parent else None,
+                "name": name, "started_at": started_at, "duration_ms": (time.perf_counter() - start) * 1000,
+                "status": status, "attrs": attrs,
+            })
+
+    @contextlib.contextmanager
+    def trace(self, name, trace_id=None, **attrs):
+        """Opens a new trace; its root span covers the `with` block."""
+        token = _current.set((trace_id or uuid.uuid4().hex, None))
+        try:
+            with self.span(name, **attrs) as span_attrs:
+                yield span_attrs
+        finally:
+            _current.reset(token)
+
+    def record(self, name, duration_ms, status="ok", **attrs):
+        """Records an already-timed operation as a child of the current span."""
+        if not self.store:
+            return
+        parent = _current.get()
+        self.store.record({
+            "trace_id": parent[0] if parent else None, "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent[1] if parent else None, "name": name,
+            "started_at": time.time() - duration_ms / 1000, "duration_ms": duration_ms, "status": status, "attrs": attrs,
+        })
+
+    def wrap(self, name, func):
+        """`func` (sync or async) with every call inside a span."""
+        if self.store is None:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def propagate(func):
+    """`func` run in a copy of the caller's context, so work handed to a thread pool stays in the current trace."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        # A context can't be entered by two threads at once, so each call gets its own copy
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """Records every MongoDB command as a span of whatever trace issued it."""
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        # Listeners run on the thread that issued the command, so the trace context is the caller's
+        self.tracer.record(f"mongo.{event.command_name}", event.duration_micros / 1000)
+
+    def failed(self, event):
+        self.tracer.record(f"mongo.{event.command_name}", event.duration_micros / 1000, status="error",
+                           error=str(event.failure)[:300])
+
+
+_shared_tracer = None
+_shared_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Returns the process-wide Tracer (a no-op one when TRACING_ENABLED is off)."""
+    global _shared_tracer
+    with _shared_tracer_lock:
+        if _shared_tracer is None:
+            store = None
+            if Config.TRACING_ENABLED:
+                try:
+                    store = TraceStore()
+                except Exception as e:
+                    logger.error(f"Tracing disabled, could not open trace store: {e}")
+            _shared_tracer = Tracer(store)
+        return _shared_tracer
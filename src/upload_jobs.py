@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from src.config import Config
+from src.prescription_pipeline import build_title, prescription_id_for
+from src.tracing import get_tracer
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+ACTIVE_STATES = ("queued", "extracting", "indexing")
+JOB_STATES = ACTIVE_STATES + ("done", "failed")
+
+
+class UploadJobQueue:
+    """
+    Processes uploads on a background worker pool so the Streamlit script never blocks on them.
+
+    A job moves queued -> extracting -> indexing -> done (or failed), and its state lives in
+    the MongoDB `upload_jobs` collection, so any session (or process) can poll it. There is at
+    most one job per (user, content hash): submitting the same bytes again returns the existing
+    job instead of starting a second one, unless that job failed, in which case it is retried.
+    Active jobs left behind by a dead process are picked up again once they go stale.
+    While a job runs it holds a reference on its uploaded blob, so GC can't remove the file.
+    """
+    def __init__(self, pipeline, client=None, workers=None, blob_store=None):
+        self.pipeline = pipeline
+        self.blob_store = blob_store
+        self.client = client or MongoClient(Config.MONGO_URI)
+        self.collection = self.client.get_database(Config.MONGO_DB_NAME).upload_jobs
+        self.pool = ThreadPoolExecutor(max_workers=workers or Config.UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "coalesced": 0, "done": 0, "failed": 0}
+        self._ensure_indexes()
+        self.resume_stale()
+
+    def _ensure_indexes(self):
+        try:
+            self.collection.create_index([("job_id", ASCENDING)], unique=True, name="job_id")
+            self.collection.create_index([("user_id", ASCENDING), ("content_hash", ASCENDING)],
+                                         unique=True, name="user_content_hash")
+            self.collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_created_at")
+            self.collection.create_index("finished_at", expireAfterSeconds=Config.UPLOAD_JOB_RETENTION_DAYS * 86400,
+                                         name="upload_job_ttl")
+        except Exception as e:
+            logger.error(f"Failed to create upload job indexes: {e}")
+
+    def submit(self, user_id, filename, file_path, content_hash, size_bytes=None):
+        """
+        Queues an upload and returns (job, started). `started` is False when the
+        submission coalesced into a job that is already running or finished.
+        """
+        now = datetime.utcnow()
+        new_job = {
+            "job_id": str(uuid.uuid4()), "user_id": user_id, "content_hash": content_hash,
+            "filename": filename, "file_path": file_path, "size_bytes": size_bytes,
+            "state": "queued", "error": None, "prescription_id": None, "timings": {},
+            "created_at": now, "updated_at": now,
+        }
+        try:
+            job = self.collection.find_one_and_update(
+                {"user_id": user_id, "content_hash": content_hash},
+                {"$setOnInsert": new_job},
+                upsert=True, return_document=ReturnDocument.AFTER, projection={"_id": 0},
+            )
+        except DuplicateKeyError:
+            # Lost the race to a concurrent submit of the same bytes
+            job = self.collection.find_one({"user_id": user_id, "content_hash": content_hash}, {"_id": 0})
+
+        started = job["job_id"] == new_job["job_id"]
+        if not started and job["state"] == "failed":
+            retried = self.collection.find_one_and_update(
+                {"job_id": job["job_id"], "state": "failed"},
+                {"$set": {"state": "queued", "error": None, "filename": filename, "file_path": file_path,
+                          "updated_at": now}, "$unset": {"finished_at": ""}},
+                return_document=ReturnDocument.AFTER, projection={"_id": 0},
+            )
+            if retried:
+                job, started = retried, True
+
+        with self._lock:
+            self.stats["submitted" if started else "coalesced"] += 1
+        if started:
+            if self.blob_store:
+                self.blob_store.retain(content_hash, f"job:{job['job_id']}")
+            logger.info(f"Queued upload job {job['job_id']} for {filename}")
+            self.pool.submit(self._run, job["job_id"])
+        else:
+            logger.info(f"Upload of {filename} coalesced into job {job['job_id']} ({job['state']})")
+        return job, started
+
+    def get(self, job_id):
+        return self.collection.find_one({"job_id": job_id}, {"_id": 0})
+
+    def find(self, user_id, content_hash):
+        """The job for these bytes from this user, if any."""
+        return self.collection.find_one({"user_id": user_id, "content_hash": content_hash}, {"_id": 0})
+
+    def jobs_for(self, user_id, limit=10):
+        """A user's most recent jobs, newest first."""
+        return list(self.collection.find({"user_id": user_id}, {"_id": 0}).sort("created_at", DESCENDING).limit(limit))
+
+    def _set_state(self, job_id, state, **fields):
+        fields.update(state=state, updated_at=datetime.utcnow())
+        if state in ("done", "failed"):
+            fields["finished_at"] = fields["updated_at"]
+        self.collection.update_one({"job_id": job_id}, {"$set": fields})
+
+    def _run(self, job_id):
+        # The job id doubles as the trace id, so a slow upload can be looked up by job
+        with get_tracer().trace("upload_job", trace_id=job_id) as attrs:
+            job = self.get(job_id)
+            if job:
+                attrs.update(filename=job["filename"], size_bytes=job.get("size_bytes"))
+            self._process(job_id, job)
+
+    def _process(self, job_id, job):
+        if not job or job["state"] != "queued":
+            return
+        tracer = get_tracer()
+        start = time.perf_counter()
+        try:
+            self._set_state(job_id, "extracting")
+            with tracer.span("upload.extract"):
+                data, cached, extract_ms = self.pipeline.extract(job["file_path"], job["content_hash"])
+            if not data:
+                self._finish(job, "failed", error="Failed to extract data.", timings={"extract_ms": extract_ms})
+                return
+
+            self._set_state(job_id, "indexing", timings={"extract_ms": extract_ms})
+            item = {
+                "prescription_id": prescription_id_for(job["user_id"], job["content_hash"]),
+                "data": data, "cached": cached, "filename": job["filename"], "user_id": job["user_id"],
+                "content_hash": job["content_hash"], "size_bytes": job.get("size_bytes"),
+            }
+            with tracer.span("upload.index"):
+                index_ms = self.pipeline.index([item])
+            with tracer.span("upload.register"):
+                session_ms = self.pipeline.register([item])
+            self._finish(job, "done", prescription_id=item["prescription_id"],
+                         title=build_title(data, job["filename"]), timings={
+                             "extract_ms": extract_ms, "index_ms": index_ms, "session_ms": session_ms,
+                             "total_ms": round((time.perf_counter() - start) * 1000, 1),
+                         })
+        except Exception as e:
+            logger.error(f"Upload job {job_id} failed: {e}")
+            self._finish(job, "failed", error=str(e))
+
+    def _finish(self, job, state, **fields):
+        self._set_state(job["job_id"], state, **fields)
+        if self.blob_store:
+            # A finished upload is referenced by its session (if any) from here on
+            self.blob_store.release(job["content_hash"], f"job:{job['job_id']}")
+        with self._lock:
+            self.stats[state] += 1
+        logger.info(f"Upload job {job['job_id']} ({job['filename']}) {state}")
+
+    def resume_stale(self, stale_seconds=None):
+        """Re-queues active jobs nobody has touched for `stale_seconds` (e.g. after a crash)."""
+        stale_seconds = Config.UPLOAD_JOB_STALE_SECONDS if stale_seconds is None else stale_seconds
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        resumed = 0
+        try:
+            for job in self.collection.find({"state": {"$in": list(ACTIVE_STATES)}, "updated_at": {"$lt": cutoff}}):
+                if not os.path.exists(job["file_path"]):
+                    self._finish(job, "failed", error="Uploaded file is no longer available.")
+                    continue
+                # Claim it atomically so only one process resumes it
+                claimed = self.collection.update_one(
+                    {"job_id": job["job_id"], "updated_at": job["updated_at"]},
+                    {"$set": {"state": "queued", "updated_at": datetime.utcnow()}},
+                )
+                if claimed.modified_count:
+                    self.pool.submit(self._run, job["job_id"])
+                    resumed += 1
+        except Exception as e:
+            logger.error(f"Failed to resume stale upload jobs: {e}")
+        if resumed:
+            logger.info(f"Resumed {resumed} stale upload jobs")
+        return resumed
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        try:
+            for state in ACTIVE_STATES:
+                stats[state] = self.collection.count_documents({"state": state})
+        except Exception as e:
+            logger.error(f"Failed to read upload job stats: {e}")
+        return stats
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
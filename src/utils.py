@@ -1,5 +1,7 @@
 import logging
 import os
+import threading
+import time
 
 def setup_logger(name=__name__):
     """
@@ -19,17 +21,36 @@ def ensure_directory(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def remove_stopwords(text):
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls at most `rate` per second.
+    A rate of 0 (or less) disables limiting.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
 
-    stop_words = {
-        "a", "an", "the", "and", "but", "or", "for", "nor", "on", "at", "to", "from", "by", "with", "of",
-        "in", "out", "as", "if", "when", "while", "then", "than", "is", "are", "was", "were", "be", "been",
-        "being", "have", "has", "had", "do", "does", "did", "can", "could", "will", "would", "shall", "should",
-        "may", "might", "must", "it", "its", "this", "that", "these", "those", "i", "you", "he", "she", "we",
-        "they", "me", "him", "her", "us", "them", "my", "your", "his", "their", "our", "mine", "yours", "hers",
-        "theirs", "ours", "myself", "yourself", "himself", "herself", "itself", "ourselves", "themselves"
-    }
-    
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+STOP_WORDS = frozenset({
+    "a", "an", "the", "and", "but", "or", "for", "nor", "on", "at", "to", "from", "by", "with", "of",
+    "in", "out", "as", "if", "when", "while", "then", "than", "is", "are", "was", "were", "be", "been",
+    "being", "have", "has", "had", "do", "does", "did", "can", "could", "will", "would", "shall", "should",
+    "may", "might", "must", "it", "its", "this", "that", "these", "those", "i", "you", "he", "she", "we",
+    "they", "me", "him", "her", "us", "them", "my", "your", "his", "their", "our", "mine", "yours", "hers",
+    "theirs", "ours", "myself", "yourself", "himself", "herself", "itself", "ourselves", "themselves"
+})
+
+def remove_stopwords(text):
     words = text.split()
-    filtered_words = [word for word in words if word.lower() not in stop_words]
+    filtered_words = [word for word in words if word.lower() not in STOP_WORDS]
     return " ".join(filtered_words)
@@ -1,128 +1,366 @@
-from pinecone import Pinecone, ServerlessSpec
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from src.config import Config
-from src.utils import setup_logger
+from src.answer_cache import get_answer_cache
+from src.embedding_cache import CachedEmbeddings, get_embedding_cache
+from src.tracing import get_tracer, propagate
+from src.utils import setup_logger, RateLimiter
+import hashlib
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = setup_logger(__name__)
 
 class VectorStoreManager:
     """
-    Manages interactions with Pinecone Vector DB.
+    Manages interactions with the Vector DB.
+    The backend (Pinecone or the embedded local index) is selected by Config.VECTOR_BACKEND.
+
+    The Pinecone SDK is imported on construction, and with Config.BACKGROUND_BOOTSTRAP
+    the index check/creation runs on a background thread; `index` blocks until it is done.
     """
+    RECONNECT_INTERVAL = 10
+
     def __init__(self):
-        self.pc = Pinecone(api_key=Config.PINECONE_API_KEY)
+        self.backend = Config.VECTOR_BACKEND
         self.index_name = Config.PINECONE_INDEX_NAME
         
         # Initialize Embeddings
         if Config.GOOGLE_API_KEY:
-            self.embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=Config.GOOGLE_API_KEY)
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            provider = GoogleGenerativeAIEmbeddings(model=Config.EMBEDDING_MODEL_NAME, google_api_key=Config.GOOGLE_API_KEY)
+            # Every embed call goes through the shared content-addressed cache
+            self.embeddings = CachedEmbeddings(provider, get_embedding_cache(), Config.EMBEDDING_MODEL_NAME)
         else:
             logger.warning("Google API Key missing for embeddings.")
             self.embeddings = None
 
-        self._ensure_index()
-        self.index = self.pc.Index(self.index_name)
+        self.rate_limiter = RateLimiter(Config.EMBED_RATE_LIMIT)
+        self.upsert_batch_size = 100
+
+        self._index = None
+        self._ready = threading.Event()
+        self._connect_error = None
+        self._connect_attempted_at = 0.0
+        self._connect_lock = threading.Lock()
+        if self.backend == "local":
+            from src.local_index import LocalVectorIndex
+            self.pc = None
+            self.index = LocalVectorIndex(Config.LOCAL_INDEX_DIR, dimension=Config.EMBEDDING_DIMENSION)
+        else:
+            from pinecone import Pinecone
+            self.pc = Pinecone(api_key=Config.PINECONE_API_KEY)
+            if Config.BACKGROUND_BOOTSTRAP:
+                threading.Thread(target=self._connect_index, name="pinecone-bootstrap", daemon=True).start()
+            else:
+                self._connect_index()
+
+    @property
+    def index(self):
+        """
+        The vector index. Blocks until background index verification has finished.
+        If connecting failed, reconnects (at most every RECONNECT_INTERVAL seconds) and
+        otherwise raises the connection error, rather than handing out None.
+        """
+        if not self._ready.is_set():
+            logger.info("Waiting for vector index bootstrap...")
+            self._ready.wait()
+        if self._index is None and self._connect_error is not None:
+            with self._connect_lock:
+                if self._index is None and time.monotonic() - self._connect_attempted_at >= self.RECONNECT_INTERVAL:
+                    self._connect_index()
+            if self._index is None:
+                error = self._connect_error
+                raise RuntimeError(f"Pinecone index '{self.index_name}' unavailable: {error}") from error
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+        self._ready.set()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def _connect_index(self):
+        start = time.perf_counter()
+        self._connect_attempted_at = time.monotonic()
+        try:
+            self._ensure_index()
+            self._index = self.pc.Index(self.index_name)
+            self._connect_error = None
+            logger.info(f"Pinecone index '{self.index_name}' ready in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            # Kept so `index` can report the real cause instead of failing later on None
+            self._connect_error = e
+            logger.error(f"Failed to connect to Pinecone index: {e}")
+        finally:
+            self._ready.set()
 
     def _ensure_index(self):
         """Creates the index if it doesn't exist."""
+        from pinecone import ServerlessSpec
         if self.index_name not in self.pc.list_indexes().names():
             logger.info(f"Creating Pinecone index: {self.index_name}")
             try:
                 self.pc.create_index(
                     name=self.index_name,
-                    dimension=768,
+                    dimension=Config.EMBEDDING_DIMENSION,
                     metric="cosine",
                     spec=ServerlessSpec(
                         cloud="aws",
                         region=Config.PINECONE_ENV
                     )
                 )
-                time.sleep(5) # Wait for initialization
+                self._wait_until_index_ready()
             except Exception as e:
                 logger.error(f"Failed to create index: {e}")
                 pass
 
+    def _wait_until_index_ready(self, timeout=60):
+        """Polls a newly created index with backoff instead of sleeping a fixed time."""
+        delay, deadline = 0.5, time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if self.pc.describe_index(self.index_name).status["ready"]:
+                    return
+            except Exception as e:
+                logger.warning(f"Index status check failed: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 5)
+        logger.warning(f"Index {self.index_name} not reported ready after {timeout}s")
+
+    def embedding_cache_stats(self):
+        """Returns hit/miss counters of the embedding cache."""
+        if not self.embeddings:
+            return {}
+        return self.embeddings.cache.get_stats()
+
+    def _embed_in_batches(self, texts):
+        """
+        Embeds texts in provider-sized batches, several batches in flight at once.
+        Yields (offset, embeddings) per batch in completion order, so callers can
+        upsert while the remaining batches are still being embedded.
+        """
+        batch_size = max(1, Config.EMBED_BATCH_SIZE)
+        batches = [(i, texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+
+        def embed(offset, batch):
+            self.rate_limiter.acquire()
+            # RETRIEVAL_QUERY keeps stored vectors identical to the per-text embed_query path
+            return offset, self.embeddings.embed_documents(batch, batch_size=len(batch), task_type="RETRIEVAL_QUERY")
+
+        workers = max(1, min(Config.EMBED_CONCURRENCY, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(propagate(embed), offset, batch) for offset, batch in batches]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _upsert_embedded(self, texts, build_vector, namespace=None, embeddings=None):
+        """
+        Embeds `texts` and upserts each batch as soon as its embeddings arrive.
+        `build_vector(i, embedding)` returns the (id, values, metadata) tuple for text i.
+        Precomputed `embeddings` (one per text) skip the embedding step.
+        """
+        start = time.perf_counter()
+        stored = 0
+        batches = [(0, embeddings)] if embeddings is not None else self._embed_in_batches(texts)
+        for offset, embeddings in batches:
+            vectors = [build_vector(offset + j, embedding) for j, embedding in enumerate(embeddings)]
+            for i in range(0, len(vectors), self.upsert_batch_size):
+                with get_tracer().span("vector_index.upsert", backend=Config.VECTOR_BACKEND,
+                                       vectors=len(vectors[i:i + self.upsert_batch_size])):
+                    self.index.upsert(vectors=vectors[i:i + self.upsert_batch_size], namespace=namespace)
+            stored += len(vectors)
+
+        elapsed = time.perf_counter() - start
+        rate = stored / elapsed if elapsed > 0 else float("inf")
+        logger.info(f"Embedded and upserted {stored} texts in {elapsed:.2f}s ({rate:.1f} texts/sec)")
+        return stored
+
+    @staticmethod
+    def text_vector_id(text, namespace=None):
+        """Deterministic vector id for a text: its hash, prefixed with the namespace."""
+        text_hash = hashlib.md5(text.encode()).hexdigest()
+        return f"{namespace}_{text_hash}" if namespace else f"{text_hash}"
+
     def add_texts(self, texts, metadata_list, namespace=None):
         """
-        Generic method to add texts to Pinecone.
+        Generic method to add texts to the vector store.
         """
         if not self.embeddings:
             return False
 
-        vectors = []
-        for i, text in enumerate(texts):
-            # Create a unique ID based on hash or index + namespace
-            import hashlib
-            text_hash = hashlib.md5(text.encode()).hexdigest()
-            vector_id = f"{namespace}_{text_hash}" if namespace else f"{text_hash}"
-            
-            embedding = self.embeddings.embed_query(text)
-            
+        def build_vector(i, embedding):
+            text = texts[i]
+            vector_id = self.text_vector_id(text, namespace)
             meta = metadata_list[i].copy() if i < len(metadata_list) else {}
             meta["text"] = text
-            
-            vectors.append((vector_id, embedding, meta))
-
-        # Upsert in batches
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i+batch_size]
-            self.index.upsert(vectors=batch, namespace=namespace)
-        
-        logger.info(f"Stored {len(vectors)} texts in namespace '{namespace}'")
+            return (vector_id, embedding, meta)
+
+        stored = self._upsert_embedded(texts, build_vector, namespace=namespace)
+        logger.info(f"Stored {stored} texts in namespace '{namespace}'")
         return True
 
-    def add_prescription(self, prescription_id, text_chunks, metadata):
+    def delete_texts(self, vector_ids, namespace=None):
+        """Deletes vectors by id from a namespace."""
+        batch_size = 1000
+        for i in range(0, len(vector_ids), batch_size):
+            self.index.delete(ids=vector_ids[i:i + batch_size], namespace=namespace)
+        logger.info(f"Deleted {len(vector_ids)} vectors from namespace '{namespace}'")
+
+    def namespace_vector_count(self, namespace):
+        """Number of vectors the index holds in `namespace`, or None if the index can't tell."""
+        try:
+            stats = self.index.describe_index_stats()
+            namespaces = stats["namespaces"] if isinstance(stats, dict) else stats.namespaces
+            summary = namespaces.get(namespace or "")
+            if summary is None:
+                return 0
+            return summary["vector_count"] if isinstance(summary, dict) else summary.vector_count
+        except Exception as e:
+            logger.warning(f"Could not read vector count of namespace '{namespace}': {e}")
+            return None
+
+    def clear_namespace(self, namespace):
+        """Deletes every vector in a namespace (a missing namespace is not an error)."""
+        try:
+            self.index.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            logger.warning(f"Could not clear namespace '{namespace}': {e}")
+
+    def embed_chunks(self, text_chunks):
+        """Embeddings for prescription chunks, as stored by add_prescription (served from the embedding cache)."""
+        if not self.embeddings:
+            return None
+        return self.embeddings.embed_documents(text_chunks, batch_size=len(text_chunks), task_type="RETRIEVAL_QUERY")
+
+    def add_prescription(self, prescription_id, text_chunks, metadata, embeddings=None, chunk_metadata=None):
         """
         Embeds and stores prescription chunks.
+        Pass `embeddings` (e.g. from the extraction cache) to reuse vectors instead of embedding again,
+        and `chunk_metadata` (one dict per chunk) for fields specific to each chunk.
         """
-        if not self.embeddings:
+        if not self.embeddings and embeddings is None:
             return False
+        chunk_metadata_list = chunk_metadata
 
-        vectors = []
-        for i, chunk in enumerate(text_chunks):
-            vector_id = f"{prescription_id}_{i}"
-            embedding = self.embeddings.embed_query(chunk)
-            
+        def build_vector(i, embedding):
             # Combine chunk metadata with global metadata
             chunk_metadata = metadata.copy()
-            chunk_metadata["text"] = chunk
+            if chunk_metadata_list:
+                chunk_metadata.update(chunk_metadata_list[i])
+            chunk_metadata["text"] = text_chunks[i]
             chunk_metadata["chunk_id"] = i
             chunk_metadata["prescription_id"] = prescription_id
-            
-            vectors.append((vector_id, embedding, chunk_metadata))
-
-        # Upsert in batches
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i+batch_size]
-            self.index.upsert(vectors=batch)
-        
-        logger.info(f"Stored {len(vectors)} chunks for prescription {prescription_id}")
+            return (f"{prescription_id}_{i}", embedding, chunk_metadata)
+
+        stored = self._upsert_embedded(text_chunks, build_vector, embeddings=embeddings)
+        # Answers cached against the previous contents of this prescription are stale now
+        get_answer_cache().invalidate(prescription_id)
+        logger.info(f"Stored {stored} chunks for prescription {prescription_id}")
+        return True
+
+    def add_prescriptions(self, batch):
+        """
+        add_prescription for many prescriptions at once: chunks of every prescription
+        share embedding requests and upsert batches.
+        Each entry is a dict with prescription_id, chunks, metadata and optional per-chunk
+        chunk_metadata and embeddings; entries embedded here get the new vectors under "computed".
+        """
+        precomputed, pending = [], []
+        for entry in batch:
+            for i, chunk in enumerate(entry["chunks"]):
+                target = precomputed if entry.get("embeddings") is not None else pending
+                target.append((entry, i))
+            if entry.get("embeddings") is None:
+                entry["computed"] = [None] * len(entry["chunks"])
+
+        def builder(refs, record):
+            def build_vector(k, embedding):
+                entry, i = refs[k]
+                if record:
+                    entry["computed"][i] = embedding
+                chunk_metadata = entry["metadata"].copy()
+                if entry.get("chunk_metadata"):
+                    chunk_metadata.update(entry["chunk_metadata"][i])
+                chunk_metadata["text"] = entry["chunks"][i]
+                chunk_metadata["chunk_id"] = i
+                chunk_metadata["prescription_id"] = entry["prescription_id"]
+                return (f"{entry['prescription_id']}_{i}", embedding, chunk_metadata)
+            return build_vector
+
+        stored = 0
+        if precomputed:
+            stored += self._upsert_embedded([entry["chunks"][i] for entry, i in precomputed], builder(precomputed, False),
+                                            embeddings=[entry["embeddings"][i] for entry, i in precomputed])
+        if pending:
+            if not self.embeddings:
+                return False
+            stored += self._upsert_embedded([entry["chunks"][i] for entry, i in pending], builder(pending, True))
+        for entry in batch:
+            get_answer_cache().invalidate(entry["prescription_id"])
+        logger.info(f"Stored {stored} chunks for {len(batch)} prescriptions")
         return True
 
-    def search(self, query, prescription_id=None, namespace=None, top_k=5):
+    def search(self, query, prescription_id=None, namespace=None, top_k=5, filter=None):
         """
         Searches for relevant chunks.
         If prescription_id is provided, filters by that ID (Local Search).
         Otherwise, searches globally or in a specific namespace.
+        `filter` adds metadata conditions (e.g. {"medicine": {"$in": [...]}}).
         """
         if not self.embeddings:
             return []
 
-        query_embedding = self.embeddings.embed_query(query)
+        tracer = get_tracer()
+        with tracer.span("vector_store.embed_query"):
+            query_embedding = self.embeddings.embed_query(query)
         
-        filter_dict = {}
+        filter_dict = dict(filter or {})
         if prescription_id:
-            filter_dict = {"prescription_id": {"$eq": prescription_id}}
-
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True,
-            filter=filter_dict if prescription_id else None,
-            namespace=namespace
-        )
+            filter_dict["prescription_id"] = {"$eq": prescription_id}
+
+        with tracer.span("vector_index.query", backend=Config.VECTOR_BACKEND, top_k=top_k):
+            results = self.index.query(
+                vector=query_embedding,
+                top_k=top_k,
+                include_metadata=True,
+                filter=filter_dict or None,
+                namespace=namespace
+            )
         
         return results.matches
+
+    def search_chunks(self, query, prescription_id=None, namespace=None):
+        """
+        Retrieval for per-medicine prescription chunks (see prescription_pipeline.build_chunks).
+
+        Takes RETRIEVE_CANDIDATES nearest chunks, then keeps only what the question is about:
+        - medicines named in the question: just their chunks, fetched with a metadata
+          filter when they weren't among the candidates
+        - otherwise: chunks scoring within RETRIEVE_SCORE_MARGIN of the best match
+        At most RETRIEVE_TOP_K chunks are returned. Prescriptions indexed as one chunk
+        (before per-medicine chunking) come back as plain top-k matches.
+        """
+        from src.prescription_pipeline import mentioned_medicines
+        candidates = self.search(query, prescription_id=prescription_id, namespace=namespace,
+                                 top_k=Config.RETRIEVE_CANDIDATES)
+        structured = [m for m in candidates if m.metadata.get("chunk_type")]
+        if not structured:
+            return candidates[:Config.RETRIEVE_TOP_K]
+
+        keys = []
+        for match in structured:
+            keys.extend(match.metadata.get("medicines") or [match.metadata.get("medicine")])
+        asked = mentioned_medicines(query, [key for key in keys if key])
+        if asked:
+            selected = [m for m in structured if m.metadata.get("medicine") in asked]
+            missing = [key for key in asked if key not in {m.metadata.get("medicine") for m in selected}]
+            if missing:
+                selected += self.search(query, prescription_id=prescription_id, namespace=namespace,
+                                        top_k=Config.RETRIEVE_TOP_K,
+                                        filter={"chunk_type": {"$eq": "medicine"}, "medicine": {"$in": missing}})
+        else:
+            best = structured[0].score
+            selected = [m for m in structured if m.score >= best - Config.RETRIEVE_SCORE_MARGIN]
+        return selected[:Config.RETRIEVE_TOP_K]
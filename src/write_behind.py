@@ -0,0 +1,140 @@
+import atexit
+import threading
+import time
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from src.config import Config
+from src.message_buckets import MessageBucketStore
+from src.utils import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class MessageWriteBehind:
+    """
+    Write-behind buffer for chat messages.
+
+    add_message() only appends to an in-memory queue. A background thread flushes the
+    queue when it reaches `max_batch` messages or every `flush_interval` seconds, as one
+    insert_many plus one coalesced last_active update per session. Messages that are
+    queued or mid-flush stay visible through pending_for(), so readers in the same
+    process always see their own writes. The queue is flushed on interpreter exit.
+
+    With a `bucket_store`, batches are appended to the bucketed layout instead of
+    being inserted into the flat messages collection.
+    """
+    def __init__(self, messages, sessions, max_batch=None, flush_interval=None, max_attempts=3, bucket_store=None):
+        self.messages = messages
+        self.sessions = sessions
+        self.bucket_store = bucket_store
+        self.max_batch = max_batch or Config.WRITE_BEHIND_MAX_BATCH
+        self.flush_interval = (flush_interval if flush_interval is not None else Config.WRITE_BEHIND_FLUSH_MS / 1000.0)
+        self.max_attempts = max_attempts
+        self._queue = []
+        self._inflight = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.stats = {"enqueued": 0, "flushed": 0, "flushes": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name="message-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, doc):
+        """Queues a message document; it gets its _id now so retries stay idempotent."""
+        doc.setdefault("_id", ObjectId())
+        with self._cond:
+            self._queue.append((doc, 0))
+            self.stats["enqueued"] += 1
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify()
+
+    def pending_for(self, session_id):
+        """Messages for a session that are not yet confirmed in MongoDB."""
+        with self._cond:
+            return [doc for doc, _ in self._inflight + self._queue if doc["session_id"] == session_id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._queue) < self.max_batch:
+                    # Give the batch until the interval elapses to fill up
+                    self._cond.wait(timeout=self.flush_interval)
+                if self._closed and not self._queue:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Writes everything queued so far. Safe to call from any thread."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._queue:
+                    return
+                batch, self._queue = self._queue, []
+                self._inflight = batch
+
+            docs = [doc for doc, _ in batch]
+            start = time.perf_counter()
+            try:
+                self._insert(docs)
+                last_active = {}
+                for doc in docs:
+                    sid = doc["session_id"]
+                    last_active[sid] = max(last_active.get(sid, doc["timestamp"]), doc["timestamp"])
+                self.sessions.bulk_write(
+                    [UpdateOne({"session_id": sid}, {"$max": {"last_active": ts}}) for sid, ts in last_active.items()],
+                    ordered=False,
+                )
+                self.stats["flushed"] += len(docs)
+                self.stats["flushes"] += 1
+                logger.debug(f"Flushed {len(docs)} messages in {(time.perf_counter() - start) * 1000:.1f}ms")
+            except Exception as e:
+                retry = [(doc, attempts + 1) for doc, attempts in batch if attempts + 1 < self.max_attempts]
+                self.stats["failed"] += len(batch) - len(retry)
+                logger.error(f"Message flush failed ({len(retry)} of {len(batch)} requeued): {e}")
+                with self._cond:
+                    self._queue = retry + self._queue
+            finally:
+                with self._cond:
+                    self._inflight = []
+
+    def _insert(self, docs):
+        if self.bucket_store:
+            self.bucket_store.append_documents(docs)
+            return
+        try:
+            self.messages.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys mean an earlier attempt already stored those messages
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            if errors:
+                raise
+
+    def close(self):
+        """Flushes remaining messages and stops the background thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=10)
+        self.flush()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_write_behind(db):
+    """
+    Returns the process-wide writer for a database, so every MemoryManager in the
+    process shares one queue (and therefore sees the same pending messages).
+    """
+    with _writers_lock:
+        writer = _writers.get(db.name)
+        if writer is None:
+            bucket_store = MessageBucketStore(db) if Config.MESSAGE_STORAGE == "bucketed" else None
+            writer = MessageWriteBehind(db.messages, db.sessions, bucket_store=bucket_store)
+            _writers[db.name] = writer
+        return writer
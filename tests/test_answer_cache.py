@@ -0,0 +1,21 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.answer_cache import SemanticAnswerCache, depends_on_history
+
+def test_answers_are_scoped_per_prescription_and_never_global():
+    cache = SemanticAnswerCache(threshold=0.9, ttl_seconds=60, max_entries=10)
+    cache.store("rx-alice", "English", "Any food restrictions?", [1.0, 0.0], "Avoid alcohol.")
+    cache.store(None, "English", "Any food restrictions?", [1.0, 0.0], "Global answer")
+
+    assert cache.lookup("rx-alice", "English", [1.0, 0.0])[0] == "Avoid alcohol."
+    assert cache.lookup("rx-bob", "English", [1.0, 0.0]) is None
+    assert cache.lookup(None, "English", [1.0, 0.0]) is None
+
+def test_follow_ups_are_recognised():
+    assert depends_on_history("and the second one?")
+    assert depends_on_history("Can I take it with milk?")
+    assert not depends_on_history("Are there any food restrictions for Dolo 650?")
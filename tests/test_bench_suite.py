@@ -0,0 +1,27 @@
+import sys
+import os
+import json
+import subprocess
+import pytest
+
+pytest.importorskip("mongomock")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def test_bench_suite_runs_offline_and_compares_against_its_own_baseline(tmp_path):
+    # Runs in a subprocess: the suite points the app's config at scratch directories and fakes
+    report_path = tmp_path / "report.json"
+    command = [sys.executable, os.path.join(ROOT, "benchmarks", "bench_suite.py"), "--iterations", "1",
+               "--embed-ms", "0", "--rtt-ms", "0", "--llm-first-token-ms", "0", "--llm-token-ms", "0"]
+    env = {k: v for k, v in os.environ.items() if k != "MONGO_BENCH_URI"}
+    subprocess.run(command + ["--json", str(report_path)], cwd=tmp_path, env=env, check=True, capture_output=True)
+
+    report = json.loads(report_path.read_text())
+    assert {"vector_store.add_texts[50]", "vector_store.search", "otc.check_medicines[cold]",
+            "rag.invoke[llm]", "rag.invoke[routed]", "memory.get_history[5]"} <= set(report["results"])
+
+    # Different simulated latencies make the baseline incomparable
+    report["settings"]["rtt_ms"] = 40.0
+    report_path.write_text(json.dumps(report))
+    compared = subprocess.run(command + ["--baseline", str(report_path)], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert compared.returncode == 1 and "settings differ" in compared.stdout
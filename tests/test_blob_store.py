@@ -0,0 +1,45 @@
+import sys
+import os
+import io
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from src.blob_store import BlobStore
+
+def test_put_dedups_and_gc_keeps_referenced_blobs(tmp_path):
+    store = BlobStore(root=str(tmp_path), client=mongomock.MongoClient())
+
+    digest, path, size = store.put(io.BytesIO(b"scan-1"), ext=".PNG")
+    again, again_path, _ = store.put(io.BytesIO(b"scan-1"), ext=".jpg")
+    assert (again, again_path, size) == (digest, path, 6)
+    assert path == os.path.join(str(tmp_path), digest[:2], digest[2:4], digest + ".png")
+    assert os.listdir(store.tmp_dir) == []
+
+    other, other_path, _ = store.put(io.BytesIO(b"scan-2"))
+    store.retain(digest, "session:alice:p1")
+    store.retain(digest, "session:alice:p1") # idempotent
+    assert store.refcount(digest) == 1
+
+    summary = store.gc(grace_seconds=-1)
+    assert summary["deleted"] == 1
+    assert os.path.exists(path) and not os.path.exists(other_path)
+
+    store.release(digest, "session:alice:p1")
+    store.gc(grace_seconds=-1)
+    assert not os.path.exists(path)
+
+def test_put_reuses_a_digest_the_caller_already_computed(tmp_path):
+    from src.extraction_cache import content_hash
+    store = BlobStore(root=str(tmp_path), client=mongomock.MongoClient())
+    upload = io.BytesIO(b"scan-3")
+    digest = content_hash(upload)
+
+    assert store.put(upload, ext=".png", known_digest=digest)[0] == digest
+    # Already stored: served without reading the source at all
+    drained = io.BytesIO(b"")
+    assert store.put(drained, known_digest=digest)[1:] == (store.path_for(digest), 6)
@@ -0,0 +1,28 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.prescription_pipeline import build_chunks, mentioned_medicines
+
+def test_one_chunk_per_medicine_plus_header():
+    data = {
+        "date": "12/03/2024", "notes": "Rest",
+        "medicines": [
+            {"name": "Tab. Crocin 650", "quantity": "1 tablet", "frequency": "1-0-1", "duration": "5 days",
+             "timing": {"morning": "Yes", "afternoon": "No", "night": "Yes", "instruction": "After meal"}},
+            {"name": "Pan-D 40mg", "quantity": None},
+        ],
+    }
+    chunks = build_chunks(data)
+    assert [meta["chunk_type"] for _, meta in chunks] == ["header", "medicine", "medicine"]
+    assert chunks[0][1]["medicines"] == ["crocin", "pan d"]
+    text, meta = chunks[1]
+    assert "Pan-D" not in text and "Duration: 5 days" in text
+    assert (meta["medicine"], meta["night"], meta["instruction"]) == ("crocin", "Yes", "After meal")
+    # Vector metadata can't hold None
+    assert chunks[2][1]["quantity"] == "-"
+
+    assert mentioned_medicines("How long do I take Pan-D?", ["crocin", "pan d"]) == ["pan d"]
+    assert mentioned_medicines("What about my fever tablets?", ["crocin", "pan d"]) == []
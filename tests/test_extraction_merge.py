@@ -0,0 +1,35 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.extractor import PrescriptionExtractor, merge_page_results
+
+def test_merge_dedups_medicines_and_keeps_earliest_date():
+    merged = merge_page_results([
+        {"date": "12/03/2024", "notes": "Rest",
+         "medicines": [{"name": "Crocin 650", "quantity": "1 tablet", "frequency": "1-0-1", "duration": "-"}]},
+        {"date": "10/03/2024", "notes": "-",
+         "medicines": [{"name": "crocin-650", "quantity": "1 tablet", "frequency": "1-0-1", "duration": "5 days"},
+                       {"name": "Pan 40", "quantity": "1 tablet", "frequency": "1-0-0", "duration": "5 days"}]},
+        None, # a page that failed every retry
+    ])
+    assert merged["date"] == "10/03/2024"
+    assert [m["name"] for m in merged["medicines"]] == ["Crocin 650", "Pan 40"]
+    # The repeat filled in the duration the first page left blank
+    assert merged["medicines"][0]["duration"] == "5 days"
+    assert merged["notes"] == "Rest"
+
+def test_a_page_that_keeps_failing_fails_the_extraction():
+    extractor = PrescriptionExtractor()
+
+    def extract_page(number, total, parts):
+        if number == 2:
+            raise TimeoutError("model timed out")
+        return {"date": "-", "notes": "-", "medicines": [{"name": f"Page {number} medicine"}]}, 1.0
+    extractor._extract_page = extract_page
+
+    report = {}
+    assert extractor._extract_pages([["p1"], ["p2"], ["p3"]], report) is None
+    assert report["failed_pages"] == [2]
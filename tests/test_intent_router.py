@@ -0,0 +1,58 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.intent_router import IntentRouter
+
+DATA = {
+    "date": "12/03/2024", "notes": None,
+    "medicines": [
+        {"name": "Tab. Dolo 650", "quantity": "1 tablet", "frequency": "1-0-1", "duration": "5 days",
+         "timing": {"morning": "Yes", "afternoon": "No", "night": "Yes", "instruction": "After meal"}},
+        {"name": "Azithral 500", "quantity": "1 tablet", "frequency": "1-0-0", "duration": None,
+         "timing": {"morning": "Yes", "afternoon": "No", "night": "No", "instruction": "Before meal"}},
+    ],
+}
+
+def test_structured_questions_are_answered_from_the_extraction():
+    router = IntentRouter()
+    answer, intent = router.route("When do I take Dolo?", DATA)
+    assert intent == "schedule"
+    assert "morning and night, after meal (1-0-1)" in answer and "Azithral" not in answer
+
+    answer, intent = router.route("How long do I take all my medicines?", DATA)
+    assert intent == "duration"
+    assert "5 days" in answer and "duration not specified on the prescription" in answer
+
+    assert router.route("What medicines are prescribed?", DATA)[1] == "list"
+    assert router.route("How much Azithral should I take?", DATA)[1] == "dosage"
+
+def test_request_examples_are_routed():
+    router = IntentRouter()
+    answer, intent = router.route("when do I take Dolo?", DATA)
+    assert intent == "schedule" and "Dolo" in answer and "Azithral" not in answer
+
+    # A drug class picks the entries in that class
+    answer, intent = router.route("how many days for the antibiotic?", DATA)
+    assert intent == "duration" and "Azithral" in answer and "Dolo" not in answer
+
+    answer, intent = router.route("list my medicines", DATA)
+    assert intent == "list" and "Dolo" in answer and "Azithral" in answer
+
+    # No entry recognised as an antacid: answer for every medicine rather than guess
+    answer, intent = router.route("how many days for the antacid?", DATA)
+    assert intent == "duration" and "Dolo" in answer and "Azithral" in answer
+
+def test_open_ended_and_ambiguous_questions_go_to_the_llm():
+    router = IntentRouter()
+    assert router.route("What is Dolo used for?", DATA) == (None, None)
+    assert router.route("Can I take Dolo with alcohol?", DATA) == (None, None)
+    # Names neither a medicine nor a drug class
+    assert router.route("How many days for the syrup?", DATA) == (None, None)
+    assert router.route("When do I take Dolo?", DATA, language="Hindi") == (None, None)
+    assert router.route("When do I take Dolo?", None) == (None, None)
+
+    stats = router.get_stats()
+    assert (stats["questions"], stats["routed"], stats["hit_rate"]) == (5, 0, 0.0)
@@ -0,0 +1,39 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from src.local_index import LocalVectorIndex
+
+def _vector(i, dimension=8):
+    vector = np.zeros(dimension, dtype=np.float32)
+    vector[i % dimension] = 1.0
+    vector[(i + 1) % dimension] = 0.1 * (i + 1)
+    return vector.tolist()
+
+def test_batches_are_appended_and_survive_a_restart(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=8)
+    index.COMPACT_MIN_ROWS = 4
+    for i in range(6):
+        index.upsert([(f"v{i}", _vector(i), {"n": i})], namespace="rx")
+    index.upsert([("v0", _vector(7), {"n": 70})], namespace="rx")
+    index.delete(ids=["v1"], namespace="rx")
+
+    # Compaction folded the early batches into the base files; later ones are still segments
+    ns_dir = tmp_path / "rx"
+    assert (ns_dir / "vectors.npy").exists() and any(f.name.startswith("segment-") for f in ns_dir.iterdir())
+
+    reloaded = LocalVectorIndex(str(tmp_path), dimension=8)
+    assert sorted(reloaded._namespaces["rx"].ids) == ["v0", "v2", "v3", "v4", "v5"]
+    top = reloaded.query(_vector(7), top_k=1, namespace="rx").matches[0]
+    assert (top.id, top.metadata["n"]) == ("v0", 70)
+
+def test_filters_match_items_of_list_valued_metadata(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=8)
+    index.upsert([("header", _vector(0), {"medicines": ["dolo", "pan"]}),
+                  ("other", _vector(1), {"medicines": ["azithral"]})])
+    assert [m.id for m in index.query(_vector(0), top_k=5, filter={"medicines": {"$in": ["pan"]}}).matches] == ["header"]
+    assert [m.id for m in index.query(_vector(0), top_k=5, filter={"medicines": "azithral"}).matches] == ["other"]
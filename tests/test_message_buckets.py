@@ -0,0 +1,52 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from src.message_buckets import MessageBucketStore
+from src.migrate_messages import migrate
+
+BASE = datetime(2024, 1, 1)
+
+def message(i):
+    return {"role": "user", "content": f"m{i}", "timestamp": BASE + timedelta(seconds=i)}
+
+def test_append_fills_buckets_and_tail_returns_latest():
+    db = mongomock.MongoClient().bucket_test
+    store = MessageBucketStore(db, bucket_size=4)
+    for i in range(10):
+        store.append("s1", [message(i)])
+
+    assert [b["count"] for b in db.message_buckets.find().sort("opened_at", 1)] == [4, 4, 2]
+    assert [m["content"] for m in store.tail("s1", 3)] == ["m7", "m8", "m9"]
+    # Spans the two newest buckets
+    assert [m["content"] for m in store.tail("s1", 5)] == ["m5", "m6", "m7", "m8", "m9"]
+    assert store.count("s1") == 10
+
+def test_migrate_from_flat_messages():
+    db = mongomock.MongoClient().bucket_test
+    db.messages.insert_many([dict(message(i), session_id="s1") for i in range(7)])
+
+    summary = migrate(db, bucket_size=3)
+    assert summary == {"sessions": 1, "skipped": 0, "messages": 7, "buckets": 3}
+    assert [m["content"] for m in MessageBucketStore(db, bucket_size=3).tail("s1", 2)] == ["m5", "m6"]
+    # Already migrated sessions are left alone
+    assert migrate(db, bucket_size=3)["skipped"] == 1
+
+def test_turn_written_in_one_millisecond_keeps_its_order_across_buckets():
+    db = mongomock.MongoClient().bucket_test
+    store = MessageBucketStore(db, bucket_size=3)
+    store.append("s1", [message(0), message(1)])
+    # The question fills the first bucket and the answer opens the second, with the same timestamp
+    same_ms = BASE + timedelta(seconds=5)
+    store.append("s1", [{"role": "user", "content": "question", "timestamp": same_ms},
+                        {"role": "ai", "content": "answer", "timestamp": same_ms}])
+
+    assert db.message_buckets.count_documents({}) == 2
+    assert [m["content"] for m in store.tail("s1", 2)] == ["question", "answer"]
@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fakes import FakePineconeIndex, HashingEmbeddings
+from src.otc_catalog import OTCCatalogSync
+from src.otc_data import OTC_LIST_DATA
+from src.vector_store import VectorStoreManager
+
+class IndexOnlyStore:
+    """The catalog sync's view of VectorStoreManager, over an in-memory index and hashing embeddings."""
+    text_vector_id = staticmethod(VectorStoreManager.text_vector_id)
+    namespace_vector_count = VectorStoreManager.namespace_vector_count
+    clear_namespace = VectorStoreManager.clear_namespace
+
+    def __init__(self):
+        self.index = FakePineconeIndex()
+        self.embeddings = HashingEmbeddings()
+
+    def add_texts(self, texts, metadata_list, namespace=None):
+        vectors = self.embeddings.embed_documents(texts)
+        self.index.upsert([(self.text_vector_id(t, namespace), v, m) for t, v, m in zip(texts, vectors, metadata_list)],
+                          namespace=namespace)
+        return True
+
+    def delete_texts(self, vector_ids, namespace=None):
+        self.index.delete(ids=vector_ids, namespace=namespace)
+
+def test_emptied_namespace_is_resynced_despite_a_matching_manifest(tmp_path):
+    vector_store = IndexOnlyStore()
+    sync = OTCCatalogSync(vector_store, "otc", manifest_path=str(tmp_path / "manifest.json"))
+    assert sync.sync(OTC_LIST_DATA)["added"] == len(OTC_LIST_DATA)
+    assert sync.sync(OTC_LIST_DATA)["unchanged"] == len(OTC_LIST_DATA)
+
+    # Namespace recreated elsewhere; the local manifest still matches the catalog
+    vector_store.clear_namespace("otc")
+    assert sync.sync(OTC_LIST_DATA)["added"] == len(OTC_LIST_DATA)
+    assert vector_store.namespace_vector_count("otc") == len(OTC_LIST_DATA)
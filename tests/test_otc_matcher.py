@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.otc_data import OTC_LIST_DATA
+from src.otc_matcher import OTCAliasIndex, parse_catalog_name
+
+index = OTCAliasIndex(OTC_LIST_DATA)
+
+def matched_entry(name):
+    match = index.match(name)
+    return match["entry"]["medicine_name"] if match else None
+
+def test_parse_catalog_name():
+    assert parse_catalog_name("Paracetamol (Dolo 650, Crocin)") == (["Paracetamol", "Dolo 650", "Crocin"], [])
+    assert parse_catalog_name("Fluconazole (150mg, e.g., Forcan)") == (["Fluconazole", "Forcan"], ["150mg"])
+    assert parse_catalog_name("Eno (effervescent tablets)") == (["Eno"], [])
+
+def test_exact_and_normalized_matches():
+    assert matched_entry("Crocin") == "Paracetamol (Dolo 650, Crocin)"
+    assert matched_entry("Gelusil") == "Gelusil"
+    assert matched_entry("Tab. Dolo 650") == "Paracetamol (Dolo 650, Crocin)"
+    assert matched_entry("Brufen 400") == "Ibuprofen (Ibuprol, Brufen)"
+    # Only exact hits are approvals; the rest are candidates for LLM verification
+    assert [index.match(name)["method"] for name in ("Crocin", "Tab. Dolo 650", "Crocine")] == ["exact", "normalized", "fuzzy"]
+
+def test_strength_or_route_mismatch_is_not_a_match():
+    assert matched_entry("Aspirin 75mg") is None
+    assert matched_entry("Fluconazole 50mg") is None
+    assert matched_entry("Dolo 500") is None
+    assert matched_entry("Melatonin 4mg") == "Melatonin (3-5mg)"
+    assert matched_entry("Famotidine IV") is None
+    assert matched_entry("Loratadine-D") is None
+
+def test_fuzzy_match_tolerates_typos():
+    assert matched_entry("Crocine") == "Paracetamol (Dolo 650, Crocin)"
+    assert matched_entry("Fluconazol") == "Fluconazole (150mg, e.g., Forcan)"
+
+def test_ambiguous_names_fall_through():
+    # Unknown drugs, combinations and related-but-different molecules go to vector search + LLM
+    assert matched_entry("Amoxicillin") is None
+    assert matched_entry("Paracetamol + Caffeine") is None
+    assert matched_entry("Levocetirizine") is None
+    assert matched_entry("Iron Sucrose Injection") is None
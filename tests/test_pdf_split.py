@@ -0,0 +1,38 @@
+import sys
+import os
+import io
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pypdf
+from PIL import Image
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+
+from src.ingestion import IngestionManager
+
+LETTERHEAD = "City Clinic, 12 MG Road, Bengaluru. Dr. A. Rao MBBS MD Reg No 12345"
+
+def _pdf_with_image_and_text(path, image_size, text):
+    """One page holding an embedded image plus a text layer on top of it."""
+    buffer = io.BytesIO()
+    Image.new("RGB", image_size, "white").save(buffer, "PDF")
+    writer = pypdf.PdfWriter()
+    page = writer.add_page(pypdf.PdfReader(buffer).pages[0])
+    font = DictionaryObject({NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+                             NameObject("/BaseFont"): NameObject("/Helvetica")})
+    page[NameObject("/Resources")][NameObject("/Font")] = DictionaryObject({NameObject("/F1"): font})
+    stream = DecodedStreamObject()
+    stream.set_data(f"BT /F1 12 Tf 20 20 Td ({text}) Tj ET".encode())
+    page[NameObject("/Contents")] = ArrayObject([page["/Contents"], writer._add_object(stream)])
+    writer.write(str(path))
+
+def test_scan_under_a_printed_letterhead_keeps_its_image(tmp_path):
+    _pdf_with_image_and_text(tmp_path / "scan.pdf", (800, 1000), LETTERHEAD)
+    [page] = IngestionManager.split_pdf(str(tmp_path / "scan.pdf"))
+    assert page["kind"] == "mixed" and page["text"] and len(page["images"]) == 1
+
+def test_small_logo_on_a_text_page_is_not_sent(tmp_path):
+    _pdf_with_image_and_text(tmp_path / "typed.pdf", (120, 60), LETTERHEAD)
+    [page] = IngestionManager.split_pdf(str(tmp_path / "typed.pdf"))
+    assert page["kind"] == "text" and page["images"] == []
@@ -0,0 +1,51 @@
+import sys
+import os
+import threading
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.prescription_pipeline import PrescriptionPipeline
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, digest):
+        return self.entries.get(digest)
+
+    def put(self, digest, data, **kwargs):
+        self.entries[digest] = {"data": data}
+
+class SlowExtractor:
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def extract_data(self, file_path, report=None):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return {"medicines": [{"name": "Dolo 650"}]}
+
+def test_same_bytes_are_extracted_once_and_the_lock_is_dropped_after():
+    extractor = SlowExtractor()
+    pipeline = PrescriptionPipeline(extractor, None, None, extraction_cache=DictCache())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pipeline.extract("rx.pdf", "h1")[0])) for _ in range(3)]
+    threads[0].start()
+    extractor.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # All three hold a reference while the first one extracts
+    while pipeline._hash_locks["h1"][1] < 3:
+        time.sleep(0.001)
+    extractor.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert extractor.calls == 1
+    assert results == [{"medicines": [{"name": "Dolo 650"}]}] * 3
+    assert pipeline._hash_locks == {}
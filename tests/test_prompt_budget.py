@@ -0,0 +1,35 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.prompt_budget import PromptBudget, count_tokens
+
+def _piece(label, tokens):
+    # Repeated short words so the piece is roughly `tokens` long with either tokenizer
+    text = f"{label}: " + " ".join(["dose"] * tokens * 2)
+    while count_tokens(text) > tokens:
+        text = text.rsplit(" ", 1)[0]
+    return text
+
+def test_everything_fits_under_the_budget():
+    context, history, stats = PromptBudget(total_tokens=1000).fit("Answer:", ["chunk one"], ["User: hi", "Ai: hello"])
+    assert context == ["chunk one"] and history == ["User: hi", "Ai: hello"]
+    assert stats["trimmed_tokens"] == 0 and stats["dropped_chunks"] == stats["dropped_messages"] == 0
+
+def test_lowest_ranked_context_and_oldest_history_are_trimmed_first():
+    instructions = _piece("instructions", 100)
+    chunks = [_piece(f"chunk {i}", 100) for i in range(5)]
+    history = [_piece(f"message {i}", 100) for i in range(5)]
+    context, kept_history, stats = PromptBudget(total_tokens=600, history_share=0.4).fit(instructions, chunks, history)
+
+    assert stats["prompt_tokens"] <= 600
+    assert context[:2] == chunks[:2] and len(context) <= 4
+    assert kept_history[-1] == history[-1] and history[0] not in kept_history
+    assert stats["dropped_chunks"] >= 1 and stats["dropped_messages"] >= 1
+
+def test_unused_history_share_goes_to_context():
+    chunks = [_piece(f"chunk {i}", 100) for i in range(3)]
+    context, _, stats = PromptBudget(total_tokens=400, history_share=0.5).fit("Answer:", chunks, [])
+    assert context == chunks and stats["history_tokens"] == 0
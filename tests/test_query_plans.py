@@ -0,0 +1,118 @@
+"""
+Query-plan regression checks for MemoryManager and AuthManager.
+
+Every find issued by the managers is captured with a pymongo CommandListener and
+re-run through `explain`; the test fails if any winning plan contains a COLLSCAN.
+Needs a MongoDB server: set MONGO_TEST_URI (default mongodb://localhost:27017).
+The test is skipped when no server is reachable.
+"""
+import sys
+import os
+import uuid
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from pymongo import MongoClient, monitoring
+
+from src.config import Config
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI", "mongodb://localhost:27017")
+
+
+class FindRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name == "find":
+            self.commands.append((event.database_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def stages(plan):
+    """Yields every stage name in an explain plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for key in ("inputStage", "queryPlan"):
+            if key in plan:
+                yield from stages(plan[key])
+        for child in plan.get("inputStages", []):
+            yield from stages(child)
+    elif isinstance(plan, list):
+        for child in plan:
+            yield from stages(child)
+
+
+@pytest.fixture(scope="module")
+def recorded_client():
+    recorder = FindRecorder()
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=2000, event_listeners=[recorder])
+    try:
+        client.admin.command("ping")
+    except Exception:
+        pytest.skip(f"No MongoDB server at {MONGO_TEST_URI}")
+
+    original_db = Config.MONGO_DB_NAME
+    Config.MONGO_DB_NAME = f"pillguard_plan_test_{uuid.uuid4().hex[:8]}"
+    yield client, recorder
+    client.drop_database(Config.MONGO_DB_NAME)
+    Config.MONGO_DB_NAME = original_db
+    client.close()
+
+
+def run_manager_queries(client):
+    from src.auth import AuthManager
+    from src.memory import MemoryManager
+
+    auth = AuthManager(client=client)
+    memory = MemoryManager(client=client)
+
+    # Enough documents that the planner has real choices to make
+    for i in range(50):
+        session_id = memory.get_or_create_session(f"user{i % 5}", f"rx{i}", title=f"T{i}", filename=f"f{i}.jpg")
+        memory.add_message(session_id, "user", f"question {i}")
+
+    auth.register_user("plan_user", "secret")
+    auth.login_user("plan_user", "secret")
+
+    session_id = memory.get_or_create_session("user1", "rx1")
+    memory.get_history(session_id, limit=5)
+    memory.get_user_prescriptions("user1")
+    memory.get_prescription_by_filename("user1", "f1.jpg")
+    memory.get_prescription_by_hash("user1", "0" * 64)
+    memory.get_session_details(session_id)
+    memory.get_summary(session_id)
+    memory.get_otc_result(session_id)
+    memory.get_all_sessions()
+
+
+def test_no_collection_scans(recorded_client):
+    client, recorder = recorded_client
+    run_manager_queries(client)
+
+    finds = [(db, cmd) for db, cmd in recorder.commands if db == Config.MONGO_DB_NAME]
+    assert finds, "No find commands were captured"
+
+    offenders = []
+    seen = set()
+    for db_name, command in finds:
+        shape = (command["find"], tuple(sorted(command.get("filter", {}))), tuple(command.get("sort", {})))
+        if shape in seen:
+            continue
+        seen.add(shape)
+
+        explain_cmd = {k: v for k, v in command.items() if not k.startswith("$") and k != "lsid"}
+        plan = client[db_name].command("explain", explain_cmd, verbosity="queryPlanner")
+        winning = plan["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in set(stages(winning)):
+            offenders.append(f"{command['find']} filter={command.get('filter')} sort={command.get('sort')}")
+
+    assert not offenders, "Queries fell back to COLLSCAN:\n" + "\n".join(offenders)
@@ -0,0 +1,43 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.tracing import TraceStore, Tracer, current_trace_id, propagate
+
+def test_spans_join_the_trace_across_threads(tmp_path):
+    tracer = Tracer(TraceStore(path=str(tmp_path / "traces.db"), flush_seconds=60))
+
+    def external_call(_):
+        with tracer.span("gemini.generate"):
+            return current_trace_id()
+
+    with tracer.trace("chat_turn", trace_id="turn-1"):
+        with tracer.span("node.generate"):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                seen = list(pool.map(propagate(external_call), range(2)))
+    assert seen == ["turn-1", "turn-1"]
+    assert current_trace_id() is None
+
+    spans = {s["name"]: s for s in tracer.store.trace_spans("turn-1")}
+    assert set(spans) == {"chat_turn", "node.generate", "gemini.generate"}
+    assert spans["chat_turn"]["parent_id"] is None
+    assert spans["gemini.generate"]["parent_id"] == spans["node.generate"]["span_id"]
+    assert [t["trace_id"] for t in tracer.store.slow_traces(min_ms=0)] == ["turn-1"]
+
+def test_ring_buffer_keeps_the_newest_spans(tmp_path):
+    tracer = Tracer(TraceStore(path=str(tmp_path / "traces.db"), max_spans=10, flush_seconds=60))
+    for i in range(25):
+        tracer.record("mongo.find", float(i))
+    try:
+        with tracer.span("mongo.insert"):
+            raise RuntimeError("down")
+    except RuntimeError:
+        pass
+
+    stats = {s["operation"]: s for s in tracer.store.operation_stats()}
+    assert stats["mongo.find"]["count"] == 9
+    assert (stats["mongo.find"]["p50_ms"], stats["mongo.find"]["p99_ms"]) == (20.0, 24.0)
+    assert stats["mongo.insert"]["errors"] == 1
@@ -0,0 +1,76 @@
+import sys
+import os
+import threading
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from src.upload_jobs import UploadJobQueue
+
+class StubPipeline:
+    """Records pipeline calls; extraction blocks until released."""
+    def __init__(self):
+        self.release = threading.Event()
+        self.extractions = 0
+
+    def extract(self, file_path, content_hash):
+        self.extractions += 1
+        self.release.wait(5)
+        return {"date": "-", "medicines": [{"name": "Crocin"}], "notes": "-"}, None, 1.0
+
+    def index(self, items):
+        return 1.0
+
+    def register(self, items):
+        return 1.0
+
+def test_duplicate_submissions_coalesce_into_one_job(tmp_path):
+    path = tmp_path / "rx.png"
+    path.write_bytes(b"rx")
+    pipeline = StubPipeline()
+    queue = UploadJobQueue(pipeline, client=mongomock.MongoClient(), workers=2)
+
+    first, started = queue.submit("alice", "rx.png", str(path), "abc")
+    again, started_again = queue.submit("alice", "copy.png", str(path), "abc")
+    assert started and not started_again
+    assert again["job_id"] == first["job_id"]
+
+    pipeline.release.set()
+    queue.shutdown()
+    job = queue.get(first["job_id"])
+    assert job["state"] == "done"
+    assert job["title"] == "Prescription: Crocin"
+    assert pipeline.extractions == 1
+
+class PartialExtractor:
+    def extract_data(self, file_path, report=None):
+        report["failed_pages"] = [2]
+        return None
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, content_hash):
+        return self.entries.get(content_hash)
+
+    def put(self, content_hash, data, **kwargs):
+        self.entries[content_hash] = {"data": data}
+
+def test_partial_extraction_fails_the_job_and_is_not_cached(tmp_path):
+    from src.prescription_pipeline import PrescriptionPipeline
+    path = tmp_path / "rx.pdf"
+    path.write_bytes(b"rx")
+    cache = DictCache()
+    queue = UploadJobQueue(PrescriptionPipeline(PartialExtractor(), None, None, extraction_cache=cache),
+                           client=mongomock.MongoClient(), workers=1)
+
+    job, _ = queue.submit("alice", "rx.pdf", str(path), "abc")
+    queue.shutdown()
+    job = queue.get(job["job_id"])
+    assert job["state"] == "failed" and "page(s) 2" in job["error"]
+    assert cache.entries == {}
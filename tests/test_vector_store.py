@@ -0,0 +1,39 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from src.config import Config
+from src.vector_store import VectorStoreManager
+
+class FlakyPinecone:
+    """Pinecone client whose control plane is down until `up` is set."""
+    up = False
+
+    def __init__(self, api_key=None):
+        pass
+
+    def list_indexes(self):
+        if not FlakyPinecone.up:
+            raise ConnectionError("control plane unreachable")
+        return type("Indexes", (), {"names": lambda self: [Config.PINECONE_INDEX_NAME]})()
+
+    def Index(self, name):
+        return f"index:{name}"
+
+def test_failed_bootstrap_raises_the_real_error_and_reconnects(monkeypatch):
+    import pinecone
+    monkeypatch.setattr(pinecone, "Pinecone", FlakyPinecone)
+    monkeypatch.setattr(Config, "VECTOR_BACKEND", "pinecone")
+    monkeypatch.setattr(Config, "BACKGROUND_BOOTSTRAP", False)
+    monkeypatch.setattr(VectorStoreManager, "RECONNECT_INTERVAL", 0)
+    FlakyPinecone.up = False
+    vector_store = VectorStoreManager()
+
+    with pytest.raises(RuntimeError, match="control plane unreachable"):
+        vector_store.index
+    FlakyPinecone.up = True
+    assert vector_store.index == f"index:{Config.PINECONE_INDEX_NAME}"